@@ -0,0 +1,93 @@
+import json
+import sys
+
+import click
+
+from benchmarks.generator import RepoSpec
+from benchmarks.suite import BASE_SPEC, PRESETS, compare, load_results, run_suite, save_results
+
+
+def report_regressions(baseline: dict, current: dict, threshold: float, memory_threshold: float,
+                       io_threshold: float) -> None:
+    regressions = compare(baseline, current, {'seconds': threshold, 'peak_rss': memory_threshold,
+                                              'read_bytes': io_threshold, 'write_bytes': io_threshold})
+    for scenario, operation, metric, base_value, value in regressions:
+        change = f' ({value / base_value - 1:+.0%})' if base_value else ''
+        click.echo(f'\tRegression: {scenario}/{operation} {metric} {base_value} -> {value}{change}')
+    if regressions:
+        sys.exit(1)
+    click.echo('\tNo regressions found.')
+
+
+threshold_options = [
+    click.option('--threshold', default=0.2, type=click.FloatRange(min=0),
+                 help="Allowed relative slowdown before a run counts as a regression"),
+    click.option('--memory-threshold', default=0.1, type=click.FloatRange(min=0),
+                 help="Allowed relative peak RSS growth"),
+    click.option('--io-threshold', default=0.1, type=click.FloatRange(min=0),
+                 help="Allowed relative growth of bytes read and written"),
+]
+
+
+def with_thresholds(function):
+    for option in reversed(threshold_options):
+        function = option(function)
+    return function
+
+
+@click.group()
+def main():
+    """Kit end-to-end benchmarks"""
+
+
+@click.command()
+@click.option('-p', '--preset', default=None, type=click.Choice(sorted(PRESETS)),
+              help="Predefined set of scenarios (default: a single custom scenario)")
+@click.option('--files', default=BASE_SPEC.files, type=click.IntRange(min=1), help="Number of files")
+@click.option('--file-size', default=BASE_SPEC.file_size, type=click.IntRange(min=1), help="File size in bytes")
+@click.option('--depth', default=BASE_SPEC.depth, type=click.IntRange(min=1), help="Number of commits in history")
+@click.option('--branches', default=BASE_SPEC.branches, type=click.IntRange(min=0), help="Number of branches")
+@click.option('--change-ratio', default=BASE_SPEC.change_ratio, type=click.FloatRange(min=0, max=1),
+              help="Share of files changed by every commit")
+@click.option('--seed', default=BASE_SPEC.seed, type=int, help="Random seed of the generated repositories")
+@click.option('-r', '--repeat', default=1, type=click.IntRange(min=1), help="Runs per scenario")
+@click.option('-w', '--work-dir', default=None, type=click.Path(exists=True, file_okay=False),
+              help="Directory for generated repositories (default: system temp)")
+@click.option('-o', '--output', default=None, type=click.Path(dir_okay=False), help="Write JSON results to file")
+@click.option('-b', '--baseline', default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Fail if results regress against this JSON baseline")
+@with_thresholds
+def run(preset, files, file_size, depth, branches, change_ratio, seed, repeat, work_dir, output, baseline,
+        threshold, memory_threshold, io_threshold):
+    """Generate repositories and time kit operations on them"""
+    if preset is None:
+        scenarios = {'custom': RepoSpec(files, file_size, depth, branches, change_ratio, seed)}
+    else:
+        scenarios = PRESETS[preset]
+
+    results = run_suite(scenarios, work_dir, repeat,
+                        lambda name, spec: click.echo(f'\tRunning {name}: {dict(spec._asdict())}', err=True))
+    if output is None:
+        click.echo(json.dumps(results, indent=2))
+    else:
+        save_results(results, output)
+        click.echo(f'\tResults written to {output}.', err=True)
+
+    if baseline is not None:
+        report_regressions(load_results(baseline), results, threshold, memory_threshold, io_threshold)
+
+
+@click.command(name='compare')
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('current', type=click.Path(exists=True, dir_okay=False))
+@with_thresholds
+def compare_command(baseline, current, threshold, memory_threshold, io_threshold):
+    """Compare two JSON result files and fail on regressions"""
+    report_regressions(load_results(baseline), load_results(current), threshold, memory_threshold, io_threshold)
+
+
+main.add_command(run)
+main.add_command(compare_command)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+from collections import namedtuple
+from os import makedirs, path
+from random import Random
+
+from kit_vcs.version_control import VersionControl
+
+USERNAME = 'benchmark'
+MAIN_BRANCH = 'main'
+FILES_PER_FOLDER = 100
+
+RepoSpec = namedtuple('RepoSpec', ['files', 'file_size', 'depth', 'branches', 'change_ratio', 'seed'])
+
+
+def file_name(index: int) -> str:
+    return path.join(f'd{index // FILES_PER_FOLDER:04}', f'f{index:06}.txt')
+
+
+def branch_name(index: int) -> str:
+    return f'branch{index}'
+
+
+def make_content(rng: Random, size: int) -> bytes:
+    lines = []
+    length = 0
+    while length < size:
+        line = f'{rng.getrandbits(64):016x} {rng.randrange(10 ** 6):06} ' + 'x' * rng.randrange(8, 48)
+        lines.append(line)
+        length += len(line) + 1
+    return ('\n'.join(lines) + '\n').encode()[:max(size, 1)]
+
+
+def changed_files(spec: RepoSpec, rng: Random, lane: int, lanes: int) -> list[int]:
+    candidates = range(lane, spec.files, lanes)
+    count = min(len(candidates), max(1, round(len(candidates) * spec.change_ratio)))
+    return sorted(rng.sample(candidates, count))
+
+
+def write_files(workspace_path: str, spec: RepoSpec, rng: Random, indexes) -> None:
+    for index in indexes:
+        file_path = path.join(workspace_path, file_name(index))
+        makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as f:
+            f.write(make_content(rng, spec.file_size))
+
+
+def modify_files(workspace_path: str, spec: RepoSpec, rng: Random, lane: int = 0) -> list[str]:
+    indexes = changed_files(spec, rng, lane, spec.branches + 1)
+    write_files(workspace_path, spec, rng, indexes)
+    return [file_name(index) for index in indexes]
+
+
+def commit_all(workspace_path: str, description: str) -> None:
+    vcs = VersionControl(USERNAME, workspace_path)
+    vcs.add('.')
+    vcs.commit(description)
+
+
+def generate_repo(workspace_path: str, spec: RepoSpec) -> None:
+    rng = Random(spec.seed)
+    makedirs(workspace_path, exist_ok=True)
+    VersionControl(USERNAME, workspace_path).init()
+
+    write_files(workspace_path, spec, rng, range(spec.files))
+    commit_all(workspace_path, 'base')
+    for depth in range(1, spec.depth):
+        modify_files(workspace_path, spec, rng)
+        commit_all(workspace_path, f'history {depth}')
+
+    for branch in range(spec.branches):
+        VersionControl(USERNAME, workspace_path).create_branch(branch_name(branch))
+    for branch in range(spec.branches):
+        VersionControl(USERNAME, workspace_path).checkout_to_branch(branch_name(branch), False)
+        modify_files(workspace_path, spec, rng, branch + 1)
+        commit_all(workspace_path, f'{branch_name(branch)} changes')
+    if spec.branches:
+        VersionControl(USERNAME, workspace_path).checkout_to_branch(MAIN_BRANCH, False)
@@ -0,0 +1,54 @@
+import resource
+import sys
+from collections import namedtuple
+from os import path
+from time import perf_counter
+
+PROC_IO = '/proc/self/io'
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+RESET_PEAK_RSS = '5'
+
+Measurement = namedtuple('Measurement', ['seconds', 'peak_rss', 'read_bytes', 'write_bytes'])
+
+
+def read_io() -> (int, int):
+    if path.isfile(PROC_IO):
+        counters = {}
+        with open(PROC_IO, 'r') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                counters[name] = int(value)
+        return counters['rchar'], counters['wchar']
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_inblock * 512, usage.ru_oublock * 512
+
+
+def reset_peak_rss() -> None:
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as f:
+            f.write(RESET_PEAK_RSS)
+    except OSError:
+        pass
+
+
+def read_peak_rss() -> int:
+    if path.isfile(PROC_STATUS):
+        with open(PROC_STATUS, 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def measure(function, *args) -> (object, Measurement):
+    reset_peak_rss()
+    read_before, write_before = read_io()
+    start = perf_counter()
+    result = function(*args)
+    seconds = perf_counter() - start
+    read_after, write_after = read_io()
+    return result, Measurement(seconds, read_peak_rss(), read_after - read_before, write_after - write_before)
@@ -0,0 +1,133 @@
+import json
+import platform
+from datetime import datetime
+from random import Random
+from shutil import rmtree
+from statistics import median
+from tempfile import mkdtemp
+
+from benchmarks.generator import MAIN_BRANCH, USERNAME, RepoSpec, branch_name, generate_repo, modify_files
+from benchmarks.measure import Measurement, measure
+from kit_vcs.version_control import VersionControl
+
+RESULTS_FORMAT = 1
+
+BASE_SPEC = RepoSpec(files=1000, file_size=4096, depth=10, branches=2, change_ratio=0.05, seed=1)
+PRESETS = {
+    'quick': {
+        'quick': BASE_SPEC._replace(files=200, depth=5),
+    },
+    'standard': {
+        'base': BASE_SPEC,
+        'files-10k': BASE_SPEC._replace(files=10_000),
+        'size-256k': BASE_SPEC._replace(files=200, file_size=256 * 1024),
+        'depth-100': BASE_SPEC._replace(depth=100),
+        'branches-8': BASE_SPEC._replace(branches=8),
+        'change-50pct': BASE_SPEC._replace(change_ratio=0.5),
+    },
+}
+
+OPERATIONS = ('add', 'commit', 'status', 'log_patch', 'checkout', 'merge', 'gc')
+NOISE_FLOORS = {'seconds': 0.01, 'peak_rss': 4 * 1024 * 1024, 'read_bytes': 64 * 1024, 'write_bytes': 64 * 1024}
+
+
+def log_patch(vcs: VersionControl) -> int:
+    lines = 0
+    commits = vcs.commits_list()
+    previous_commit = next(commits)
+    for current_commit in commits:
+        for line in vcs.commits_diff(current_commit[0], previous_commit[0]):
+            _, file = line.split(';', 1)
+            lines += sum(1 for _ in vcs.files_diff(current_commit[0], previous_commit[0], file))
+        previous_commit = current_commit
+    return lines
+
+
+def merge_branches(workspace_path: str, branches: int) -> None:
+    for branch in range(branches):
+        vcs = VersionControl(USERNAME, workspace_path)
+        vcs.merge_commits(vcs.current_id, vcs.get_branch_head(branch_name(branch)), f'Merge {branch_name(branch)}')
+
+
+def run_operations(workspace_path: str, spec: RepoSpec) -> dict[str: Measurement]:
+    rng = Random(spec.seed + 1)
+    results = {}
+
+    modify_files(workspace_path, spec, rng)
+    _, results['add'] = measure(lambda: VersionControl(USERNAME, workspace_path).add('.'))
+    _, results['commit'] = measure(lambda: VersionControl(USERNAME, workspace_path).commit('benchmark changes'))
+    _, results['status'] = measure(lambda: list(VersionControl(USERNAME, workspace_path).status()))
+    _, results['log_patch'] = measure(lambda: log_patch(VersionControl(USERNAME, workspace_path)))
+
+    if spec.branches:
+        _, results['checkout'] = measure(
+            lambda: VersionControl(USERNAME, workspace_path).checkout_to_branch(branch_name(0), False))
+        VersionControl(USERNAME, workspace_path).checkout_to_branch(MAIN_BRANCH, False)
+        _, results['merge'] = measure(merge_branches, workspace_path, spec.branches)
+
+    _, results['gc'] = measure(lambda: VersionControl(USERNAME, workspace_path).gc())
+    return results
+
+
+def run_scenario(spec: RepoSpec, work_dir: str | None = None, repeat: int = 1) -> dict:
+    runs = []
+    for _ in range(repeat):
+        workspace_path = mkdtemp(prefix='kit-bench-', dir=work_dir)
+        try:
+            generate_repo(workspace_path, spec)
+            runs.append(run_operations(workspace_path, spec))
+        finally:
+            rmtree(workspace_path, ignore_errors=True)
+
+    operations = {}
+    for operation in OPERATIONS:
+        measurements = [run[operation] for run in runs if operation in run]
+        if measurements:
+            operations[operation] = {'seconds': min(m.seconds for m in measurements),
+                                     'peak_rss': max(m.peak_rss for m in measurements),
+                                     'read_bytes': int(median(m.read_bytes for m in measurements)),
+                                     'write_bytes': int(median(m.write_bytes for m in measurements))}
+    return {'spec': spec._asdict(), 'operations': operations}
+
+
+def run_suite(scenarios: dict[str: RepoSpec], work_dir: str | None = None, repeat: int = 1, progress=None) -> dict:
+    results = {'format': RESULTS_FORMAT, 'created': datetime.now().isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'platform': platform.platform(), 'repeat': repeat,
+               'scenarios': {}}
+    for name, spec in scenarios.items():
+        if progress is not None:
+            progress(name, spec)
+        results['scenarios'][name] = run_scenario(spec, work_dir, repeat)
+    return results
+
+
+def compare(baseline: dict, current: dict, thresholds: dict[str: float]) -> list[tuple]:
+    regressions = []
+    for name, scenario in current['scenarios'].items():
+        base_scenario = baseline['scenarios'].get(name)
+        if base_scenario is None or base_scenario['spec'] != scenario['spec']:
+            continue
+
+        for operation, metrics in scenario['operations'].items():
+            base_metrics = base_scenario['operations'].get(operation)
+            if base_metrics is None:
+                continue
+            for metric, threshold in thresholds.items():
+                base_value, value = base_metrics[metric], metrics[metric]
+                if value > base_value * (1 + threshold) and value - base_value > NOISE_FLOORS[metric]:
+                    regressions.append((name, operation, metric, base_value, value))
+    return regressions
+
+
+def load_results(results_path: str) -> dict:
+    with open(results_path, 'r') as f:
+        results = json.load(f)
+    if results.get('format') != RESULTS_FORMAT:
+        raise ValueError(f'Unsupported benchmark results format in {results_path}')
+    return results
+
+
+def save_results(results: dict, results_path: str) -> None:
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
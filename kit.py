@@ -1,27 +1,53 @@
 #!/usr/bin/env python
 
 import click
-from os import path
+from itertools import islice
+from os import environ, path
 from getpass import getuser
+import kit_vcs.cache as cache
+import kit_vcs.trace as trace
+from kit_vcs.diff import ALGORITHMS, MYERS
 from kit_vcs.version_control import VersionControl
 
 
+def report_trace(trace_path: str) -> None:
+    trace.tracer.disable()
+    if trace_path == trace.SUMMARY_STDERR:
+        click.echo(trace.tracer.format_summary(), err=True)
+    else:
+        trace.tracer.write_chrome_trace(trace_path)
+
+
 @click.group()
+@click.option('-j', '--jobs', default=None, type=click.IntRange(min=1),
+              help="Number of parallel jobs for hashing and compression (default: number of cores)")
+@click.option('--diff-algorithm', default=MYERS, type=click.Choice(ALGORITHMS),
+              help="Line diff algorithm used by log -p and merges")
+@click.option('--cache-size', default=cache.DEFAULT_CACHE_SIZE // 2 ** 20, type=click.IntRange(min=0),
+              help="Memory limit in MiB for cached commits, trees and decompressed blobs")
+@click.option('--trace', 'trace_summary', is_flag=True,
+              help="Print a summary table of storage operations; set KIT_TRACE=path for a Chrome trace JSON instead")
 @click.pass_context
-def main(ctx):
+def main(ctx, jobs, diff_algorithm, cache_size, trace_summary):
     """Kit Version Control System"""
     ctx.ensure_object(dict)
+    trace_path = trace.SUMMARY_STDERR if trace_summary else environ.get(trace.TRACE_ENV)
+    if trace_path:
+        trace.tracer.enable()
+        ctx.call_on_close(lambda: report_trace(trace_path))
     repo_path = path.abspath('.')
     username = getuser()
-    ctx.obj['vcs'] = VersionControl(username, repo_path)
+    ctx.obj['vcs'] = VersionControl(username, repo_path, jobs, diff_algorithm, cache_size * 2 ** 20)
 
 
 @click.command()
+@click.option('-c', '--compression', default=None,
+              help="Object compression as codec[:level]: zlib, lzma, zstd or raw (default: zlib:6)")
 @click.pass_context
-def init(ctx):
+def init(ctx, compression):
     """Initialize a new repository"""
     vcs = ctx.obj['vcs']
-    vcs.init()
+    vcs.init(compression)
     click.echo(f"\tInitialized empty kit repository in {vcs.repo_path}")
 
 
@@ -150,11 +176,16 @@ def checkout(ctx, name, branch, tag, commit, force):
 @click.command()
 @click.pass_context
 def status(ctx):
-    """Show index"""
+    """Show staged, unstaged and untracked files"""
     vcs = ctx.obj['vcs']
-    for info in vcs.index():
-        info = info.split(',')
-        click.echo(f'\t{3 * info[2]} {info[0]}')
+    titles = {'staged': 'Changes to be committed:', 'unstaged': 'Changes not staged for commit:',
+              'untracked': 'Untracked files:'}
+    section = None
+    for state, sign, file in vcs.status():
+        if state != section:
+            click.echo(titles[state])
+            section = state
+        click.echo(f'\t{3 * sign} {file}')
 
 
 @click.command()
@@ -184,38 +215,70 @@ def merge(ctx, branch_name, no_commit):
 @click.command()
 @click.option('-p', '--patch', is_flag=True, help="Show commits difference")
 @click.option('-n', '--number', default=None, type=int, help="Number of commits to show")
+@click.argument('paths', nargs=-1, type=click.Path())
 @click.pass_context
-def log(ctx, patch, number):
-    """Show commit logs"""
+def log(ctx, patch, number, paths):
+    """Show commit logs, optionally only commits that change the given paths"""
     vcs = ctx.obj['vcs']
 
-    commits = vcs.commits_list()
-    previous_commit = next(commits)
-    click.echo(f'\n\tCommit: {previous_commit[0]}; User: {previous_commit[1]}; Date: {previous_commit[2]}; '
-               f''f'Message: 'f'{previous_commit[3]}')
+    object_ids = vcs.object_id_index()
+    commits = vcs.commits_list(paths)
+    if number is not None:
+        commits = islice(commits, max(number, 1))
+    previous_commit = next(commits, None)
+    if previous_commit is None:
+        return
+    click.echo(f'\n\tCommit: {object_ids.abbreviate(previous_commit[0])}; User: {previous_commit[1]}; '
+               f'Date: {previous_commit[2]}; Message: {previous_commit[3]}')
 
-    count = 1
     for current_commit in commits:
-        if number is not None and count >= number:
-            break
-
         if patch:
             click.echo(f'\tChanged files:')
 
-            for line in vcs.commits_diff(current_commit[0], previous_commit[0]):
-                sign, file = line.split(';')
+            for line in vcs.commits_diff(current_commit[0], previous_commit[0], paths):
+                sign, file = line.split(';', 1)
 
                 click.echo(f'\t\t{3 * sign} {file}')
                 click.echo(f'\t\tChanges:')
 
                 for diff_line in vcs.files_diff(current_commit[0], previous_commit[0], file):
-                    sign, diff = diff_line.split(';')
+                    sign, diff = diff_line.split(';', 1)
                     click.echo(f'\t\t\t{sign} {diff}')
 
-        click.echo(f'\n\tCommit: {current_commit[0]}; User: {current_commit[1]}; Date: {current_commit[2]}; '
-                   f'Message: {current_commit[3]}')
+        click.echo(f'\n\tCommit: {object_ids.abbreviate(current_commit[0])}; User: {current_commit[1]}; '
+                   f'Date: {current_commit[2]}; Message: {current_commit[3]}')
         previous_commit = current_commit
-        count += 1
+
+
+@click.command()
+@click.pass_context
+def gc(ctx):
+    """Pack loose objects and refs into single pack files"""
+    vcs = ctx.obj['vcs']
+    count, refs_count = vcs.gc()
+    click.echo(f'\tPacked {count} objects and {refs_count} refs.')
+
+
+@click.command()
+@click.option('--stop', is_flag=True, help="Stop the running monitor")
+@click.option('--status', is_flag=True, help="Show whether the monitor is running")
+@click.pass_context
+def fsmonitor(ctx, stop, status):
+    """Start a background file system monitor that speeds up status and add"""
+    vcs = ctx.obj['vcs']
+    if stop:
+        stopped = vcs.stop_fsmonitor()
+        click.echo('\tFile system monitor stopped.' if stopped else '\tFile system monitor is not running.')
+    elif status:
+        daemon_status = vcs.fsmonitor_status()
+        if daemon_status is None:
+            click.echo('\tFile system monitor is not running.')
+        else:
+            click.echo(f"\tFile system monitor is running with pid {daemon_status['pid']}, "
+                       f"watching {daemon_status['folders']} folders.")
+    else:
+        daemon_status = vcs.start_fsmonitor()
+        click.echo(f"\tFile system monitor started with pid {daemon_status['pid']}.")
 
 
 main.add_command(init)
@@ -229,6 +292,9 @@ main.add_command(status)
 main.add_command(cherry_pick)
 main.add_command(merge)
 main.add_command(log)
+main.add_command(gc)
+main.add_command(gc, name='repack')
+main.add_command(fsmonitor)
 
 if __name__ == "__main__":
     try:
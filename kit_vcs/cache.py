@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+
+import kit_vcs.trace as trace
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+MAX_CACHED_BLOB_SIZE = 1024 * 1024
+ENTRY_OVERHEAD = 100
+
+COMMITS = 'commits'
+TREES = 'trees'
+BLOBS = 'blobs'
+
+
+def tree_size(entries: dict[str: (str, str)]) -> int:
+    return ENTRY_OVERHEAD + sum(len(name) + len(object_hash) + ENTRY_OVERHEAD
+                                for name, (_, object_hash) in entries.items())
+
+
+def commit_size(entry: tuple) -> int:
+    return (ENTRY_OVERHEAD + sum(len(value) for value in entry if isinstance(value, str))
+            + sum(len(parent) for parent in entry.parents))
+
+
+class LRUCache:
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.hits = {}
+        self.misses = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: (str, str)) -> bool:
+        return key in self.entries
+
+    def get(self, kind: str, key: str):
+        with self.lock:
+            entry = self.entries.get((kind, key))
+            counters = self.misses if entry is None else self.hits
+            counters[kind] = counters.get(kind, 0) + 1
+            if entry is not None:
+                self.entries.move_to_end((kind, key))
+        trace.count(f'cache_{kind}_{"misses" if entry is None else "hits"}')
+        return entry[0] if entry is not None else None
+
+    def put(self, kind: str, key: str, value, size: int) -> None:
+        with self.lock:
+            previous = self.entries.pop((kind, key), None)
+            if previous is not None:
+                self.size -= previous[1]
+            self.entries[(kind, key)] = (value, size)
+            self.size += size
+            while self.size > self.max_size and len(self.entries) > 1:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def discard(self, kind: str, key: str) -> None:
+        with self.lock:
+            entry = self.entries.pop((kind, key), None)
+            if entry is not None:
+                self.size -= entry[1]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict[str: (int, int)]:
+        return {kind: (self.hits.get(kind, 0), self.misses.get(kind, 0))
+                for kind in sorted(self.hits.keys() | self.misses.keys())}
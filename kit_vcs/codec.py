@@ -0,0 +1,122 @@
+import lzma
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import kit_vcs.errors as errors
+
+OBJECT_MAGIC = b'KZ'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+CODEC_IDS = {'raw': 0, 'zlib': 1, 'lzma': 2, 'zstd': 3}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+DEFAULT_LEVELS = {'raw': 0, 'zlib': 6, 'lzma': 6, 'zstd': 3}
+LEVEL_RANGES = {'raw': (0, 0), 'zlib': (0, 9), 'lzma': (0, 9), 'zstd': (1, 22)}
+DEFAULT_COMPRESSION = 'zlib'
+LEGACY_COMPRESSION = 'lzma'
+HEADER_SIZE = len(OBJECT_MAGIC) + 1
+
+SAMPLE_SIZE = 64 * 1024
+INCOMPRESSIBLE_RATIO = 0.95
+INCOMPRESSIBLE_MAGICS = (b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'PK\x03\x04', b'\x1f\x8b', b'BZh', b'7z\xbc\xaf',
+                         b'\x28\xb5\x2f\xfd', b'Rar!', XZ_MAGIC)
+
+
+class RawCodec:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b''
+
+
+def available_codecs() -> list[str]:
+    return [name for name in CODEC_IDS if name != 'zstd' or zstandard is not None]
+
+
+def parse_compression(value: str) -> (str, int):
+    codec, _, level = value.strip().partition(':')
+    if codec not in available_codecs():
+        raise errors.UnsupportedCodecError(f'Compression codec {codec} is not available, '
+                                           f'use one of: {", ".join(available_codecs())}')
+
+    if not level:
+        return codec, DEFAULT_LEVELS[codec]
+    low, high = LEVEL_RANGES[codec]
+    if not level.isdigit() or not low <= int(level) <= high:
+        raise errors.UnsupportedCodecError(f'Compression level for {codec} must be between {low} and {high}')
+    return codec, int(level)
+
+
+def format_compression(codec: str, level: int) -> str:
+    return f'{codec}:{level}'
+
+
+def is_incompressible(sample: bytes) -> bool:
+    if sample.startswith(INCOMPRESSIBLE_MAGICS):
+        return True
+    if len(sample) < 512:
+        return False
+    return len(zlib.compress(sample, 1)) > len(sample) * INCOMPRESSIBLE_RATIO
+
+
+def choose_codec(sample: bytes, codec: str, level: int) -> (str, int):
+    return ('raw', 0) if is_incompressible(sample) else (codec, level)
+
+
+def header(codec: str) -> bytes:
+    return OBJECT_MAGIC + bytes([CODEC_IDS[codec]])
+
+
+def compressor(codec: str, level: int):
+    if codec == 'zlib':
+        return zlib.compressobj(level)
+    if codec == 'lzma':
+        return lzma.LZMACompressor(preset=level)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise errors.UnsupportedCodecError('Compression codec zstd is not available')
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    return RawCodec()
+
+
+def decompressor(codec: str):
+    if codec == 'zlib':
+        return zlib.decompressobj()
+    if codec == 'lzma':
+        return lzma.LZMADecompressor()
+    if codec == 'zstd':
+        if zstandard is None:
+            raise errors.UnsupportedCodecError('Object is compressed with zstd, which is not available')
+        return zstandard.ZstdDecompressor().decompressobj()
+    return RawCodec()
+
+
+def is_compressed_object(data: bytes) -> bool:
+    return (data.startswith(OBJECT_MAGIC) and len(data) >= HEADER_SIZE and data[len(OBJECT_MAGIC)] in CODEC_NAMES
+            or data.startswith(XZ_MAGIC))
+
+
+def read_header(data: bytes) -> (str, int):
+    if data.startswith(XZ_MAGIC):
+        return LEGACY_COMPRESSION, 0
+    if is_compressed_object(data):
+        return CODEC_NAMES[data[len(OBJECT_MAGIC)]], HEADER_SIZE
+    raise errors.UnsupportedCodecError('Object has an unknown compression header')
+
+
+def compress(data: bytes, codec: str, level: int) -> bytes:
+    codec, level = choose_codec(data[:SAMPLE_SIZE], codec, level)
+    stream = compressor(codec, level)
+    return header(codec) + stream.compress(data) + stream.flush()
+
+
+def decompress(data: bytes) -> bytes:
+    codec, start = read_header(data)
+    return decompressor(codec).decompress(data[start:])
@@ -0,0 +1,262 @@
+import mmap
+import struct
+from collections import namedtuple
+from datetime import datetime
+from os import O_APPEND, O_CREAT, O_WRONLY, close, open as os_open, path, remove, write
+
+from xxhash import xxh3_128
+
+from kit_vcs.lockfile import atomic_write
+
+GRAPH_MAGIC = b'KCGR'
+VERSION = 1
+
+ID_SIZE = 16
+HEADER = struct.Struct('>4sII')
+FANOUT = struct.Struct('>256I')
+POSITION = struct.Struct('>I')
+RECORD = struct.Struct('>16s16sIIIqII')
+TRAILER_SIZE = 16
+TAIL_SUFFIX = '.tail'
+TAIL_RECORD = struct.Struct('>16s16sBIqI')
+MIN_TAIL_FOLD_SIZE = 32 * 1024
+TAIL_FOLD_DIVISOR = 8
+
+COMMIT_HEADER = 'commit\n'
+NO_PARENT = 0xffffffff
+MAX_PARENTS = 2
+
+CommitEntry = namedtuple('CommitEntry', ['commit_id', 'tree', 'parents', 'generation', 'timestamp', 'user', 'date',
+                                         'description'])
+
+
+def to_binary_id(object_id: str | None) -> bytes | None:
+    if object_id is None or len(object_id) != 2 * ID_SIZE:
+        return None
+    try:
+        return bytes.fromhex(object_id)
+    except ValueError:
+        return None
+
+
+def to_timestamp(commit_dt: str) -> int:
+    try:
+        moment = datetime.fromisoformat(commit_dt)
+    except ValueError:
+        return 0
+    return int(moment.timestamp() * 10 ** 6)
+
+
+def parse_commit(commit_id: str, data: str) -> CommitEntry:
+    user, commit_dt, description, tree, *parents = data.split('\n')
+    return CommitEntry(commit_id, tree, [parent for parent in parents if parent != 'None'], 0, to_timestamp(commit_dt),
+                       user, commit_dt, description)
+
+
+def is_graphable(entry: CommitEntry) -> bool:
+    return (to_binary_id(entry.commit_id) is not None and to_binary_id(entry.tree) is not None
+            and len(entry.parents) <= MAX_PARENTS and all(to_binary_id(parent) for parent in entry.parents))
+
+
+class CommitGraph:
+    def __init__(self, graph_path: str) -> None:
+        self.graph_path = graph_path
+        self.tail_path = graph_path + TAIL_SUFFIX
+        self.data = None
+        self.count = 0
+        self.fanout = (0,) * 256
+        self.tail = {}
+        self.tail_size = 0
+        self.load()
+
+    def load(self) -> None:
+        self.close()
+        self.load_base()
+        self.load_tail()
+
+    def load_base(self) -> None:
+        if not path.isfile(self.graph_path) or path.getsize(self.graph_path) < HEADER.size + FANOUT.size:
+            return
+
+        with open(self.graph_path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = HEADER.unpack_from(self.data, 0)
+        if (magic != GRAPH_MAGIC or version != VERSION
+                or xxh3_128(self.data[:-TRAILER_SIZE]).digest() != self.data[-TRAILER_SIZE:]):
+            self.close()
+            return
+
+        self.count = count
+        self.fanout = FANOUT.unpack_from(self.data, HEADER.size)
+
+    def load_tail(self) -> None:
+        if not path.isfile(self.tail_path):
+            return
+
+        with open(self.tail_path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        while offset + TAIL_RECORD.size <= len(data):
+            binary_id, tree, parent_count, generation, timestamp, text_length = TAIL_RECORD.unpack_from(data, offset)
+            end = offset + TAIL_RECORD.size + parent_count * ID_SIZE + text_length
+            if end + TRAILER_SIZE > len(data) or xxh3_128(data[offset:end]).digest() != data[end:end + TRAILER_SIZE]:
+                break
+
+            parents_start = offset + TAIL_RECORD.size
+            text_start = parents_start + parent_count * ID_SIZE
+            parents = [data[start:start + ID_SIZE].hex() for start in range(parents_start, text_start, ID_SIZE)]
+            user, commit_dt, description = data[text_start:end].decode().split('\n', 2)
+            self.tail[binary_id.hex()] = CommitEntry(binary_id.hex(), tree.hex(), parents, generation, timestamp,
+                                                     user, commit_dt, description)
+            offset = end + TRAILER_SIZE
+        self.tail_size = offset
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.close()
+        self.data = None
+        self.count = 0
+        self.fanout = (0,) * 256
+        self.tail = {}
+        self.tail_size = 0
+
+    def __len__(self) -> int:
+        return self.count + sum(1 for commit_id in self.tail if self.find(commit_id) is None)
+
+    @property
+    def positions_start(self) -> int:
+        return HEADER.size + FANOUT.size
+
+    @property
+    def records_start(self) -> int:
+        return self.positions_start + self.count * POSITION.size
+
+    @property
+    def texts_start(self) -> int:
+        return self.records_start + self.count * RECORD.size
+
+    def record(self, position: int) -> tuple:
+        return RECORD.unpack_from(self.data, self.records_start + position * RECORD.size)
+
+    def record_id(self, position: int) -> bytes:
+        start = self.records_start + position * RECORD.size
+        return self.data[start:start + ID_SIZE]
+
+    def sorted_position(self, rank: int) -> int:
+        return POSITION.unpack_from(self.data, self.positions_start + rank * POSITION.size)[0]
+
+    def search(self, binary_id: bytes) -> (int, bool):
+        low = self.fanout[binary_id[0] - 1] if binary_id[0] else 0
+        high = self.fanout[binary_id[0]]
+        while low < high:
+            middle = (low + high) // 2
+            if self.record_id(self.sorted_position(middle)) < binary_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low, low < self.count and self.record_id(self.sorted_position(low)) == binary_id
+
+    def find(self, commit_id: str) -> int | None:
+        binary_id = to_binary_id(commit_id)
+        if self.data is None or binary_id is None:
+            return None
+
+        rank, found = self.search(binary_id)
+        return self.sorted_position(rank) if found else None
+
+    def __contains__(self, commit_id: str) -> bool:
+        return commit_id in self.tail or self.find(commit_id) is not None
+
+    def entry(self, position: int) -> CommitEntry:
+        binary_id, tree, *parents, generation, timestamp, text_offset, text_length = self.record(position)
+        start = self.texts_start + text_offset
+        user, commit_dt, description = self.data[start:start + text_length].decode().split('\n', 2)
+        return CommitEntry(binary_id.hex(), tree.hex(),
+                           [self.record_id(parent).hex() for parent in parents if parent != NO_PARENT],
+                           generation, timestamp, user, commit_dt, description)
+
+    def get(self, commit_id: str) -> CommitEntry | None:
+        entry = self.tail.get(commit_id)
+        if entry is not None:
+            return entry
+
+        position = self.find(commit_id)
+        return self.entry(position) if position is not None else None
+
+    def add(self, entry: CommitEntry) -> None:
+        if not is_graphable(entry):
+            raise ValueError(f'Commit {entry.commit_id} can not be stored in the commit graph')
+
+        parents = [self.get(parent) for parent in entry.parents]
+        if None in parents:
+            raise ValueError(f'Parents of commit {entry.commit_id} are missing from the commit graph')
+
+        generation = 1 + max((parent.generation for parent in parents), default=0)
+        text = f'{entry.user}\n{entry.date}\n{entry.description}'.encode()
+        record = bytearray(TAIL_RECORD.pack(to_binary_id(entry.commit_id), to_binary_id(entry.tree),
+                                            len(entry.parents), generation, entry.timestamp, len(text)))
+        for parent in entry.parents:
+            record.extend(to_binary_id(parent))
+        record.extend(text)
+        record.extend(xxh3_128(bytes(record)).digest())
+
+        descriptor = os_open(self.tail_path, O_WRONLY | O_CREAT | O_APPEND, 0o644)
+        try:
+            write(descriptor, bytes(record))
+        finally:
+            close(descriptor)
+        self.tail[entry.commit_id] = entry._replace(generation=generation)
+        self.tail_size += len(record)
+        if self.tail_size > max(MIN_TAIL_FOLD_SIZE, (self.data.size() if self.data else 0) // TAIL_FOLD_DIVISOR):
+            self.fold()
+
+    def fold(self) -> None:
+        entries = [self.tail.get(entry.commit_id, entry) for entry in map(self.entry, range(self.count))]
+        entries.extend(entry for commit_id, entry in self.tail.items() if self.find(commit_id) is None)
+        self.write(entries)
+
+    def write(self, entries: list[CommitEntry]) -> None:
+        positions = {}
+        generations = []
+        records = bytearray()
+        texts = bytearray()
+        for entry in entries:
+            if not is_graphable(entry) or entry.commit_id in positions:
+                continue
+            parent_positions = [positions.get(parent) for parent in entry.parents]
+            if None in parent_positions:
+                continue
+
+            generation = 1 + max((generations[position] for position in parent_positions), default=0)
+            parent_positions += [NO_PARENT] * (MAX_PARENTS - len(parent_positions))
+            text = f'{entry.user}\n{entry.date}\n{entry.description}'.encode()
+            records.extend(RECORD.pack(to_binary_id(entry.commit_id), to_binary_id(entry.tree), *parent_positions,
+                                       generation, entry.timestamp, len(texts), len(text)))
+            texts.extend(text)
+            positions[entry.commit_id] = len(generations)
+            generations.append(generation)
+
+        fanout = [0] * 256
+        for commit_id in positions:
+            fanout[int(commit_id[:2], 16)] += 1
+        for i in range(1, 256):
+            fanout[i] += fanout[i - 1]
+
+        sorted_positions = b''.join(POSITION.pack(positions[commit_id]) for commit_id in sorted(positions))
+        self.save(fanout, sorted_positions, bytes(records), bytes(texts))
+
+    def save(self, fanout: list[int], positions: bytes, records: bytes, texts: bytes) -> None:
+        data = bytearray(HEADER.pack(GRAPH_MAGIC, VERSION, len(records) // RECORD.size))
+        data.extend(FANOUT.pack(*fanout))
+        data.extend(positions)
+        data.extend(records)
+        data.extend(texts)
+        data.extend(xxh3_128(bytes(data)).digest())
+
+        self.close()
+        atomic_write(self.graph_path, bytes(data))
+        if path.exists(self.tail_path):
+            remove(self.tail_path)
+        self.load()
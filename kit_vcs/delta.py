@@ -0,0 +1,97 @@
+COPY = 1
+INSERT = 0
+MIN_COPY_LINE = 8
+
+
+def encode_varint(value: int) -> bytes:
+    result = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            result.append(byte | 0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+
+def decode_varint(data: bytes, position: int) -> (int, int):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def create_delta(base: bytes, target: bytes) -> bytes:
+    offsets = {}
+    position = 0
+    for line in base.splitlines(keepends=True):
+        offsets.setdefault(line, position)
+        position += len(line)
+
+    result = bytearray(encode_varint(len(base)) + encode_varint(len(target)))
+    insert = bytearray()
+    copy_offset = copy_length = 0
+
+    def flush_copy() -> None:
+        if copy_length:
+            result.append(COPY)
+            result.extend(encode_varint(copy_offset))
+            result.extend(encode_varint(copy_length))
+
+    def flush_insert() -> None:
+        if insert:
+            result.append(INSERT)
+            result.extend(encode_varint(len(insert)))
+            result.extend(insert)
+            insert.clear()
+
+    for line in target.splitlines(keepends=True):
+        if copy_length and base.startswith(line, copy_offset + copy_length):
+            copy_length += len(line)
+            continue
+
+        offset = offsets.get(line) if len(line) >= MIN_COPY_LINE else None
+        if offset is None:
+            flush_copy()
+            copy_length = 0
+            insert.extend(line)
+            continue
+
+        flush_copy()
+        flush_insert()
+        copy_offset, copy_length = offset, len(line)
+
+    flush_copy()
+    flush_insert()
+    return bytes(result)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    base_size, position = decode_varint(delta, 0)
+    target_size, position = decode_varint(delta, position)
+    if base_size != len(base):
+        raise ValueError('Delta base size mismatch')
+
+    base_view = memoryview(base)
+    result = bytearray()
+    while position < len(delta):
+        command = delta[position]
+        position += 1
+        if command == COPY:
+            offset, position = decode_varint(delta, position)
+            length, position = decode_varint(delta, position)
+            result.extend(base_view[offset:offset + length])
+        else:
+            length, position = decode_varint(delta, position)
+            result.extend(delta[position:position + length])
+            position += length
+
+    if len(result) != target_size:
+        raise ValueError('Delta target size mismatch')
+    return bytes(result)
@@ -0,0 +1,272 @@
+from bisect import bisect_left
+from collections import namedtuple
+from math import isqrt
+
+MYERS = 'myers'
+PATIENCE = 'patience'
+HISTOGRAM = 'histogram'
+ALGORITHMS = (MYERS, PATIENCE, HISTOGRAM)
+
+MIN_COST_LIMIT = 256
+MAX_CHAIN_LENGTH = 64
+
+Hunk = namedtuple('Hunk', ['a_start', 'a_end', 'b_start', 'b_end'])
+
+
+def hash_lines(a: list[str], b: list[str]) -> (list[int], list[int]):
+    ids = {}
+    return [ids.setdefault(line, len(ids)) for line in a], [ids.setdefault(line, len(ids)) for line in b]
+
+
+def myers_split(a: list[int], b: list[int], al: int, ah: int, bl: int, bh: int) -> tuple | None:
+    n, m = ah - al, bh - bl
+    delta = n - m
+    front = delta % 2 != 0
+    max_d = (n + m + 1) // 2
+    cost_limit = max(MIN_COST_LIMIT, isqrt(n + m))
+    v_offset = max_d + 1
+    v1 = [-1] * (2 * v_offset + 2)
+    v2 = [-1] * (2 * v_offset + 2)
+    v1[v_offset + 1] = v2[v_offset + 1] = 0
+    k1_start = k1_end = k2_start = k2_end = 0
+    best = None
+
+    for d in range(max_d + 1):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[al + x1] == b[bl + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+
+            if x1 > n:
+                k1_end += 2
+            elif y1 > m:
+                k1_start += 2
+            else:
+                if best is None or x1 + y1 > best[0] + best[1]:
+                    best = (x1, y1)
+                if front:
+                    k2_offset = v_offset + delta - k1
+                    if 0 <= k2_offset < len(v2) and v2[k2_offset] != -1 and x1 >= n - v2[k2_offset]:
+                        return al + x1, bl + y1, al + x1, bl + y1
+
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[ah - x2 - 1] == b[bh - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+
+            if x2 > n:
+                k2_end += 2
+            elif y2 > m:
+                k2_start += 2
+            elif not front:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < len(v1) and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = x1 - (delta - k2)
+                    if x1 >= n - x2:
+                        return al + x1, bl + y1, al + x1, bl + y1
+
+        if d >= cost_limit and best is not None:
+            return al + best[0], bl + best[1], al + best[0], bl + best[1]
+
+    return None
+
+
+def patience_anchors(a: list[int], b: list[int], al: int, ah: int, bl: int, bh: int) -> list[tuple]:
+    a_counts, b_counts = {}, {}
+    for i in range(al, ah):
+        a_counts[a[i]] = i if a[i] not in a_counts else -1
+    for j in range(bl, bh):
+        b_counts[b[j]] = j if b[j] not in b_counts else -1
+
+    pairs = [(a_counts[b[j]], j) for j in range(bl, bh) if b_counts[b[j]] == j and a_counts.get(b[j], -1) >= 0]
+    tails, links = [], []
+    for index, (i, _) in enumerate(pairs):
+        position = bisect_left(tails, i, key=lambda tail: pairs[tail][0])
+        links.append(tails[position - 1] if position else None)
+        if position == len(tails):
+            tails.append(index)
+        else:
+            tails[position] = index
+
+    anchors = []
+    index = tails[-1] if tails else None
+    while index is not None:
+        i, j = pairs[index]
+        anchors.append((i, j, i + 1, j + 1))
+        index = links[index]
+    return anchors[::-1]
+
+
+def histogram_anchors(a: list[int], b: list[int], al: int, ah: int, bl: int, bh: int) -> list[tuple]:
+    positions = {}
+    for i in range(al, ah):
+        positions.setdefault(a[i], []).append(i)
+
+    min_count = MAX_CHAIN_LENGTH + 1
+    for j in range(bl, bh):
+        count = len(positions.get(b[j], ()))
+        if 0 < count < min_count:
+            min_count = count
+    if min_count > MAX_CHAIN_LENGTH:
+        return []
+
+    best = None
+    j = bl
+    while j < bh:
+        next_j = j + 1
+        if len(positions.get(b[j], ())) == min_count:
+            for i in positions[b[j]]:
+                start_a, start_b, end_a, end_b = i, j, i + 1, j + 1
+                while start_a > al and start_b > bl and a[start_a - 1] == b[start_b - 1]:
+                    start_a -= 1
+                    start_b -= 1
+                while end_a < ah and end_b < bh and a[end_a] == b[end_b]:
+                    end_a += 1
+                    end_b += 1
+                if best is None or end_a - start_a > best[2] - best[0]:
+                    best = (start_a, start_b, end_a, end_b)
+                next_j = max(next_j, end_b)
+        j = next_j
+    return [best]
+
+
+def find_anchors(a: list[int], b: list[int], al: int, ah: int, bl: int, bh: int, algorithm: str) -> list[tuple]:
+    anchors = []
+    if algorithm in (PATIENCE, HISTOGRAM):
+        anchors = patience_anchors(a, b, al, ah, bl, bh)
+    if algorithm == HISTOGRAM and not anchors:
+        anchors = histogram_anchors(a, b, al, ah, bl, bh)
+    if anchors:
+        return anchors
+
+    split = myers_split(a, b, al, ah, bl, bh)
+    if split is None or split in ((al, bl, al, bl), (ah, bh, ah, bh)):
+        return []
+    return [split]
+
+
+def diff(a: list[str], b: list[str], algorithm: str = MYERS) -> list[Hunk]:
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unknown diff algorithm {algorithm}')
+
+    a_ids, b_ids = hash_lines(a, b)
+    common = set(a_ids) & set(b_ids)
+    a_changed = [line not in common for line in a_ids]
+    b_changed = [line not in common for line in b_ids]
+    a_index = [i for i, line in enumerate(a_ids) if line in common]
+    b_index = [j for j, line in enumerate(b_ids) if line in common]
+    a_ids = [a_ids[i] for i in a_index]
+    b_ids = [b_ids[j] for j in b_index]
+
+    regions = [(0, len(a_ids), 0, len(b_ids))]
+    while regions:
+        al, ah, bl, bh = regions.pop()
+        while al < ah and bl < bh and a_ids[al] == b_ids[bl]:
+            al += 1
+            bl += 1
+        while al < ah and bl < bh and a_ids[ah - 1] == b_ids[bh - 1]:
+            ah -= 1
+            bh -= 1
+
+        anchors = find_anchors(a_ids, b_ids, al, ah, bl, bh, algorithm) if al < ah and bl < bh else []
+        if not anchors:
+            for i in range(al, ah):
+                a_changed[a_index[i]] = True
+            for j in range(bl, bh):
+                b_changed[b_index[j]] = True
+            continue
+
+        for anchor_al, anchor_bl, anchor_ah, anchor_bh in reversed(anchors):
+            regions.append((anchor_ah, ah, anchor_bh, bh))
+            ah, bh = anchor_al, anchor_bl
+        regions.append((al, ah, bl, bh))
+
+    hunks = []
+    i = j = 0
+    while i < len(a) or j < len(b):
+        if i < len(a) and j < len(b) and not a_changed[i] and not b_changed[j]:
+            i += 1
+            j += 1
+            continue
+
+        a_start, b_start = i, j
+        while i < len(a) and a_changed[i]:
+            i += 1
+        while j < len(b) and b_changed[j]:
+            j += 1
+        hunks.append(Hunk(a_start, i, b_start, j))
+    return hunks
+
+
+def diff_lines(a: list[str], b: list[str], algorithm: str = MYERS) -> (str, str):
+    position = 0
+    for hunk in diff(a, b, algorithm):
+        for line in a[position:hunk.a_start]:
+            yield ' ', line
+        for line in a[hunk.a_start:hunk.a_end]:
+            yield '-', line
+        for line in b[hunk.b_start:hunk.b_end]:
+            yield '+', line
+        position = hunk.a_end
+
+    for line in a[position:]:
+        yield ' ', line
+
+
+def merge3(base: list[str], ours: list[str], theirs: list[str], algorithm: str = MYERS) -> (list[str], bool):
+    changes = sorted([(*hunk, 0) for hunk in diff(base, ours, algorithm)] +
+                     [(*hunk, 1) for hunk in diff(base, theirs, algorithm)])
+
+    result = []
+    conflict = False
+    position = 0
+    offsets = [0, 0]
+    index = 0
+    while index < len(changes):
+        group_start, group_end = changes[index][0], changes[index][1]
+        sides = ([], [])
+        while index < len(changes) and changes[index][0] <= group_end:
+            sides[changes[index][4]].append(changes[index])
+            group_end = max(group_end, changes[index][1])
+            index += 1
+
+        versions = []
+        for side, lines in ((0, ours), (1, theirs)):
+            if sides[side]:
+                first, last = sides[side][0], sides[side][-1]
+                versions.append(lines[group_start + first[2] - first[0]:group_end + last[3] - last[1]])
+                offsets[side] = last[3] - last[1]
+            else:
+                versions.append(lines[group_start + offsets[side]:group_end + offsets[side]])
+
+        result.extend(base[position:group_start])
+        if not sides[1] or versions[0] == versions[1]:
+            result.extend(versions[0])
+        elif not sides[0]:
+            result.extend(versions[1])
+        else:
+            conflict = True
+            result.append('<<<<<<< YOURS')
+            result.extend(versions[0])
+            result.append('=======')
+            result.extend(versions[1])
+            result.append('>>>>>>> THEIRS')
+        position = group_end
+
+    result.extend(base[position:])
+    return result, conflict
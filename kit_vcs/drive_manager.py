@@ -1,100 +1,458 @@
-import lzma
 import platform
 import subprocess
 from datetime import datetime
-from difflib import ndiff
-from distutils.dir_util import copy_tree
-from os import listdir, makedirs, path, remove, rmdir, walk
-
-from kit_vcs.utils import Utils
+from heapq import heappop, heappush
+from itertools import chain
+from os import DirEntry, listdir, makedirs, path, remove, replace, rmdir, scandir, sep, walk
+from tempfile import mkstemp
+
+from xxhash import xxh3_128
+
+import kit_vcs.cache as cache
+import kit_vcs.codec as codec
+import kit_vcs.diff as diff
+import kit_vcs.errors as errors
+import kit_vcs.fsmonitor as fsmonitor
+import kit_vcs.trace as trace
+from kit_vcs.commit_graph import COMMIT_HEADER, CommitEntry, CommitGraph, is_graphable, parse_commit
+from kit_vcs.delta import create_delta
+from kit_vcs.ignore import IgnoreMatcher
+from kit_vcs.index import UNKNOWN, Index, IndexEntry
+from kit_vcs.lockfile import LOCK_SUFFIX, LockFile, atomic_write
+from kit_vcs.object_ids import ObjectIdIndex, is_id_prefix
+from kit_vcs.pack import ID_SIZE, MAX_DELTA_DEPTH, OBJ_BLOB, OBJ_COMMIT, OBJ_DELTA, OBJ_TREE, PackStore
+from kit_vcs.packed_refs import SEPARATOR, PackedRefs, to_ref_name
+from kit_vcs.tree import MODE_FILE, MODE_TREE, TREE_HEADER, parse_tree, serialize_tree
+from kit_vcs.utils import CHUNK_SIZE, TREE_SEED_OFFSET, Utils
+
+NO_REF = ''
+TYPE_PROBE_SIZE = 16
 
 
 class DriveManager:
-    def __init__(self, workspace_path: str) -> None:
+    def __init__(self, workspace_path: str, jobs: int | None = None, diff_algorithm: str = diff.MYERS,
+                 cache_size: int = cache.DEFAULT_CACHE_SIZE) -> None:
         self.workspace_path = workspace_path
+        self.jobs = jobs or Utils.default_jobs()
+        self.diff_algorithm = diff_algorithm
         self.repo_path = path.join(self.workspace_path, '.kit')
         self.index_path = path.join(self.repo_path, 'INDEX')
+        self.index = Index(self.index_path)
         self.index_hashes = self.get_index_hashes()
-        self.temp_path = path.join(self.repo_path, 'TEMP')
+        self.pending_index_paths = {}
+        self.hash_mode = self.get_hash_mode()
+        self.compression = self.get_compression()
+        self.cache = cache.LRUCache(cache_size)
+        self.ignore = IgnoreMatcher(self.workspace_path)
+        self.commit_graph = CommitGraph(path.join(self.repo_path, 'COMMIT_GRAPH'))
+        self.packed_refs = PackedRefs(path.join(self.repo_path, 'PACKED_REFS'))
+        self.packs = PackStore(path.join(self.repo_path, 'objects', 'pack'), codec.decompress, self.cache)
+
+    def object_path(self, object_hash: str) -> str:
+        return path.join(self.repo_path, 'objects', object_hash[:2], object_hash[2:])
+
+    def has_object(self, object_hash: str) -> bool:
+        return path.exists(self.object_path(object_hash)) or object_hash in self.packs
+
+    def object_id_index(self) -> ObjectIdIndex:
+        return ObjectIdIndex(path.join(self.repo_path, 'objects'), self.packs)
+
+    def get_object_type(self, object_hash: str) -> int | None:
+        object_path = self.object_path(object_hash)
+        if path.isfile(object_path):
+            with open(object_path, 'rb') as f:
+                return self.loose_object_type(f.read(TYPE_PROBE_SIZE))
+
+        entry = self.packs.read_entry(object_hash)
+        if entry is None:
+            return None
+        return OBJ_BLOB if entry[0] == OBJ_DELTA else entry[0]
 
-    def save_file(self, local_path: str, file_hash: str) -> None:
-        folder = file_hash[:2]
-        name = file_hash[2:]
+    @staticmethod
+    def loose_object_type(data: bytes) -> int:
+        if codec.is_compressed_object(data):
+            return OBJ_BLOB
+        if data.startswith(COMMIT_HEADER.encode()):
+            return OBJ_COMMIT
+        return OBJ_TREE if data.startswith(TREE_HEADER.encode()) else OBJ_COMMIT
+
+    def resolve_commit(self, name: str) -> str | None:
+        name = name.lower()
+        if len(name) == 2 * ID_SIZE or not is_id_prefix(name):
+            return name if self.has_object(name) else None
+
+        commits = [object_id for object_id in self.object_id_index().find(name)
+                   if self.get_object_type(object_id) == OBJ_COMMIT]
+        if len(commits) > 1:
+            candidates = '\n'.join(f'\t{commit_id} {entry.date} {entry.description}'
+                                   for commit_id, entry in zip(commits, map(self.get_commit_entry, commits)))
+            raise errors.AmbiguousObjectError(f'Short commit ID {name} is ambiguous. Candidates:\n{candidates}')
+        return commits[0] if commits else None
+
+    @trace.traced
+    def read_object(self, object_hash: str) -> bytes | None:
+        object_path = self.object_path(object_hash)
+        if path.isfile(object_path):
+            with open(object_path, 'rb') as f:
+                data = f.read()
+            trace.count(trace.OBJECTS_READ)
+            trace.count(trace.COMPRESSED_BYTES_READ, len(data))
+            return data
+
+        data = self.packs.get(object_hash)
+        if data is not None:
+            trace.count(trace.OBJECTS_READ)
+            trace.count(trace.UNCOMPRESSED_BYTES_READ, len(data))
+        return data
+
+    def read_blob(self, file_hash: str, as_memoryview: bool = False) -> bytes | memoryview | None:
+        content = self.cache.get(cache.BLOBS, file_hash)
+        if content is None:
+            if not self.has_object(file_hash):
+                return None
+            content = b''.join(self.iter_blob(file_hash))
+            if len(content) <= cache.MAX_CACHED_BLOB_SIZE:
+                self.cache.put(cache.BLOBS, file_hash, content, len(content))
+        return memoryview(content) if as_memoryview else content
+
+    def read_blob_lines(self, file_hash: str) -> list[str]:
+        return self.read_blob(file_hash).decode(errors='replace').splitlines()
+
+    def iter_blob(self, file_hash: str) -> bytes:
+        object_path = self.object_path(file_hash)
+        if not path.isfile(object_path):
+            content = self.packs.get_content(file_hash)
+            if content is None:
+                raise errors.NotFoundError(f'Object {file_hash} does not exist')
+            trace.count(trace.OBJECTS_READ)
+            trace.count(trace.UNCOMPRESSED_BYTES_READ, len(content))
+            yield content
+            return
 
-        input_path = path.join(self.workspace_path, local_path)
-        output_folder = path.join(self.repo_path, 'objects', folder)
-        output_path = path.join(output_folder, name)
+        with open(object_path, 'rb') as compressed_file:
+            prefix = compressed_file.read(len(codec.XZ_MAGIC))
+            codec_name, start = codec.read_header(prefix)
+            decompressor = codec.decompressor(codec_name)
+
+            for chunk in chain([prefix[start:]], iter(lambda: compressed_file.read(CHUNK_SIZE), b"")):
+                content = decompressor.decompress(chunk)
+                trace.count(trace.UNCOMPRESSED_BYTES_READ, len(content))
+                yield content
+            trace.count(trace.OBJECTS_READ)
+            trace.count(trace.COMPRESSED_BYTES_READ, compressed_file.tell())
+
+    @trace.traced
+    def read_commit(self, commit_id: str) -> str | None:
+        commit_path = self.object_path(commit_id)
+        if path.exists(commit_path):
+            trace.count(trace.OBJECTS_READ)
+            with open(commit_path, 'r') as f:
+                return self.strip_commit_header(f.read())
+
+        data = self.packs.get(commit_id)
+        if data is None:
+            return None
+        trace.count(trace.OBJECTS_READ)
+        return self.strip_commit_header(data.decode())
 
-        makedirs(output_folder, exist_ok=True)
+    @staticmethod
+    def strip_commit_header(data: str) -> str:
+        return data[len(COMMIT_HEADER):] if data.startswith(COMMIT_HEADER) else data
 
-        with open(input_path, 'rb') as input_file, lzma.open(output_path, 'wb') as output_file:
-            for chunk in iter(lambda: input_file.read(4096), b""):
-                output_file.write(chunk)
+    @trace.traced
+    def save_file(self, local_path: str, file_hash: str) -> None:
+        if self.has_object(file_hash):
+            return
 
-    def save_tree(self, tree_hash: str, prev_tree_hash: str) -> None:
-        prev_tree_path = path.join(self.repo_path, 'objects', prev_tree_hash[:2], prev_tree_hash[2:])
-        hash_folder = path.join(self.repo_path, 'objects', tree_hash[:2], tree_hash[2:])
-        makedirs(hash_folder, exist_ok=True)
-        if path.exists(prev_tree_path):
-            copy_tree(prev_tree_path, hash_folder)
+        with open(path.join(self.workspace_path, local_path), 'rb') as input_file:
+            self.store_blob(input_file, file_hash=file_hash)
+
+    @trace.traced
+    def hash_and_save_file(self, local_path: str, seed: int) -> str:
+        input_path = path.join(self.workspace_path, local_path)
+        with open(input_path, 'rb') as input_file:
+            return self.store_blob(input_file, self.new_file_hasher(input_path, seed))
+
+    def new_file_hasher(self, input_path: str, seed: int) -> xxh3_128:
+        if self.hash_mode == 'content':
+            return xxh3_128(seed=seed)
+        return xxh3_128(path.relpath(input_path, start=self.workspace_path), seed=seed)
+
+    def store_blob(self, input_file, file_hasher: xxh3_128 | None = None, file_hash: str | None = None) -> str:
+        descriptor, temp_path = mkstemp(prefix='tmp_', dir=path.join(self.repo_path, 'objects'))
+        try:
+            with open(descriptor, 'wb') as output_file:
+                uncompressed_size, compressed_size = self.write_blob(input_file, output_file, file_hasher)
+
+            file_hash = file_hash or file_hasher.hexdigest()
+            if self.has_object(file_hash):
+                remove(temp_path)
+                return file_hash
+            makedirs(path.dirname(self.object_path(file_hash)), exist_ok=True)
+            replace(temp_path, self.object_path(file_hash))
+        except BaseException:
+            if path.exists(temp_path):
+                remove(temp_path)
+            raise
+
+        trace.count(trace.OBJECTS_WRITTEN)
+        trace.count(trace.UNCOMPRESSED_BYTES_WRITTEN, uncompressed_size)
+        trace.count(trace.COMPRESSED_BYTES_WRITTEN, compressed_size)
+        return file_hash
+
+    def write_blob(self, input_file, output_file, file_hasher: xxh3_128 | None = None) -> (int, int):
+        sample = input_file.read(codec.SAMPLE_SIZE)
+        codec_name, level = codec.choose_codec(sample, *self.compression)
+        compressor = codec.compressor(codec_name, level)
+
+        header = codec.header(codec_name)
+        output_file.write(header)
+        uncompressed_size, compressed_size = 0, len(header)
+        for chunk in chain([sample], iter(lambda: input_file.read(CHUNK_SIZE), b"")):
+            if file_hasher is not None:
+                file_hasher.update(chunk)
+            compressed = compressor.compress(chunk)
+            output_file.write(compressed)
+            uncompressed_size += len(chunk)
+            compressed_size += len(compressed)
+        compressed = compressor.flush()
+        output_file.write(compressed)
+        return uncompressed_size, compressed_size + len(compressed)
+
+    @trace.traced
+    def save_tree(self, prev_tree_hash: str | None, seed: int) -> str:
+        changes = {}
+        if prev_tree_hash and path.isdir(self.object_path(prev_tree_hash)):
+            for filepath, file_hash in self.get_tree_entries(prev_tree_hash).items():
+                changes[tuple(filepath.split(sep))] = file_hash
+            prev_tree_hash = None
 
         for filepath in self.index_hashes:
-            file_hash, is_add = self.index_hashes[filepath][0], self.index_hashes[filepath][1]
-            folder_name = path.split(filepath)[:-1][0]
-            folder_path = path.join(hash_folder, folder_name)
-            if folder_name:
-                makedirs(folder_path, exist_ok=True)
-            filepath = path.join(folder_path, path.basename(filepath))
+            file_hash, is_add = self.index_hashes[filepath]
+            changes[tuple(path.normpath(filepath).split(sep))] = file_hash if is_add else None
+
+        return self.update_tree(prev_tree_hash, changes, seed) or self.write_tree({}, seed)
+
+    def update_tree(self, tree_hash: str | None, changes: dict[tuple: str | None], seed: int) -> str | None:
+        entries = dict(self.read_tree(tree_hash)) if tree_hash else {}
+        nested_changes = {}
+        for parts, file_hash in changes.items():
+            if len(parts) > 1:
+                nested_changes.setdefault(parts[0], {})[parts[1:]] = file_hash
+            elif file_hash is None:
+                entries.pop(parts[0], None)
+            else:
+                entries[parts[0]] = (MODE_FILE, file_hash)
+
+        for name, subtree_changes in nested_changes.items():
+            mode, subtree_hash = entries.get(name, (MODE_TREE, None))
+            subtree_hash = self.update_tree(subtree_hash if mode == MODE_TREE else None, subtree_changes, seed)
+            if subtree_hash is None:
+                entries.pop(name, None)
+            else:
+                entries[name] = (MODE_TREE, subtree_hash)
+
+        if not entries:
+            return None
+        return self.write_tree(entries, seed)
+
+    @trace.traced
+    def write_tree(self, entries: dict[str: (str, str)], seed: int) -> str:
+        data = serialize_tree(entries)
+        tree_hash = Utils.get_string_hash(data, seed + TREE_SEED_OFFSET).hexdigest()
+        if not self.has_object(tree_hash):
+            makedirs(path.join(self.repo_path, 'objects', tree_hash[:2]), exist_ok=True)
+            atomic_write(self.object_path(tree_hash), data)
+            trace.count(trace.OBJECTS_WRITTEN)
+            trace.count(trace.UNCOMPRESSED_BYTES_WRITTEN, len(data))
+            trace.count(trace.COMPRESSED_BYTES_WRITTEN, len(data))
+        self.cache.put(cache.TREES, tree_hash, entries, cache.tree_size(entries))
+        return tree_hash
+
+    def read_tree(self, tree_hash: str) -> dict[str: (str, str)]:
+        entries = self.cache.get(cache.TREES, tree_hash)
+        if entries is None:
+            data = self.read_object(tree_hash)
+            entries = parse_tree(data.decode()) if data is not None else {}
+            self.cache.put(cache.TREES, tree_hash, entries, cache.tree_size(entries))
+        return entries
+
+    def get_tree_entry(self, tree_hash: str | None, local_path: str) -> tuple[str, str] | None:
+        if not tree_hash:
+            return None
+
+        entry = (MODE_TREE, tree_hash)
+        for name in Utils.split_local_path(local_path):
+            mode, object_hash = entry
+            if mode != MODE_TREE:
+                return None
+            entry = self.read_tree(object_hash).get(name)
+            if entry is None:
+                return None
+        return entry
+
+    def get_tree_file_hash(self, tree_hash: str | None, local_path: str) -> str | None:
+        if not tree_hash:
+            return None
+        if path.isdir(self.object_path(tree_hash)):
+            return self.get_tree_entries(tree_hash).get(path.normpath(local_path))
 
-            if is_add:
-                with open(filepath, 'w') as f:
-                    f.write(file_hash)
-                continue
-            remove(filepath)
+        mode, file_hash = self.get_tree_entry(tree_hash, local_path) or (MODE_TREE, None)
+        return file_hash if mode == MODE_FILE else None
 
+    @trace.traced
     def load_file(self, file_hash: str, output_path: str) -> None:
-        folder = file_hash[:2]
-        name = file_hash[2:]
-        compressed_path = path.join(self.repo_path, 'objects', folder, name)
-
         makedirs(path.dirname(output_path), exist_ok=True)
 
-        with lzma.open(compressed_path, 'rb') as compressed_file, open(output_path, 'wb') as output_file:
-            for chunk in iter(lambda: compressed_file.read(4096), b""):
+        with open(output_path, 'wb') as output_file:
+            for chunk in self.iter_blob(file_hash):
                 output_file.write(chunk)
 
+    @trace.traced
+    def load_files(self, files: list[(str, str)]) -> None:
+        Utils.run_jobs(lambda file: self.load_file(file[1], path.join(self.workspace_path, file[0])), files, self.jobs)
+
     def save_files_from_index(self) -> None:
-        for filepath in self.index_hashes:
-            if self.index_hashes[filepath][1]:
-                self.save_file(filepath, self.index_hashes[filepath][0])
+        files = {}
+        for filepath, (filehash, is_add) in self.index_hashes.items():
+            if is_add:
+                files.setdefault(filehash, filepath)
+        added_files = [(filepath, filehash) for filehash, filepath in files.items()]
+        Utils.run_jobs(lambda file: self.save_file(*file), added_files, self.jobs)
 
     def write(self, local_path: str, data: str, mode: str = 'w') -> None:
         with open(path.join(self.workspace_path, local_path), mode) as file:
             file.write(data)
 
+    def read_loose_ref(self, ref: str) -> str | None:
+        try:
+            with open(path.join(self.repo_path, ref), 'r') as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+
+    def read_ref(self, ref: str) -> str | None:
+        value = self.read_loose_ref(ref)
+        return value if value is not None else self.packed_refs.get(ref)
+
+    def list_loose_refs(self, prefix: str) -> dict[str: str]:
+        refs = {}
+        for root, _, files in walk(path.join(self.repo_path, prefix)):
+            for file in files:
+                if file.endswith(LOCK_SUFFIX):
+                    continue
+                ref = path.relpath(path.join(root, file), self.repo_path)
+                value = self.read_loose_ref(ref)
+                if value is not None:
+                    refs[to_ref_name(ref)] = value
+        return refs
+
+    def list_refs(self, prefix: str) -> dict[str: str]:
+        name_prefix = to_ref_name(prefix) + SEPARATOR
+        refs = dict(self.packed_refs.items(name_prefix)) | self.list_loose_refs(prefix)
+        return {name[len(name_prefix):]: value for name, value in sorted(refs.items())}
+
+    def update_ref(self, ref: str, value: str, expected: str | None = None) -> None:
+        with LockFile(path.join(self.repo_path, ref)) as lock:
+            if expected is not None:
+                self.packed_refs.refresh()
+                current = self.read_ref(ref)
+                if (current or NO_REF) != expected:
+                    raise errors.RefUpdateError(f'Reference {ref} was updated by another process, expected '
+                                                f'{expected or "no reference"} but found {current}')
+            lock.write(value)
+            lock.commit()
+
+    def delete_ref(self, ref: str) -> None:
+        ref_path = path.join(self.repo_path, ref)
+        with LockFile(ref_path):
+            if path.isfile(ref_path):
+                remove(ref_path)
+
+            self.packed_refs.refresh()
+            if self.packed_refs.get(ref) is None:
+                return
+            with LockFile(self.packed_refs.refs_path) as packed_lock:
+                self.packed_refs.refresh()
+                refs = dict(self.packed_refs.items())
+                refs.pop(to_ref_name(ref), None)
+                self.packed_refs.write(packed_lock, refs)
+
+    @trace.traced
+    def pack_refs(self) -> int:
+        with LockFile(self.packed_refs.refs_path) as packed_lock:
+            self.packed_refs.refresh()
+            loose_refs = self.list_loose_refs('refs')
+            refs = dict(self.packed_refs.items()) | loose_refs
+            self.packed_refs.write(packed_lock, refs)
+
+        for name, value in loose_refs.items():
+            ref = path.join(*name.split(SEPARATOR))
+            with LockFile(path.join(self.repo_path, ref)):
+                if self.read_loose_ref(ref) == value:
+                    remove(path.join(self.repo_path, ref))
+        return len(refs)
+
     def read(self, local_path: str) -> str:
         with open(path.join(self.workspace_path, local_path), 'r') as file:
             return file.read()
 
+    @trace.traced
     def write_commit_data(self, commit_id: str, username: str, commit_dt: str | datetime, description: str, tree: str,
-                          parent: str | None) -> None:
+                          parent: str | None, merge_parent: str | None = None) -> None:
         makedirs(path.join(self.repo_path, 'objects', commit_id[:2]), exist_ok=True)
-        with open(path.join(self.repo_path, 'objects', commit_id[:2], commit_id[2:]), 'w') as commit:
-            commit.write(f"{username}\n{commit_dt}\n{description}\n{tree}\n{parent}")
+        data = f"{COMMIT_HEADER}{username}\n{commit_dt}\n{description}\n{tree}\n{parent}"
+        if merge_parent is not None:
+            data += f"\n{merge_parent}"
+        atomic_write(self.object_path(commit_id), data)
+        trace.count(trace.OBJECTS_WRITTEN)
 
+    @trace.traced
     def calculate_index_data(self, local_path: str, prev_tree_hash: str, seed: int, is_add: bool = True) -> None:
         file_path = path.join(self.workspace_path, local_path)
         if local_path != "." and Utils.check_for_dot_path(file_path):
             return
-        if not path.isdir(file_path):
-            rel_path = path.relpath(file_path, start=self.workspace_path)
-            filehash = Utils.get_file_hash(file_path, self.workspace_path, seed).hexdigest()
 
-            prev_tree_path = path.join(self.repo_path, 'objects', prev_tree_hash[:2], prev_tree_hash[2:])
-            prev_filehash = None
-            if path.exists(path.join(prev_tree_path, rel_path)):
-                with open(path.join(prev_tree_path, rel_path), 'r') as f:
-                    prev_filehash = f.read().strip()
+        file_stats = self.get_workspace_stats(file_path)
+        self.update_index_entries(dict.fromkeys(file_stats, is_add), prev_tree_hash, seed, file_stats)
+
+    def begin_index_update(self) -> None:
+        self.pending_index_paths = {}
+
+    def stage_index_path(self, local_path: str, is_add: bool = True) -> None:
+        file_path = path.join(self.workspace_path, local_path)
+        if local_path != "." and Utils.check_for_dot_path(file_path):
+            return
+
+        for rel_path in self.get_workspace_files(file_path):
+            self.pending_index_paths[rel_path] = is_add
+
+    def stage_index_file(self, local_path: str, file_hash: str) -> None:
+        self.update_stat_data(local_path, file_hash, Utils.get_stat_data(path.join(self.workspace_path, local_path)))
+        self.pending_index_paths[local_path] = True
+
+    @trace.traced
+    def commit_index_update(self, prev_tree_hash: str | None, seed: int) -> None:
+        pending_paths, self.pending_index_paths = self.pending_index_paths, {}
+        self.update_index_entries(pending_paths, prev_tree_hash, seed)
+        self.write_index_data()
+
+    @trace.traced
+    def update_index_entries(self, paths: dict[str: bool], prev_tree_hash: str | None, seed: int,
+                             file_stats: dict[str: tuple | None] | None = None) -> None:
+        rel_paths = list(paths)
+        file_stats = file_stats or {}
+        index_entries = self.index.get_many(rel_paths)
+        file_hashes = Utils.run_jobs(lambda rel_path: self.get_index_file_hash(rel_path, seed, paths[rel_path],
+                                                                               file_stats.get(rel_path),
+                                                                               index_entries[rel_path]),
+                                     rel_paths, self.jobs)
+
+        for rel_path, (filehash, file_stat) in zip(rel_paths, file_hashes):
+            self.update_stat_data(rel_path, filehash, file_stat, index_entries[rel_path])
+
+            prev_filehash = self.get_tree_file_hash(prev_tree_hash, rel_path)
+            is_add = paths[rel_path]
 
             if is_add:
                 if prev_filehash is None or prev_filehash != filehash:
@@ -105,69 +463,209 @@ class DriveManager:
                 self.index_hashes[rel_path] = (filehash, False)
             elif not is_add and prev_filehash is None:
                 del self.index_hashes[rel_path]
-            return
+                self.index.remove(rel_path)
 
-        for root, _, files in walk(file_path):
-            for file in files:
-                file_full_path = path.join(root, file)
-                relative_path = path.relpath(file_full_path, start=self.workspace_path)
-                self.calculate_index_data(relative_path, prev_tree_hash, seed, is_add)
+    def get_workspace_files(self, file_path: str) -> list[str]:
+        return list(self.get_workspace_stats(file_path))
 
+    def get_workspace_stats(self, file_path: str) -> dict[str: tuple | None]:
+        rel_path = path.relpath(file_path, start=self.workspace_path)
+        if not path.isdir(file_path):
+            return {rel_path: None}
+        return dict(sorted(self.scan_workspace(rel_path).items()))
+
+    def walk_workspace(self, rel_folder: str = '') -> (str, DirEntry):
+        rel_folder = '' if rel_folder in ('', '.') else path.normpath(rel_folder)
+        stack = [(path.join(self.workspace_path, rel_folder), rel_folder + sep if rel_folder else '',
+                  self.ignore.chain_for(rel_folder))]
+        while stack:
+            folder, prefix, chain = stack.pop()
+            with scandir(folder) as entries:
+                for entry in entries:
+                    rel_path = prefix + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.') and not self.ignore.match(chain, rel_path, True):
+                            stack.append((entry.path, rel_path + sep, self.ignore.enter(chain, rel_path)))
+                    elif entry.is_file() and not self.ignore.match(chain, rel_path, False):
+                        yield rel_path, entry
+
+    @trace.traced
+    def scan_workspace(self, rel_folder: str = '') -> dict[str: tuple]:
+        rel_folder = '' if rel_folder in ('', '.') else path.normpath(rel_folder)
+        if (fsmonitor.read_monitor_file(self.repo_path) is None
+                or rel_folder and self.ignore.is_ignored(rel_folder, True)):
+            return self.walk_stats(rel_folder)
+
+        state_token, file_stats = fsmonitor.read_state(self.repo_path)
+        monitor = fsmonitor.query(self.repo_path, state_token)
+        if monitor is None:
+            return self.walk_stats(rel_folder)
+
+        token, changed_paths = monitor
+        if changed_paths is None:
+            file_stats = self.walk_stats()
+        else:
+            self.apply_monitor_changes(file_stats, changed_paths)
+        if token != state_token or changed_paths:
+            fsmonitor.write_state(self.repo_path, token, file_stats)
+
+        if not rel_folder:
+            return file_stats
+        prefix = rel_folder + sep
+        return {rel_path: file_stat for rel_path, file_stat in file_stats.items() if rel_path.startswith(prefix)}
+
+    @trace.traced
+    def walk_stats(self, rel_folder: str = '') -> dict[str: tuple]:
+        return {rel_path: Utils.to_stat_data(entry.stat()) for rel_path, entry in self.walk_workspace(rel_folder)}
+
+    def apply_monitor_changes(self, file_stats: dict[str: tuple], changed_paths: list[str]) -> None:
+        for rel_path in changed_paths:
+            file_stats.pop(rel_path, None)
+        folders = tuple(rel_path + sep for rel_path in changed_paths
+                        if not path.isfile(path.join(self.workspace_path, rel_path)))
+        if folders:
+            for rel_path in [rel_path for rel_path in file_stats if rel_path.startswith(folders)]:
+                del file_stats[rel_path]
+
+        for rel_path in changed_paths:
+            file_path = path.join(self.workspace_path, rel_path)
+            if path.islink(file_path) and path.isdir(file_path):
+                continue
+            if path.isdir(file_path):
+                if not self.ignore.is_ignored(rel_path, True):
+                    file_stats.update(self.walk_stats(rel_path))
+            elif path.isfile(file_path) and not self.ignore.is_ignored(rel_path):
+                file_stats[rel_path] = Utils.get_stat_data(file_path)
+
+    @trace.traced
+    def get_workspace_status(self, head_tree_hash: str | None, seed: int) -> (list[str], list[str], list[str]):
+        workspace_files = self.scan_workspace()
+        tracked_files = self.get_tree_entries(head_tree_hash)
+        for rel_path, (file_hash, is_add) in self.index_hashes.items():
+            if is_add:
+                tracked_files[rel_path] = file_hash
+            else:
+                tracked_files.pop(rel_path, None)
+        for rel_path in tracked_files.keys() - workspace_files.keys():
+            file_path = path.join(self.workspace_path, rel_path)
+            if path.isfile(file_path):
+                workspace_files[rel_path] = Utils.get_stat_data(file_path)
+
+        index_entries = dict(self.index.items())
+        current_hashes = {}
+        suspicious_paths = []
+        for rel_path, file_stat in workspace_files.items():
+            if rel_path not in tracked_files:
+                continue
+            entry = index_entries.get(rel_path)
+            if entry is not None and entry.stat == file_stat:
+                current_hashes[rel_path] = entry.hash
+            else:
+                suspicious_paths.append(rel_path)
+
+        file_hashes = Utils.run_jobs(lambda rel_path: self.get_file_hash(path.join(self.workspace_path, rel_path), seed),
+                                     suspicious_paths, self.jobs)
+        for rel_path, file_hash in zip(suspicious_paths, file_hashes):
+            current_hashes[rel_path] = file_hash
+            if file_hash == tracked_files[rel_path]:
+                self.update_stat_data(rel_path, file_hash, workspace_files[rel_path], index_entries.get(rel_path))
+        if self.index.changes:
+            self.index.try_write()
+
+        modified = sorted(rel_path for rel_path, file_hash in current_hashes.items()
+                          if file_hash != tracked_files[rel_path])
+        deleted = sorted(rel_path for rel_path in tracked_files if rel_path not in workspace_files)
+        untracked = sorted(rel_path for rel_path in workspace_files
+                           if rel_path not in tracked_files and rel_path not in self.index_hashes)
+        return modified, deleted, untracked
+
+    def get_index_file_hash(self, local_path: str, seed: int, save: bool = False, file_stat: tuple | None = None,
+                            entry: IndexEntry | None = UNKNOWN) -> (str, tuple):
+        file_path = path.join(self.workspace_path, local_path)
+        file_stat = file_stat or Utils.get_stat_data(file_path)
+        filehash = self.get_cached_hash(local_path, file_stat, entry)
+        if filehash is not None and (not save or self.has_object(filehash)):
+            return filehash, file_stat
+        if save:
+            return self.hash_and_save_file(local_path, seed), file_stat
+        return self.get_file_hash(file_path, seed), file_stat
+
+    @trace.traced
+    def get_file_hash(self, file_path: str, seed: int) -> str:
+        if self.hash_mode == 'content':
+            return Utils.get_content_hash(file_path, seed).hexdigest()
+        return Utils.get_file_hash(file_path, self.workspace_path, seed).hexdigest()
+
+    def get_cached_hash(self, local_path: str, file_stat: tuple, entry: IndexEntry | None = UNKNOWN) -> str | None:
+        if entry is UNKNOWN:
+            entry = self.index.get(local_path)
+        if entry is None or entry.stat != file_stat:
+            return None
+        return entry.hash
+
+    def update_stat_data(self, local_path: str, file_hash: str, file_stat: tuple | None,
+                         entry: IndexEntry | None = UNKNOWN) -> None:
+        if entry is UNKNOWN:
+            entry = self.index.get(local_path)
+        self.index.put(local_path, file_hash, entry.sign if entry is not None else '=', file_stat, entry)
+
+    @trace.traced
     def write_index_data(self) -> None:
-        with open(self.index_path, 'w') as f:
-            for filepath in self.index_hashes:
-                f.write(
-                    f"{filepath},{self.index_hashes[filepath][0]},"
-                    f"{Utils.bool_to_sign(self.index_hashes[filepath][1])}\n"
-                )
+        for filepath, entry in self.index.staged().items():
+            if filepath not in self.index_hashes:
+                self.index.put(filepath, entry.hash, '=', entry.stat, entry)
+
+        for filepath, (filehash, is_add) in self.index_hashes.items():
+            entry = self.index.get(filepath)
+            file_stat = entry.stat if entry is not None and entry.hash == filehash else None
+            self.index.put(filepath, filehash, Utils.bool_to_sign(is_add), file_stat)
+
+        self.index.write()
 
     def rm_index_files(self) -> None:
         for lcl_filepath in self.index_hashes:
             if not self.index_hashes[lcl_filepath][1]:
                 filepath = path.join(self.workspace_path, lcl_filepath)
+                self.index.remove(lcl_filepath)
                 if path.exists(filepath):
                     remove(filepath)
 
-    def load_tree_files(self, tree_hash: str) -> None:
-        if not tree_hash:
-            return
-        tree_path = path.join(self.repo_path, 'objects', tree_hash[:2], tree_hash[2:])
-
-        for root, dirs, files in walk(tree_path):
-            rel_path = path.relpath(root, start=tree_path)
-            makedirs(rel_path, exist_ok=True)
-
-            for file in files:
-                with open(path.join(root, file), 'r') as f:
-                    filehash = f.read().strip()
-                self.load_file(filehash, path.join(self.workspace_path, rel_path, file))
-
-    def delete_tree_files(self, tree_hash: str) -> None:
-        if not tree_hash:
-            return
-        tree_path = path.join(self.repo_path, 'objects', tree_hash[:2], tree_hash[2:])
-
-        for root, dirs, files in walk(tree_path, topdown=False):
-            for file in files:
-                full_path = path.join(self.workspace_path, path.relpath(path.join(root, file), start=tree_path))
+    @trace.traced
+    def checkout_tree(self, old_tree_hash: str | None, new_tree_hash: str | None,
+                      extra_paths: set[str] = frozenset()) -> None:
+        added_files, removed_files, changed_files = self.compare_trees(old_tree_hash, new_tree_hash)
+
+        files_to_load = []
+        folders = set()
+        for rel_path in sorted(added_files | removed_files | changed_files | set(extra_paths)):
+            full_path = path.join(self.workspace_path, rel_path)
+            file_hash = self.get_tree_file_hash(new_tree_hash, rel_path)
+            if file_hash is None:
                 if path.exists(full_path):
                     remove(full_path)
+                self.index.remove(rel_path)
 
-            for directory in dirs:
-                full_path = path.join(self.workspace_path, path.relpath(path.join(root, directory), start=tree_path))
-                if path.exists(full_path):
-                    rmdir(full_path)
+                folder = path.dirname(rel_path)
+                while folder:
+                    folders.add(folder)
+                    folder = path.dirname(folder)
+            elif not self.is_file_up_to_date(rel_path, file_hash):
+                files_to_load.append((rel_path, file_hash))
 
-    def get_index_hashes(self) -> dict[str: str]:
-        result = {}
-        if not path.exists(self.index_path):
-            return result
+        self.load_files(files_to_load)
+        for rel_path, file_hash in files_to_load:
+            self.update_stat_data(rel_path, file_hash, Utils.get_stat_data(path.join(self.workspace_path, rel_path)))
 
-        with open(self.index_path, 'r') as f:
-            for line in f:
-                filepath, filehash, diff_type = line.split(',')
-                result[filepath] = (filehash, Utils.sign_to_bool(diff_type.strip()))
-        return result
+        for folder in sorted(folders, key=len, reverse=True):
+            self.delete_if_empty(folder)
+
+    def is_file_up_to_date(self, local_path: str, file_hash: str) -> bool:
+        full_path = path.join(self.workspace_path, local_path)
+        return path.isfile(full_path) and self.get_cached_hash(local_path, Utils.get_stat_data(full_path)) == file_hash
+
+    def get_index_hashes(self) -> dict[str: (str, bool)]:
+        return {filepath: (entry.hash, Utils.sign_to_bool(entry.sign))
+                for filepath, entry in self.index.staged().items()}
 
     def initialize_directories(self) -> None:
         makedirs(self.repo_path, exist_ok=True)
@@ -197,26 +695,38 @@ class DriveManager:
         with open(seed_path, 'r') as head_file:
             return int(head_file.read())
 
+    def get_hash_mode(self) -> str:
+        mode_path = path.join(self.repo_path, 'HASHING')
+        if not path.exists(mode_path):
+            return 'path'
+
+        with open(mode_path, 'r') as mode_file:
+            return mode_file.read().strip()
+
+    def get_compression(self) -> (str, int):
+        compression_path = path.join(self.repo_path, 'COMPRESSION')
+        if not path.exists(compression_path):
+            return codec.LEGACY_COMPRESSION, codec.DEFAULT_LEVELS[codec.LEGACY_COMPRESSION]
+
+        with open(compression_path, 'r') as f:
+            return codec.parse_compression(f.read())
+
     def get_last_commit_id(self, head: str | None) -> str | None:
         if head is None:
             return
 
-        if path.exists(path.join(self.repo_path, 'objects', head[:2], head[2:])):
+        if self.has_object(head):
             return head
 
         with open(path.join(self.repo_path, 'HEAD'), 'r') as head:
             branch_path = head.readline()
 
-        with open(path.join(self.repo_path, branch_path), 'r') as branch:
-            return branch.readline().rstrip()
+        commit_id = self.read_ref(branch_path)
+        return commit_id.rstrip() if commit_id is not None else None
 
     def get_commit_tree_hash(self, commit_id: str) -> str | None:
-        commit_path = path.join(self.repo_path, 'objects', commit_id[:2], commit_id[2:])
-        if not path.exists(commit_path):
-            return
-
-        with open(commit_path, 'r') as f:
-            return f.readlines()[-2][:-1]
+        entry = self.get_commit_entry(commit_id)
+        return entry.tree if entry is not None else None
 
     def is_exist(self, local_path: str) -> bool:
         return path.exists(path.join(self.workspace_path, local_path))
@@ -230,56 +740,28 @@ class DriveManager:
         elif path.isdir(full_path) and len(listdir(full_path)) == 0:
             rmdir(full_path)
 
-    def get_files_in_dir(self, local_path: str) -> str:
-        full_path = path.join(self.workspace_path, local_path)
-        for _, _, branches in walk(full_path):
-            for branch in branches:
-                yield branch
-
-    def commit_to_tree_path(self, commit_hash: str) -> str:
-        tree_hash = self.get_commit_tree_hash(commit_hash)
-        return path.abspath(path.join('.kit', "objects", tree_hash[:2], tree_hash[2:]))
-
     def remove(self, local_path: str) -> None:
         remove(path.join(self.workspace_path, local_path))
 
     def get_files_diff(self, hash1: str, hash2: str) -> str:
         if hash1 is None:
-            self.load_file(hash2, self.temp_path)
-            file2 = self.read(self.temp_path).splitlines()
-
-            for line in file2:
+            for line in self.read_blob_lines(hash2):
                 yield f'+;{line}'
-
-            return self.remove(self.temp_path)
+            return
 
         if hash2 is None:
-            self.load_file(hash1, self.temp_path)
-            file1 = self.read(self.temp_path).splitlines()
-
-            for line in file1:
+            for line in self.read_blob_lines(hash1):
                 yield f'-;{line}'
+            return
 
-            return self.remove(self.temp_path)
-
-        self.load_file(hash1, self.temp_path)
-        file1 = self.read(self.temp_path).splitlines()
-        self.load_file(hash2, self.temp_path)
-        file2 = self.read(self.temp_path).splitlines()
-        diff = ndiff(file1, file2)
-
-        for line in diff:
-            if line.startswith('+ '):
-                yield f'+;{line[2:]}'
-            elif line.startswith('- '):
-                yield f'-;{line[2:]}'
-
-        return self.remove(self.temp_path)
+        for sign, line in diff.diff_lines(self.read_blob_lines(hash1), self.read_blob_lines(hash2),
+                                          self.diff_algorithm):
+            if sign != ' ':
+                yield f'{sign};{line}'
 
-    @staticmethod
-    def get_tree_diff(tree1_path: str, tree2_path: str) -> list[str]:
+    def get_tree_diff(self, tree1_hash: str, tree2_hash: str, paths: list[str] = ()) -> list[str]:
         result = []
-        added_files, removed_files, changed_files = DriveManager.compare_trees(tree1_path, tree2_path)
+        added_files, removed_files, changed_files = self.compare_paths(tree1_hash, tree2_hash, paths)
 
         for file in sorted(added_files):
             result.append(f"+;{file}")
@@ -292,92 +774,377 @@ class DriveManager:
 
         return result
 
-    @staticmethod
-    def compare_trees(tree1: str, tree2: str) -> (set[str], set[str], set[str]):
-        dir1_files = Utils.get_relative_paths(tree1)
-        dir2_files = Utils.get_relative_paths(tree2)
-
-        removed_files = dir1_files - dir2_files
-        added_files = dir2_files - dir1_files
-
-        common_files = dir1_files & dir2_files
+    @trace.traced
+    def compare_trees(self, tree1_hash: str | None, tree2_hash: str | None,
+                      prefix: str = '') -> (set[str], set[str], set[str]):
+        added_files, removed_files, changed_files = set(), set(), set()
+        if tree1_hash == tree2_hash:
+            return added_files, removed_files, changed_files
+
+        if any(tree_hash and path.isdir(self.object_path(tree_hash)) for tree_hash in (tree1_hash, tree2_hash)):
+            files1 = self.get_tree_entries(tree1_hash)
+            files2 = self.get_tree_entries(tree2_hash)
+            changed_files = {file for file in files1.keys() & files2.keys() if files1[file] != files2[file]}
+            return files2.keys() - files1.keys(), files1.keys() - files2.keys(), changed_files
+
+        entries1 = self.read_tree(tree1_hash) if tree1_hash else {}
+        entries2 = self.read_tree(tree2_hash) if tree2_hash else {}
+
+        for name in entries1.keys() | entries2.keys():
+            mode1, hash1 = entries1.get(name, (None, None))
+            mode2, hash2 = entries2.get(name, (None, None))
+            if (mode1, hash1) == (mode2, hash2):
+                continue
 
-        changed_files = set()
-        for file in common_files:
-            file1 = path.join(tree1, file)
-            file2 = path.join(tree2, file)
+            local_path = path.join(prefix, name)
+            if mode1 == MODE_FILE and mode2 == MODE_FILE:
+                changed_files.add(local_path)
+                continue
+            if mode1 == MODE_FILE:
+                removed_files.add(local_path)
+            if mode2 == MODE_FILE:
+                added_files.add(local_path)
 
-            if DriveManager.read_file_content(file1) != DriveManager.read_file_content(file2):
-                changed_files.add(file)
+            added, removed, changed = self.compare_trees(hash1 if mode1 == MODE_TREE else None,
+                                                         hash2 if mode2 == MODE_TREE else None, local_path)
+            added_files |= added
+            removed_files |= removed
+            changed_files |= changed
 
         return added_files, removed_files, changed_files
 
-    @staticmethod
-    def read_file_content(file_path: str) -> bytes:
-        with open(file_path, 'rb') as file:
-            return file.read()
-
-    def merge_files_with_conflicts(self, hash1: str, hash2: str) -> list[str]:
-        self.load_file(hash1, self.temp_path)
-        base_version = self.read(self.temp_path).splitlines()
-        self.load_file(hash2, self.temp_path)
-        new_version = self.read(self.temp_path).splitlines()
-
-        conflict_lines = []
-        diff = ndiff(base_version, new_version)
+    def is_legacy_tree(self, tree_hash: str | None) -> bool:
+        return bool(tree_hash) and path.isdir(self.object_path(tree_hash))
+
+    @trace.traced
+    def compare_paths(self, tree1_hash: str | None, tree2_hash: str | None,
+                      paths: list[str] = ()) -> (set[str], set[str], set[str]):
+        if not paths or not all(Utils.split_local_path(local_path) for local_path in paths):
+            return self.compare_trees(tree1_hash, tree2_hash)
+
+        if self.is_legacy_tree(tree1_hash) or self.is_legacy_tree(tree2_hash):
+            prefixes = [path.normpath(local_path) for local_path in paths]
+            return tuple({file for file in files if any(Utils.is_path_within(file, prefix) for prefix in prefixes)}
+                         for files in self.compare_trees(tree1_hash, tree2_hash))
+
+        added_files, removed_files, changed_files = set(), set(), set()
+        for local_path in paths:
+            mode1, hash1 = self.get_tree_entry(tree1_hash, local_path) or (None, None)
+            mode2, hash2 = self.get_tree_entry(tree2_hash, local_path) or (None, None)
+            if (mode1, hash1) == (mode2, hash2):
+                continue
 
-        in_conflict = False
-        base_conflict = []
-        new_conflict = []
+            local_path = path.join(*Utils.split_local_path(local_path))
+            if mode1 == MODE_FILE and mode2 == MODE_FILE:
+                changed_files.add(local_path)
+                continue
+            if mode1 == MODE_FILE:
+                removed_files.add(local_path)
+            if mode2 == MODE_FILE:
+                added_files.add(local_path)
 
-        for line in diff:
-            if line.startswith("  "):
-                if in_conflict:
-                    conflict_lines.append("<<<<<<< YOURS")
-                    conflict_lines.extend(base_conflict)
-                    conflict_lines.append("=======")
-                    conflict_lines.extend(new_conflict)
-                    conflict_lines.append(">>>>>>> THEIRS")
-                    in_conflict = False
-                    base_conflict = []
-                    new_conflict = []
+            added, removed, changed = self.compare_trees(hash1 if mode1 == MODE_TREE else None,
+                                                         hash2 if mode2 == MODE_TREE else None, local_path)
+            added_files |= added
+            removed_files |= removed
+            changed_files |= changed
 
-                conflict_lines.append(line[2:])
+        return added_files, removed_files, changed_files
 
-            elif line.startswith("- "):
-                if not in_conflict:
-                    in_conflict = True
+    def paths_changed(self, tree1_hash: str | None, tree2_hash: str | None, paths: list[str]) -> bool:
+        if self.is_legacy_tree(tree1_hash) or self.is_legacy_tree(tree2_hash):
+            return any(self.compare_paths(tree1_hash, tree2_hash, paths))
+        return any(self.get_tree_entry(tree1_hash, local_path) != self.get_tree_entry(tree2_hash, local_path)
+                   for local_path in paths)
+
+    @trace.traced
+    def merge_trees(self, base_tree: str | None, main_tree: str | None, additional_tree: str | None,
+                    prefix: str = '') -> (dict[str: str | None], list[(str, str, str, str)]):
+        changes, conflicts = {}, []
+        if main_tree == additional_tree or base_tree == additional_tree:
+            return changes, conflicts
+
+        if base_tree == main_tree:
+            added_files, removed_files, changed_files = self.compare_trees(main_tree, additional_tree)
+            for file_path in added_files | changed_files:
+                changes[path.join(prefix, file_path)] = self.get_tree_file_hash(additional_tree, file_path)
+            for file_path in removed_files:
+                changes[path.join(prefix, file_path)] = None
+            return changes, conflicts
+
+        if any(tree_hash and path.isdir(self.object_path(tree_hash))
+               for tree_hash in (base_tree, main_tree, additional_tree)):
+            base_files, main_files, additional_files = (self.get_tree_entries(tree_hash)
+                                                        for tree_hash in (base_tree, main_tree, additional_tree))
+            for file_path in main_files.keys() | additional_files.keys():
+                self.merge_file_hashes(path.join(prefix, file_path), base_files.get(file_path),
+                                       main_files.get(file_path), additional_files.get(file_path), changes, conflicts)
+            return changes, conflicts
+
+        base_entries, main_entries, additional_entries = (self.read_tree(tree_hash) if tree_hash else {}
+                                                          for tree_hash in (base_tree, main_tree, additional_tree))
+        for name in base_entries.keys() | main_entries.keys() | additional_entries.keys():
+            versions = [entries.get(name, (None, None)) for entries in (base_entries, main_entries, additional_entries)]
+            if versions[1] == versions[2] or versions[0] == versions[2]:
+                continue
 
-                base_conflict.append(line[2:])
+            local_path = path.join(prefix, name)
+            file_hashes = [object_hash if mode == MODE_FILE else None for mode, object_hash in versions]
+            tree_hashes = [object_hash if mode == MODE_TREE else None for mode, object_hash in versions]
+            if any(file_hashes):
+                self.merge_file_hashes(local_path, *file_hashes, changes, conflicts)
+            if any(tree_hashes):
+                tree_changes, tree_conflicts = self.merge_trees(*tree_hashes, local_path)
+                changes.update(tree_changes)
+                conflicts.extend(tree_conflicts)
 
-            elif line.startswith("+ "):
-                if not in_conflict:
-                    in_conflict = True
-                new_conflict.append(line[2:])
+        return changes, conflicts
 
-        if in_conflict:
-            conflict_lines.append("<<<<<<< YOURS")
-            conflict_lines.extend(base_conflict)
-            conflict_lines.append("=======")
-            conflict_lines.extend(new_conflict)
-            conflict_lines.append(">>>>>>> THEIRS")
+    @staticmethod
+    def merge_file_hashes(local_path: str, base_hash: str | None, main_hash: str | None, additional_hash: str | None,
+                          changes: dict[str: str | None], conflicts: list[(str, str, str, str)]) -> None:
+        if main_hash == additional_hash or base_hash == additional_hash:
+            return
+        if base_hash == main_hash:
+            changes[local_path] = additional_hash
+        else:
+            conflicts.append((local_path, base_hash, main_hash, additional_hash))
+
+    def merge_files(self, base_hash: str | None, main_hash: str, additional_hash: str) -> (list[str], bool):
+        base_version = self.read_blob_lines(base_hash) if base_hash else []
+        return diff.merge3(base_version, self.read_blob_lines(main_hash), self.read_blob_lines(additional_hash),
+                           self.diff_algorithm)
+
+    def get_commit_entry(self, commit_id: str) -> CommitEntry | None:
+        entry = self.commit_graph.get(commit_id)
+        if entry is not None:
+            return entry
+
+        entry = self.cache.get(cache.COMMITS, commit_id)
+        if entry is None:
+            data = self.read_commit(commit_id)
+            if data is None:
+                return None
+            entry = parse_commit(commit_id, data)
+            self.cache.put(cache.COMMITS, commit_id, entry, cache.commit_size(entry))
+        return entry
+
+    def get_commit_parents(self, commit_id: str) -> list[str]:
+        return self.get_commit_entry(commit_id).parents
+
+    def update_commit_graph(self, commit_id: str) -> None:
+        data = self.read_commit(commit_id)
+        if data is None:
+            return
 
-        self.remove(self.temp_path)
+        entry = parse_commit(commit_id, data)
+        if not is_graphable(entry):
+            return
 
-        return conflict_lines
+        if not all(parent in self.commit_graph for parent in entry.parents):
+            self.write_commit_graph(entry.parents)
+        if all(parent in self.commit_graph for parent in entry.parents):
+            self.commit_graph.add(entry)
+
+    @trace.traced
+    def write_commit_graph(self, extra_heads: list[str] = ()) -> int:
+        self.commit_graph.write([self.get_commit_entry(commit_id)
+                                 for commit_id in self.get_reachable_commits(extra_heads)])
+        return len(self.commit_graph)
+
+    def get_ancestors(self, commit_id: str) -> set[str]:
+        ancestors = set()
+        stack = [commit_id]
+        while stack:
+            current_id = stack.pop()
+            if current_id not in ancestors:
+                ancestors.add(current_id)
+                stack.extend(self.get_commit_parents(current_id))
+        return ancestors
+
+    @trace.traced
+    def get_merge_base(self, commit1_id: str, commit2_id: str) -> str | None:
+        if commit1_id == commit2_id:
+            return commit1_id
+
+        entries = {commit1_id: self.get_commit_entry(commit1_id), commit2_id: self.get_commit_entry(commit2_id)}
+        if not all(entry.generation for entry in entries.values()):
+            common = self.get_ancestors(commit1_id) & self.get_ancestors(commit2_id)
+            if not common:
+                return None
+            common_entries = [self.get_commit_entry(commit_id) for commit_id in common]
+            return max(common_entries, key=lambda entry: (entry.generation, entry.timestamp)).commit_id
+
+        lower_id, upper_id = sorted(entries, key=lambda commit_id: entries[commit_id].generation)
+        if self.is_ancestor(lower_id, upper_id):
+            return lower_id
+
+        sides = {commit1_id: 1, commit2_id: 2}
+        queue = []
+        for commit_id, entry in entries.items():
+            heappush(queue, (-entry.generation, -entry.timestamp, commit_id))
+
+        while queue:
+            _, _, commit_id = heappop(queue)
+            if sides[commit_id] == 3:
+                return commit_id
+
+            for parent in entries[commit_id].parents:
+                if parent not in sides:
+                    entries[parent] = self.get_commit_entry(parent)
+                    heappush(queue, (-entries[parent].generation, -entries[parent].timestamp, parent))
+                sides[parent] = sides.get(parent, 0) | sides[commit_id]
+        return None
+
+    def get_merge_head(self) -> str | None:
+        merge_head_path = path.join(self.repo_path, 'MERGE_HEAD')
+        if not path.exists(merge_head_path):
+            return None
+
+        with open(merge_head_path, 'r') as f:
+            return f.read().strip()
+
+    def set_merge_head(self, commit_id: str | None) -> None:
+        merge_head_path = path.join(self.repo_path, 'MERGE_HEAD')
+        if commit_id is not None:
+            atomic_write(merge_head_path, commit_id)
+        elif path.exists(merge_head_path):
+            remove(merge_head_path)
 
     def is_ancestor(self, base_commit_id: str, target_commit_id: str) -> bool:
-        name = target_commit_id
-
-        while name != 'None':
-            if name == base_commit_id:
+        base_generation = self.get_commit_entry(base_commit_id).generation
+        visited = set()
+        stack = [target_commit_id]
+        while stack:
+            commit_id = stack.pop()
+            if commit_id == base_commit_id:
                 return True
+            if commit_id in visited:
+                continue
+            visited.add(commit_id)
 
-            parent = self.read(path.join('.kit', "objects", name[:2], name[2:])).split('\n')[4]
-            name = parent
-
+            entry = self.get_commit_entry(commit_id)
+            if base_generation and entry.generation and entry.generation <= base_generation:
+                continue
+            stack.extend(entry.parents)
         return False
 
+    @trace.traced
+    def repack(self) -> int:
+        objects_path = path.join(self.repo_path, 'objects')
+        loose_ids = []
+        for folder in listdir(objects_path):
+            folder_path = path.join(objects_path, folder)
+            if len(folder) != 2 or not path.isdir(folder_path):
+                continue
+            for name in listdir(folder_path):
+                if not name.startswith('tmp_') and path.isfile(path.join(folder_path, name)):
+                    loose_ids.append(folder + name)
+
+        object_ids = set(loose_ids) | set(self.packs.ids())
+        if not loose_ids:
+            return len(object_ids)
+
+        deltas = self.find_deltas()
+
+        def read_packed_object(object_id: str) -> (int, bytes):
+            if object_id in deltas:
+                return OBJ_DELTA, deltas[object_id]
+
+            object_path = self.object_path(object_id)
+            if path.isfile(object_path):
+                with open(object_path, 'rb') as f:
+                    data = f.read()
+                return self.loose_object_type(data), data
+
+            obj_type, data = self.packs.read_entry(object_id)
+            if obj_type == OBJ_DELTA:
+                return OBJ_BLOB, codec.compress(self.packs.get_content(object_id), *self.compression)
+            return obj_type, data
+
+        pack_name = self.packs.write_pack(list(object_ids), read_packed_object)
+        self.packs.remove_packs_except(pack_name)
+
+        for object_id in loose_ids:
+            remove(self.object_path(object_id))
+        for folder in listdir(objects_path):
+            folder_path = path.join(objects_path, folder)
+            if len(folder) == 2 and path.isdir(folder_path) and not listdir(folder_path):
+                rmdir(folder_path)
+
+        return len(object_ids)
+
+    def find_deltas(self) -> dict[str: bytes]:
+        versions = {}
+        for commit_id in self.get_reachable_commits():
+            for rel_path, file_hash in self.get_tree_entries(self.get_commit_tree_hash(commit_id)).items():
+                path_versions = versions.setdefault(rel_path, [])
+                if file_hash not in path_versions:
+                    path_versions.append(file_hash)
+
+        deltas = {}
+        depths = {}
+        for path_versions in versions.values():
+            base_hash = base_content = None
+            for file_hash in path_versions:
+                if file_hash in depths:
+                    base_hash, base_content = file_hash, self.read_blob(file_hash)
+                    continue
+
+                content = self.read_blob(file_hash)
+                depths[file_hash] = 0
+                if base_hash is not None and depths[base_hash] < MAX_DELTA_DEPTH:
+                    delta = codec.compress(create_delta(base_content, content), *self.compression)
+                    if len(delta) + ID_SIZE < len(self.read_object(file_hash)):
+                        deltas[file_hash] = bytes.fromhex(base_hash) + delta
+                        depths[file_hash] = depths[base_hash] + 1
+                base_hash, base_content = file_hash, content
+
+        return deltas
+
+    def get_reachable_commits(self, extra_heads: list[str] = ()) -> list[str]:
+        heads = [self.get_last_commit_id(self.get_head()), *extra_heads]
+        heads.extend(value.split()[-1] for value in self.list_refs('refs').values())
+
+        commits = []
+        visited = set()
+        stack = [(commit_id, False) for commit_id in reversed(heads)]
+        while stack:
+            commit_id, expanded = stack.pop()
+            if expanded:
+                commits.append(commit_id)
+                continue
+            if not commit_id or commit_id in visited:
+                continue
+            entry = self.get_commit_entry(commit_id)
+            if entry is None:
+                continue
+            visited.add(commit_id)
+            stack.append((commit_id, True))
+            stack.extend((parent, False) for parent in reversed(entry.parents))
+
+        return commits
+
+    def get_tree_entries(self, tree_hash: str | None, prefix: str = '') -> dict[str: str]:
+        entries = {}
+        if not tree_hash:
+            return entries
+
+        tree_path = self.object_path(tree_hash)
+        if path.isdir(tree_path):
+            for root, _, files in walk(tree_path):
+                for file in files:
+                    with open(path.join(root, file), 'r') as f:
+                        entries[path.relpath(path.join(root, file), start=tree_path)] = f.read().strip()
+            return entries
+
+        for name, (mode, object_hash) in self.read_tree(tree_hash).items():
+            if mode == MODE_TREE:
+                entries.update(self.get_tree_entries(object_hash, prefix + name + sep))
+            else:
+                entries[prefix + name] = object_hash
+        return entries
+
 
 if __name__ == '__main__':
     pass
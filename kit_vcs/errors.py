@@ -35,5 +35,30 @@ class RepositoryExistError(BaseError):
 class MergeConflictError(BaseError):
     pass
 
+
 class NotFoundError(BaseError):
     pass
+
+
+class CorruptedIndexError(BaseError):
+    pass
+
+
+class UnsupportedCodecError(BaseError):
+    pass
+
+
+class FsMonitorError(BaseError):
+    pass
+
+
+class LockError(BaseError):
+    pass
+
+
+class RefUpdateError(BaseError):
+    pass
+
+
+class AmbiguousObjectError(BaseError):
+    pass
@@ -0,0 +1,324 @@
+import ctypes
+import ctypes.util
+import errno
+import json
+import platform
+import selectors
+import socket
+import struct
+import subprocess
+import sys
+import time
+from os import getpid, path, read, remove, scandir, urandom
+from secrets import token_hex
+
+import kit_vcs.errors as errors
+from kit_vcs.ignore import IGNORE_FILE, IgnoreMatcher
+from kit_vcs.lockfile import atomic_write
+
+MONITOR_FILE = 'FSMONITOR'
+STATE_FILE = 'FSMONITOR_STATE'
+STATE_MAGIC = b'KFSM'
+STATE_VERSION = 1
+QUERY_TIMEOUT = 1.0
+START_TIMEOUT = 10.0
+MAX_CHANGES = 1_000_000
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT = struct.Struct('iIII')
+STATE_HEADER = struct.Struct('>4sIII')
+STAT = struct.Struct('>qqQQQ')
+
+
+def is_supported() -> bool:
+    return platform.system() == 'Linux'
+
+
+def read_monitor_file(repo_path: str) -> tuple[int, str] | None:
+    monitor_path = path.join(repo_path, MONITOR_FILE)
+    if not path.isfile(monitor_path):
+        return None
+
+    with open(monitor_path, 'r') as f:
+        port, key, *_ = f.read().split() + ['', '']
+    return (int(port), key) if port.isdigit() else None
+
+
+def request(repo_path: str, message: dict) -> dict | None:
+    monitor = read_monitor_file(repo_path)
+    if monitor is None:
+        return None
+
+    port, key = monitor
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=QUERY_TIMEOUT) as connection:
+            connection.sendall(json.dumps(message | {'key': key}).encode() + b'\n')
+            with connection.makefile('rb') as reader:
+                response = reader.readline()
+    except OSError:
+        return None
+
+    try:
+        return json.loads(response)
+    except ValueError:
+        return None
+
+
+def query(repo_path: str, token: str | None) -> tuple[str, list[str] | None] | None:
+    response = request(repo_path, {'command': 'query', 'token': token})
+    if response is None or 'token' not in response:
+        return None
+    return response['token'], response.get('paths')
+
+
+def read_state(repo_path: str) -> (str | None, dict[str: tuple]):
+    state_path = path.join(repo_path, STATE_FILE)
+    if not path.isfile(state_path):
+        return None, {}
+
+    with open(state_path, 'rb') as f:
+        data = f.read()
+    if len(data) < STATE_HEADER.size:
+        return None, {}
+    magic, version, count, token_size = STATE_HEADER.unpack_from(data, 0)
+    stats_start = STATE_HEADER.size + token_size
+    paths_start = stats_start + count * STAT.size
+    if magic != STATE_MAGIC or version != STATE_VERSION or len(data) < paths_start:
+        return None, {}
+
+    rel_paths = data[paths_start:].decode(errors='surrogateescape').split('\0') if count else []
+    if len(rel_paths) != count:
+        return None, {}
+    return (data[STATE_HEADER.size:stats_start].decode(),
+            dict(zip(rel_paths, STAT.iter_unpack(data[stats_start:paths_start]))))
+
+
+def write_state(repo_path: str, token: str, file_stats: dict[str: tuple]) -> None:
+    state_path = path.join(repo_path, STATE_FILE)
+    token_data = token.encode()
+    atomic_write(state_path, b''.join([STATE_HEADER.pack(STATE_MAGIC, STATE_VERSION, len(file_stats), len(token_data)),
+                                       token_data, b''.join(STAT.pack(*file_stat) for file_stat in file_stats.values()),
+                                       '\0'.join(file_stats).encode(errors='surrogateescape')]))
+
+
+def start(workspace_path: str) -> dict:
+    repo_path = path.join(workspace_path, '.kit')
+    if not is_supported():
+        raise errors.FsMonitorError('File system monitor is only supported on Linux')
+    if status(repo_path) is not None:
+        raise errors.FsMonitorError('File system monitor is already running')
+
+    package_root = path.dirname(path.dirname(path.abspath(__file__)))
+    daemon = subprocess.Popen([sys.executable, '-c', f'import sys; sys.path.insert(0, {package_root!r}); '
+                                                     f'from kit_vcs.fsmonitor import run; run({workspace_path!r})'],
+                              stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              start_new_session=True)
+    deadline = time.monotonic() + START_TIMEOUT
+    while daemon.poll() is None and time.monotonic() < deadline:
+        daemon_status = status(repo_path)
+        if daemon_status is not None:
+            return daemon_status
+        time.sleep(0.05)
+    raise errors.FsMonitorError('File system monitor failed to start')
+
+
+def stop(repo_path: str) -> bool:
+    return request(repo_path, {'command': 'stop'}) is not None
+
+
+def status(repo_path: str) -> dict | None:
+    return request(repo_path, {'command': 'ping'})
+
+
+def run(workspace_path: str) -> None:
+    FsMonitorDaemon(workspace_path).serve()
+
+
+class Inotify:
+    def __init__(self) -> None:
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise errors.FsMonitorError(f'inotify_init1 failed with errno {ctypes.get_errno()}')
+
+    def add_watch(self, folder: str) -> int:
+        return self.libc.inotify_add_watch(self.fd, folder.encode(), WATCH_MASK)
+
+    def read_events(self) -> (int, int, str):
+        while True:
+            try:
+                data = read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0').decode(errors='surrogateescape')
+                offset += length
+                yield wd, mask, name
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            ctypes.CDLL(None).close(self.fd)
+        self.fd = -1
+
+
+class FsMonitorDaemon:
+    def __init__(self, workspace_path: str) -> None:
+        self.workspace_path = workspace_path
+        self.repo_path = path.join(workspace_path, '.kit')
+        self.key = token_hex(16)
+        self.inotify = None
+        self.selector = None
+        self.folders = {}
+        self.changes = {}
+        self.epoch = ''
+        self.seq = 0
+        self.ignore = None
+        self.running = True
+
+    @property
+    def token(self) -> str:
+        return f'{self.epoch}:{self.seq}'
+
+    def reset(self) -> None:
+        if self.inotify is not None:
+            if self.selector is not None:
+                self.selector.unregister(self.inotify.fd)
+            self.inotify.close()
+        self.inotify = Inotify()
+        if self.selector is not None:
+            self.selector.register(self.inotify.fd, selectors.EVENT_READ, 'inotify')
+        self.ignore = IgnoreMatcher(self.workspace_path)
+        self.folders = {}
+        self.changes = {}
+        self.epoch = urandom(8).hex()
+        self.seq = 0
+        self.watch_tree('')
+
+    def watch_tree(self, rel_folder: str) -> None:
+        stack = [(rel_folder, self.ignore.chain_for(rel_folder))]
+        while stack:
+            rel_folder, chain = stack.pop()
+            wd = self.inotify.add_watch(path.join(self.workspace_path, rel_folder))
+            if wd < 0 and ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR) and rel_folder:
+                continue
+            if wd < 0:
+                raise errors.FsMonitorError(f'inotify_add_watch failed with errno {ctypes.get_errno()}')
+            self.folders[wd] = rel_folder
+
+            try:
+                entries = list(scandir(path.join(self.workspace_path, rel_folder)))
+            except OSError:
+                continue
+            for entry in entries:
+                rel_path = path.join(rel_folder, entry.name)
+                if (entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.')
+                        and not self.ignore.match(chain, rel_path, True)):
+                    stack.append((rel_path, self.ignore.enter(chain, rel_path)))
+
+    def process_events(self) -> None:
+        for wd, mask, name in self.inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                self.reset()
+                return
+            if wd not in self.folders:
+                continue
+
+            rel_folder = self.folders[wd]
+            if mask & IN_IGNORED:
+                del self.folders[wd]
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if not rel_folder:
+                    self.running = False
+                continue
+
+            if name == IGNORE_FILE or mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                self.reset()
+                return
+            if mask & IN_ISDIR and name.startswith('.'):
+                continue
+
+            rel_path = path.join(rel_folder, name)
+            self.seq += 1
+            self.changes[rel_path] = self.seq
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                if not self.ignore.match(self.ignore.chain_for(rel_folder), rel_path, True):
+                    self.watch_tree(rel_path)
+
+        if len(self.changes) > MAX_CHANGES:
+            self.reset()
+
+    def answer(self, message: dict) -> dict:
+        if message.get('key') != self.key:
+            return {'error': 'unauthorized'}
+
+        command = message.get('command')
+        if command == 'stop':
+            self.running = False
+            return {'stopped': True}
+        if command == 'ping':
+            return {'pid': getpid(), 'token': self.token, 'folders': len(self.folders)}
+
+        self.process_events()
+        token = message.get('token') or ''
+        epoch, _, seq = token.partition(':')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return {'token': self.token, 'paths': None}
+
+        since = int(seq)
+        return {'token': self.token, 'paths': sorted(rel_path for rel_path, change in self.changes.items()
+                                                     if change > since)}
+
+    def serve(self) -> None:
+        self.selector = selectors.DefaultSelector()
+        self.reset()
+        server = socket.create_server(('127.0.0.1', 0))
+        monitor_path = path.join(self.repo_path, MONITOR_FILE)
+        atomic_write(monitor_path, f'{server.getsockname()[1]} {self.key}\n')
+
+        self.selector.register(server, selectors.EVENT_READ, 'server')
+        try:
+            while self.running and path.isdir(self.repo_path):
+                for key, _ in self.selector.select(timeout=5):
+                    if key.data == 'server':
+                        self.handle_connection(server)
+                    else:
+                        self.process_events()
+        finally:
+            self.selector.close()
+            self.selector = None
+            server.close()
+            self.inotify.close()
+            if path.isfile(monitor_path):
+                remove(monitor_path)
+
+    def handle_connection(self, server: socket.socket) -> None:
+        connection, _ = server.accept()
+        with connection:
+            connection.settimeout(QUERY_TIMEOUT)
+            try:
+                with connection.makefile('rb') as reader:
+                    message = json.loads(reader.readline())
+                connection.sendall(json.dumps(self.answer(message)).encode() + b'\n')
+            except (OSError, ValueError):
+                pass
@@ -0,0 +1,134 @@
+import re
+from os import path, sep
+
+IGNORE_FILE = '.kitignore'
+
+
+def translate_pattern(pattern: str) -> str:
+    anchored = '/' in pattern
+    pattern = pattern[1:] if pattern.startswith('/') else pattern
+
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i) and (i == 0 or pattern[i - 1] == '/'):
+            regex.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i) and i + 2 == len(pattern) and (i == 0 or pattern[i - 1] == '/'):
+            regex.append('.*')
+            i += 2
+        elif char == '*':
+            regex.append('[^/]*')
+            i += 1
+        elif char == '?':
+            regex.append('[^/]')
+            i += 1
+        elif char == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            regex.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif char == '\\' and i + 1 < len(pattern):
+            regex.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            regex.append(re.escape(char))
+            i += 1
+
+    return ('' if anchored else '(?:.*/)?') + ''.join(regex)
+
+
+class IgnoreRules:
+    def __init__(self, base: str, lines: list[str]) -> None:
+        self.base = base
+        file_rules, dir_rules = [], []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            elif line.startswith(('\\!', '\\#')):
+                line = line[1:]
+
+            dir_only = line.endswith('/')
+            regex = translate_pattern(line.rstrip('/'))
+            dir_rules.append((regex, negate))
+            if not dir_only:
+                file_rules.append((regex, negate))
+
+        self.file_matcher, self.file_negations = self.compile(file_rules)
+        self.dir_matcher, self.dir_negations = self.compile(dir_rules)
+
+    @staticmethod
+    def compile(rules: list[(str, bool)]) -> (re.Pattern | None, list[bool]):
+        if not rules:
+            return None, []
+        rules = rules[::-1]
+        return re.compile('|'.join(f'({regex})' for regex, _ in rules), re.DOTALL), [negate for _, negate in rules]
+
+    def match(self, rel_path: str, is_dir: bool) -> bool | None:
+        matcher, negations = (self.dir_matcher, self.dir_negations) if is_dir else (self.file_matcher,
+                                                                                  self.file_negations)
+        if matcher is None:
+            return None
+
+        found = matcher.fullmatch(rel_path)
+        if found is None:
+            return None
+        return not negations[found.lastindex - 1]
+
+
+class IgnoreMatcher:
+    def __init__(self, workspace_path: str) -> None:
+        self.workspace_path = workspace_path
+        self.rules = {}
+
+    def load(self, rel_folder: str) -> IgnoreRules | None:
+        if rel_folder not in self.rules:
+            ignore_path = path.join(self.workspace_path, rel_folder, IGNORE_FILE)
+            rules = None
+            if path.isfile(ignore_path):
+                with open(ignore_path, 'r') as f:
+                    rules = IgnoreRules(rel_folder.replace(sep, '/'), f.readlines())
+            self.rules[rel_folder] = rules
+        return self.rules[rel_folder]
+
+    def enter(self, chain: tuple, rel_folder: str) -> tuple:
+        rules = self.load(rel_folder)
+        return chain + (rules,) if rules is not None else chain
+
+    def match(self, chain: tuple, rel_path: str, is_dir: bool) -> bool:
+        rel_path = rel_path.replace(sep, '/')
+        for rules in reversed(chain):
+            result = rules.match(rel_path[len(rules.base) + 1:] if rules.base else rel_path, is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def chain_for(self, rel_folder: str) -> tuple:
+        chain = self.enter((), '')
+        if rel_folder in ('', '.'):
+            return chain
+
+        current = ''
+        for part in path.normpath(rel_folder).split(sep):
+            current = path.join(current, part)
+            chain = self.enter(chain, current)
+        return chain
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        parts = path.normpath(rel_path).split(sep)
+        chain = self.enter((), '')
+        current = ''
+        for depth, part in enumerate(parts, 1):
+            current = path.join(current, part)
+            if self.match(chain, current, is_dir or depth < len(parts)):
+                return True
+            chain = self.enter(chain, current) if depth < len(parts) else chain
+        return False
@@ -0,0 +1,277 @@
+import mmap
+import struct
+from bisect import bisect_left
+from collections import namedtuple
+from os import path, stat
+from time import time_ns
+
+from xxhash import xxh3_128
+
+import kit_vcs.errors as errors
+import kit_vcs.trace as trace
+from kit_vcs.lockfile import LockFile
+
+INDEX_MAGIC = b'KINX'
+VERSION = 2
+
+HEADER = struct.Struct('>4sIIIQ')
+ENTRY = struct.Struct('>II16sBqqQQQ')
+POSITION = struct.Struct('>I')
+PATH_REF = struct.Struct('>II')
+TRAILER_SIZE = 16
+
+FLAG_ADD = 1
+FLAG_REMOVE = 2
+FLAG_STAT = 4
+
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+IndexEntry = namedtuple('IndexEntry', ['hash', 'sign', 'stat'])
+UNKNOWN = object()
+
+
+class Index:
+    def __init__(self, index_path: str) -> None:
+        self.index_path = index_path
+        self.changes = {}
+        self.data = None
+        self.count = 0
+        self.staged_count = 0
+        self.garbage = 0
+        self.staged_start = self.paths_start = HEADER.size
+        self.signature = None
+        self.load()
+
+    @trace.traced
+    def load(self) -> None:
+        self.close()
+        self.signature = self.file_signature()
+        if not path.isfile(self.index_path) or path.getsize(self.index_path) == 0:
+            return
+
+        with open(self.index_path, 'rb') as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                f.seek(0)
+                self.load_text(f.read().decode())
+                return
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if xxh3_128(self.data[:-TRAILER_SIZE]).digest() != self.data[-TRAILER_SIZE:]:
+            self.close()
+            raise errors.CorruptedIndexError(f'Index file {self.index_path} is corrupted')
+
+        _, version, self.count, self.staged_count, self.garbage = HEADER.unpack_from(self.data, 0)
+        if version != VERSION:
+            self.close()
+            raise errors.CorruptedIndexError(f'Unsupported index version {version}')
+        self.staged_start = HEADER.size + self.count * ENTRY.size
+        self.paths_start = self.staged_start + self.staged_count * POSITION.size
+
+    def file_signature(self) -> tuple | None:
+        try:
+            index_stat = stat(self.index_path)
+        except OSError:
+            return None
+        return index_stat.st_ino, index_stat.st_size, index_stat.st_mtime_ns
+
+    def refresh(self) -> None:
+        if self.file_signature() == self.signature:
+            return
+        pending, self.changes = self.changes, {}
+        self.load()
+        self.changes.update(pending)
+
+    def load_text(self, text: str) -> None:
+        for line in text.splitlines():
+            filepath, filehash, sign, *file_stat = line.split(',')
+            self.changes[filepath] = IndexEntry(filehash, sign, tuple(map(int, file_stat)) if file_stat else None)
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.close()
+        self.data = None
+        self.count = self.staged_count = self.garbage = 0
+        self.staged_start = self.paths_start = HEADER.size
+
+    @property
+    def entries_start(self) -> int:
+        return HEADER.size
+
+    def record(self, position: int) -> tuple:
+        return ENTRY.unpack_from(self.data, self.entries_start + position * ENTRY.size)
+
+    def record_path(self, position: int) -> bytes:
+        path_offset, path_length = PATH_REF.unpack_from(self.data, self.entries_start + position * ENTRY.size)
+        start = self.paths_start + path_offset
+        return self.data[start:start + path_length]
+
+    def find(self, local_path: bytes) -> (int, bool):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record_path(middle) < local_path:
+                low = middle + 1
+            else:
+                high = middle
+        return low, low < self.count and self.record_path(low) == local_path
+
+    @staticmethod
+    def to_entry(record: tuple) -> IndexEntry:
+        _, _, binary_hash, flags, *file_stat = record
+        sign = '+' if flags & FLAG_ADD else '-' if flags & FLAG_REMOVE else '='
+        return IndexEntry(binary_hash.hex(), sign, tuple(file_stat) if flags & FLAG_STAT else None)
+
+    def get(self, local_path: str) -> IndexEntry | None:
+        if local_path in self.changes:
+            return self.changes[local_path]
+        if self.data is None:
+            return None
+
+        position, found = self.find(local_path.encode())
+        return self.to_entry(self.record(position)) if found else None
+
+    def get_many(self, local_paths: list[str]) -> dict[str: IndexEntry | None]:
+        if len(local_paths) * self.count.bit_length() < self.count:
+            return {local_path: self.get(local_path) for local_path in local_paths}
+
+        entries = dict.fromkeys(local_paths)
+        for local_path, entry in self.items():
+            if local_path in entries:
+                entries[local_path] = entry
+        return entries
+
+    def put(self, local_path: str, file_hash: str, sign: str, file_stat: tuple | None,
+            previous: IndexEntry | None = UNKNOWN) -> None:
+        entry = IndexEntry(file_hash, sign, file_stat)
+        if (self.get(local_path) if previous is UNKNOWN else previous) != entry:
+            self.changes[local_path] = entry
+
+    def remove(self, local_path: str) -> None:
+        if self.get(local_path) is not None:
+            self.changes[local_path] = None
+
+    def items(self) -> (str, IndexEntry):
+        if self.data is not None:
+            paths = self.data[self.paths_start:len(self.data) - TRAILER_SIZE]
+            for record in ENTRY.iter_unpack(self.data[self.entries_start:self.staged_start]):
+                local_path = paths[record[0]:record[0] + record[1]].decode()
+                if local_path not in self.changes:
+                    yield local_path, self.to_entry(record)
+
+        for local_path, entry in self.changes.items():
+            if entry is not None:
+                yield local_path, entry
+
+    def staged_positions(self) -> list[int]:
+        return [POSITION.unpack_from(self.data, self.staged_start + i * POSITION.size)[0]
+                for i in range(self.staged_count)]
+
+    def staged(self) -> dict[str: IndexEntry]:
+        result = {}
+        if self.data is not None:
+            for position in self.staged_positions():
+                result[self.record_path(position).decode()] = self.to_entry(self.record(position))
+
+        for local_path, entry in self.changes.items():
+            if entry is not None and entry.sign != '=':
+                result[local_path] = entry
+            else:
+                result.pop(local_path, None)
+        return dict(sorted(result.items()))
+
+    @trace.traced
+    def write(self) -> None:
+        with LockFile(self.index_path) as lock:
+            self.refresh()
+            self.write_locked(lock)
+
+    def try_write(self) -> bool:
+        lock = LockFile(self.index_path)
+        if not lock.try_acquire():
+            return False
+        try:
+            self.refresh()
+            self.write_locked(lock)
+        finally:
+            lock.release()
+        return True
+
+    def write_locked(self, lock: LockFile) -> None:
+        racy_time_ns = time_ns() - RACY_WINDOW_NS
+        old_staged = self.staged_positions() if self.data is not None else []
+        old_paths = self.data[self.paths_start:len(self.data) - TRAILER_SIZE] if self.data is not None else b''
+        garbage = self.garbage
+
+        records = bytearray()
+        staged = []
+        new_paths = bytearray()
+        cursor = count = 0
+
+        def copy_records(stop: int) -> None:
+            nonlocal count
+            if stop <= cursor:
+                return
+            start = self.entries_start + cursor * ENTRY.size
+            records.extend(self.data[start:start + (stop - cursor) * ENTRY.size])
+            for position in old_staged[bisect_left(old_staged, cursor):bisect_left(old_staged, stop)]:
+                staged.append(count + position - cursor)
+            count += stop - cursor
+
+        for local_path in sorted(self.changes):
+            entry = self.changes[local_path]
+            encoded_path = local_path.encode()
+            position, found = self.find(encoded_path) if self.data is not None else (0, False)
+            copy_records(position)
+
+            cursor = position + 1 if found else position
+
+            if entry is None:
+                garbage += len(encoded_path) if found else 0
+                continue
+
+            if found:
+                path_offset = self.record(position)[0]
+            else:
+                path_offset = len(old_paths) + len(new_paths)
+                new_paths.extend(encoded_path)
+
+            flags = {'+': FLAG_ADD, '-': FLAG_REMOVE}.get(entry.sign, 0)
+            file_stat = (0, 0, 0, 0, 0)
+            if entry.stat is not None and entry.stat[0] < racy_time_ns:
+                flags |= FLAG_STAT
+                file_stat = entry.stat
+
+            if flags & (FLAG_ADD | FLAG_REMOVE):
+                staged.append(count)
+            records.extend(ENTRY.pack(path_offset, len(encoded_path), bytes.fromhex(entry.hash), flags, *file_stat))
+            count += 1
+
+        copy_records(self.count)
+        self.save(lock, bytes(records), staged, bytes(old_paths) + bytes(new_paths), count, garbage)
+
+    def save(self, lock: LockFile, records: bytes, staged: list[int], paths: bytes, count: int, garbage: int) -> None:
+        if garbage > len(paths) // 2:
+            records, paths, garbage = self.compact(records, count, paths)
+
+        data = bytearray(HEADER.pack(INDEX_MAGIC, VERSION, count, len(staged), garbage))
+        data.extend(records)
+        for position in staged:
+            data.extend(POSITION.pack(position))
+        data.extend(paths)
+        data.extend(xxh3_128(bytes(data)).digest())
+
+        lock.write(bytes(data))
+        self.close()
+        lock.commit()
+        self.changes.clear()
+        self.load()
+
+    @staticmethod
+    def compact(records: bytes, count: int, paths: bytes) -> (bytes, bytes, int):
+        compacted_records = bytearray()
+        compacted_paths = bytearray()
+        for position in range(count):
+            path_offset, path_length, *rest = ENTRY.unpack_from(records, position * ENTRY.size)
+            compacted_records.extend(ENTRY.pack(len(compacted_paths), path_length, *rest))
+            compacted_paths.extend(paths[path_offset:path_offset + path_length])
+        return bytes(compacted_records), bytes(compacted_paths), 0
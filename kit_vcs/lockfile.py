@@ -0,0 +1,71 @@
+from os import O_CREAT, O_EXCL, O_WRONLY, close, fdopen, open as os_open, path, remove, replace
+from tempfile import mkstemp
+from time import monotonic, sleep
+
+import kit_vcs.errors as errors
+
+LOCK_SUFFIX = '.lock'
+LOCK_TIMEOUT = 10.0
+RETRY_DELAY = 0.005
+MAX_RETRY_DELAY = 0.1
+
+
+def atomic_write(file_path: str, data: bytes | str) -> None:
+    descriptor, temp_path = mkstemp(prefix='tmp_', dir=path.dirname(file_path))
+    try:
+        with fdopen(descriptor, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        replace(temp_path, file_path)
+    except BaseException:
+        if path.exists(temp_path):
+            remove(temp_path)
+        raise
+
+
+class LockFile:
+    def __init__(self, target_path: str, timeout: float | None = None) -> None:
+        self.target_path = target_path
+        self.lock_path = target_path + LOCK_SUFFIX
+        self.timeout = LOCK_TIMEOUT if timeout is None else timeout
+        self.descriptor = None
+
+    def try_acquire(self) -> bool:
+        try:
+            self.descriptor = os_open(self.lock_path, O_CREAT | O_EXCL | O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        return True
+
+    def acquire(self) -> None:
+        deadline = monotonic() + self.timeout
+        delay = RETRY_DELAY
+        while not self.try_acquire():
+            if monotonic() >= deadline:
+                raise errors.LockError(f'Unable to lock {self.target_path}: {self.lock_path} exists. Another kit '
+                                       f'process seems to be running; remove the file if it has crashed')
+            sleep(delay)
+            delay = min(2 * delay, MAX_RETRY_DELAY)
+
+    def write(self, data: bytes | str) -> None:
+        with fdopen(self.descriptor, 'wb' if isinstance(data, bytes) else 'w', closefd=False) as f:
+            f.write(data)
+
+    def commit(self) -> None:
+        close(self.descriptor)
+        self.descriptor = None
+        replace(self.lock_path, self.target_path)
+
+    def release(self) -> None:
+        if self.descriptor is None:
+            return
+        close(self.descriptor)
+        self.descriptor = None
+        if path.exists(self.lock_path):
+            remove(self.lock_path)
+
+    def __enter__(self) -> 'LockFile':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
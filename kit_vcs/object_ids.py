@@ -0,0 +1,46 @@
+from bisect import bisect_left
+from os import listdir, path
+from string import hexdigits
+
+from kit_vcs.pack import ID_SIZE, PackStore
+
+MIN_PREFIX_LENGTH = 4
+HEX_DIGITS = frozenset(hexdigits.lower())
+
+
+def is_id_prefix(name: str) -> bool:
+    return MIN_PREFIX_LENGTH <= len(name) <= 2 * ID_SIZE and set(name) <= HEX_DIGITS
+
+
+class ObjectIdIndex:
+    def __init__(self, objects_path: str, packs: PackStore) -> None:
+        self.objects_path = objects_path
+        self.packs = packs
+        self.loose = {}
+
+    def loose_ids(self, folder: str) -> list[str]:
+        if folder not in self.loose:
+            try:
+                names = listdir(path.join(self.objects_path, folder))
+            except (FileNotFoundError, NotADirectoryError):
+                names = []
+            self.loose[folder] = sorted(folder + name for name in names if not name.startswith('tmp_'))
+        return self.loose[folder]
+
+    def find(self, prefix: str) -> list[str]:
+        loose_ids = self.loose_ids(prefix[:2])
+        matches = set()
+        for position in range(bisect_left(loose_ids, prefix), len(loose_ids)):
+            if not loose_ids[position].startswith(prefix):
+                break
+            matches.add(loose_ids[position])
+        matches.update(self.packs.find_prefix(prefix))
+        return sorted(matches)
+
+    def abbreviate(self, object_id: str, min_length: int = MIN_PREFIX_LENGTH) -> str:
+        if not is_id_prefix(object_id):
+            return object_id
+        for length in range(min_length, len(object_id)):
+            if len(self.find(object_id[:length])) <= 1:
+                return object_id[:length]
+        return object_id
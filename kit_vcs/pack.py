@@ -0,0 +1,241 @@
+import mmap
+import struct
+from os import listdir, makedirs, path, remove, replace
+from tempfile import mkstemp
+
+from xxhash import xxh3_128
+
+from kit_vcs.cache import BLOBS, LRUCache
+from kit_vcs.delta import apply_delta
+
+OBJ_BLOB = 1
+OBJ_COMMIT = 2
+OBJ_TREE = 3
+OBJ_DELTA = 4
+
+PACK_MAGIC = b'KPAK'
+INDEX_MAGIC = b'KIDX'
+VERSION = 1
+
+ID_SIZE = 16
+PACK_HEADER = struct.Struct('>4sII')
+ENTRY_HEADER = struct.Struct('>BQ')
+INDEX_HEADER = struct.Struct('>4sI')
+FANOUT = struct.Struct('>256I')
+OFFSET = struct.Struct('>Q')
+
+MAX_DELTA_DEPTH = 10
+BASE_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class PackIndex:
+    def __init__(self, index_path: str, pack_path: str) -> None:
+        self.index_path = index_path
+        self.pack_path = pack_path
+
+        with open(index_path, 'rb') as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(pack_path, 'rb') as f:
+            self.pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = INDEX_HEADER.unpack_from(self.index, 0)
+        if magic != INDEX_MAGIC or version != VERSION:
+            raise ValueError(f'Unsupported pack index {index_path}')
+
+        self.fanout = FANOUT.unpack_from(self.index, INDEX_HEADER.size)
+        self.count = self.fanout[-1]
+        self.ids_start = INDEX_HEADER.size + FANOUT.size
+        self.offsets_start = self.ids_start + self.count * ID_SIZE
+
+    def __len__(self) -> int:
+        return self.count
+
+    def object_id(self, position: int) -> bytes:
+        start = self.ids_start + position * ID_SIZE
+        return self.index[start:start + ID_SIZE]
+
+    def find(self, object_id: bytes) -> int | None:
+        first_byte = object_id[0]
+        low = self.fanout[first_byte - 1] if first_byte else 0
+        high = self.fanout[first_byte]
+
+        while low < high:
+            middle = (low + high) // 2
+            current = self.object_id(middle)
+            if current == object_id:
+                return middle
+            if current < object_id:
+                low = middle + 1
+            else:
+                high = middle
+
+        return None
+
+    def find_prefix(self, prefix: str) -> str:
+        lower = bytes.fromhex(prefix.ljust(2 * ID_SIZE, '0'))
+        first_byte = lower[0]
+        low = self.fanout[first_byte - 1] if first_byte else 0
+        high = self.fanout[first_byte]
+
+        while low < high:
+            middle = (low + high) // 2
+            if self.object_id(middle) < lower:
+                low = middle + 1
+            else:
+                high = middle
+
+        for position in range(low, self.fanout[first_byte]):
+            object_id = self.object_id(position).hex()
+            if not object_id.startswith(prefix):
+                return
+            yield object_id
+
+    def offset(self, position: int) -> int:
+        return OFFSET.unpack_from(self.index, self.offsets_start + position * OFFSET.size)[0]
+
+    def read_entry(self, position: int) -> (int, bytes):
+        offset = self.offset(position)
+        obj_type, size = ENTRY_HEADER.unpack_from(self.pack, offset)
+        start = offset + ENTRY_HEADER.size
+        return obj_type, self.pack[start:start + size]
+
+    def ids(self) -> bytes:
+        for position in range(self.count):
+            yield self.object_id(position)
+
+    def close(self) -> None:
+        self.index.close()
+        self.pack.close()
+
+
+class PackStore:
+    def __init__(self, pack_dir: str, decompress, cache: LRUCache | None = None) -> None:
+        self.pack_dir = pack_dir
+        self.decompress = decompress
+        self.base_cache = cache if cache is not None else LRUCache(BASE_CACHE_SIZE)
+        self._packs = None
+
+    @property
+    def packs(self) -> list[PackIndex]:
+        if self._packs is None:
+            self._packs = []
+            if path.isdir(self.pack_dir):
+                for name in sorted(listdir(self.pack_dir)):
+                    if name.endswith('.idx'):
+                        self._packs.append(PackIndex(path.join(self.pack_dir, name),
+                                                     path.join(self.pack_dir, name[:-4] + '.pack')))
+        return self._packs
+
+    @staticmethod
+    def to_binary_id(object_id: str) -> bytes | None:
+        if len(object_id) != 2 * ID_SIZE:
+            return None
+        try:
+            return bytes.fromhex(object_id)
+        except ValueError:
+            return None
+
+    def locate(self, object_id: str) -> tuple[PackIndex, int] | None:
+        binary_id = self.to_binary_id(object_id)
+        if binary_id is None:
+            return None
+
+        for pack in self.packs:
+            position = pack.find(binary_id)
+            if position is not None:
+                return pack, position
+        return None
+
+    def __contains__(self, object_id: str) -> bool:
+        return self.locate(object_id) is not None
+
+    def read_entry(self, object_id: str) -> tuple[int, bytes] | None:
+        location = self.locate(object_id)
+        if location is None:
+            return None
+
+        pack, position = location
+        return pack.read_entry(position)
+
+    def get(self, object_id: str) -> bytes | None:
+        entry = self.read_entry(object_id)
+        return entry[1] if entry is not None else None
+
+    def get_content(self, object_id: str) -> bytes | None:
+        entry = self.read_entry(object_id)
+        if entry is None:
+            return None
+
+        obj_type, data = entry
+        if obj_type == OBJ_BLOB:
+            return self.decompress(data)
+        if obj_type != OBJ_DELTA:
+            return data
+
+        base_id = data[:ID_SIZE].hex()
+        return apply_delta(self.get_base(base_id), self.decompress(data[ID_SIZE:]))
+
+    def get_base(self, base_id: str) -> bytes:
+        content = self.base_cache.get(BLOBS, base_id)
+        if content is None:
+            content = self.get_content(base_id)
+            self.base_cache.put(BLOBS, base_id, content, len(content))
+        return content
+
+    def find_prefix(self, prefix: str) -> str:
+        for pack in self.packs:
+            yield from pack.find_prefix(prefix)
+
+    def ids(self) -> str:
+        for pack in self.packs:
+            for binary_id in pack.ids():
+                yield binary_id.hex()
+
+    def close(self) -> None:
+        if self._packs is not None:
+            for pack in self._packs:
+                pack.close()
+        self._packs = None
+
+    def write_pack(self, object_ids: list[str], read_object) -> str:
+        makedirs(self.pack_dir, exist_ok=True)
+        object_ids = sorted(object_ids)
+        pack_name = 'pack-' + xxh3_128(''.join(object_ids)).hexdigest()
+        pack_path = path.join(self.pack_dir, pack_name + '.pack')
+        index_path = path.join(self.pack_dir, pack_name + '.idx')
+
+        offsets = {}
+        pack_descriptor, pack_temp_path = mkstemp(prefix='tmp_pack_', dir=self.pack_dir)
+        index_descriptor, index_temp_path = mkstemp(prefix='tmp_idx_', dir=self.pack_dir)
+        with open(pack_descriptor, 'wb') as pack_file:
+            pack_file.write(PACK_HEADER.pack(PACK_MAGIC, VERSION, len(object_ids)))
+            for object_id in object_ids:
+                obj_type, data = read_object(object_id)
+                offsets[object_id] = pack_file.tell()
+                pack_file.write(ENTRY_HEADER.pack(obj_type, len(data)))
+                pack_file.write(data)
+
+        fanout = [0] * 256
+        for object_id in object_ids:
+            fanout[int(object_id[:2], 16)] += 1
+        for i in range(1, 256):
+            fanout[i] += fanout[i - 1]
+
+        with open(index_descriptor, 'wb') as index_file:
+            index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, VERSION))
+            index_file.write(FANOUT.pack(*fanout))
+            for object_id in object_ids:
+                index_file.write(bytes.fromhex(object_id))
+            for object_id in object_ids:
+                index_file.write(OFFSET.pack(offsets[object_id]))
+
+        self.close()
+        replace(pack_temp_path, pack_path)
+        replace(index_temp_path, index_path)
+        return pack_name
+
+    def remove_packs_except(self, pack_name: str) -> None:
+        self.close()
+        for name in listdir(self.pack_dir):
+            if name.endswith(('.pack', '.idx')) and not name.startswith(pack_name + '.'):
+                remove(path.join(self.pack_dir, name))
@@ -0,0 +1,134 @@
+import mmap
+import struct
+from os import path, stat
+
+from xxhash import xxh3_128
+
+from kit_vcs.lockfile import LockFile
+
+PACKED_REFS_MAGIC = b'KPRF'
+VERSION = 1
+
+HEADER = struct.Struct('>4sII')
+ENTRY = struct.Struct('>III')
+TRAILER_SIZE = 16
+SEPARATOR = '/'
+
+
+def to_ref_name(ref: str) -> str:
+    return ref.replace(path.sep, SEPARATOR)
+
+
+class PackedRefs:
+    def __init__(self, refs_path: str) -> None:
+        self.refs_path = refs_path
+        self.data = None
+        self.count = 0
+        self.signature = None
+        self.load()
+
+    def file_signature(self) -> tuple | None:
+        try:
+            refs_stat = stat(self.refs_path)
+        except OSError:
+            return None
+        return refs_stat.st_ino, refs_stat.st_size, refs_stat.st_mtime_ns
+
+    def load(self) -> None:
+        self.close()
+        self.signature = self.file_signature()
+        if self.signature is None or self.signature[1] < HEADER.size + TRAILER_SIZE:
+            return
+
+        with open(self.refs_path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = HEADER.unpack_from(self.data, 0)
+        if (magic != PACKED_REFS_MAGIC or version != VERSION
+                or xxh3_128(self.data[:-TRAILER_SIZE]).digest() != self.data[-TRAILER_SIZE:]):
+            self.close()
+            return
+
+        self.count = count
+
+    def refresh(self) -> None:
+        if self.file_signature() != self.signature:
+            self.load()
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.close()
+        self.data = None
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def texts_start(self) -> int:
+        return HEADER.size + self.count * ENTRY.size
+
+    def entry(self, position: int) -> (int, int, int):
+        offset, name_length, value_length = ENTRY.unpack_from(self.data, HEADER.size + position * ENTRY.size)
+        return self.texts_start + offset, name_length, value_length
+
+    def name(self, position: int) -> bytes:
+        start, name_length, _ = self.entry(position)
+        return self.data[start:start + name_length]
+
+    def value(self, position: int) -> str:
+        start, name_length, value_length = self.entry(position)
+        return self.data[start + name_length:start + name_length + value_length].decode()
+
+    def search(self, name: bytes) -> int:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.name(middle) < name:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get(self, ref: str) -> str | None:
+        if self.data is None:
+            return None
+
+        name = to_ref_name(ref).encode()
+        position = self.search(name)
+        if position < self.count and self.name(position) == name:
+            return self.value(position)
+        return None
+
+    def items(self, prefix: str = '') -> (str, str):
+        if self.data is None:
+            return
+
+        prefix = to_ref_name(prefix).encode()
+        texts_start = self.texts_start
+        entries = self.data[HEADER.size + self.search(prefix) * ENTRY.size:texts_start]
+        for offset, name_length, value_length in ENTRY.iter_unpack(entries):
+            start = texts_start + offset
+            name = self.data[start:start + name_length]
+            if not name.startswith(prefix):
+                return
+            yield name.decode(), self.data[start + name_length:start + name_length + value_length].decode()
+
+    def write(self, lock: LockFile, refs: dict[str: str]) -> None:
+        entries = bytearray()
+        texts = bytearray()
+        for name in sorted(refs, key=lambda ref: ref.encode()):
+            name_data, value_data = name.encode(), refs[name].encode()
+            entries.extend(ENTRY.pack(len(texts), len(name_data), len(value_data)))
+            texts.extend(name_data)
+            texts.extend(value_data)
+
+        data = bytearray(HEADER.pack(PACKED_REFS_MAGIC, VERSION, len(refs)))
+        data.extend(entries)
+        data.extend(texts)
+        data.extend(xxh3_128(bytes(data)).digest())
+
+        lock.write(bytes(data))
+        self.close()
+        lock.commit()
+        self.load()
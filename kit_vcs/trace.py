@@ -0,0 +1,102 @@
+import json
+import threading
+from collections import namedtuple
+from functools import wraps
+from os import getpid
+from time import perf_counter_ns
+
+OBJECTS_READ = 'objects_read'
+OBJECTS_WRITTEN = 'objects_written'
+COMPRESSED_BYTES_READ = 'compressed_bytes_read'
+COMPRESSED_BYTES_WRITTEN = 'compressed_bytes_written'
+UNCOMPRESSED_BYTES_READ = 'uncompressed_bytes_read'
+UNCOMPRESSED_BYTES_WRITTEN = 'uncompressed_bytes_written'
+FILES_STATED = 'files_stated'
+
+TRACE_ENV = 'KIT_TRACE'
+SUMMARY_STDERR = '-'
+
+Span = namedtuple('Span', ['name', 'start', 'duration', 'thread'])
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.spans = []
+        self.counters = {}
+        self.origin = 0
+
+    def enable(self) -> None:
+        self.spans = []
+        self.counters = {}
+        self.origin = perf_counter_ns()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def count(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_span(self, name: str, start: int, end: int) -> None:
+        self.spans.append(Span(name, start - self.origin, end - start, threading.get_ident()))
+
+    def summary(self) -> list[(str, int, int, int)]:
+        totals = {}
+        for span in self.spans:
+            calls, total, longest = totals.get(span.name, (0, 0, 0))
+            totals[span.name] = (calls + 1, total + span.duration, max(longest, span.duration))
+        return sorted(((name, *values) for name, values in totals.items()), key=lambda row: -row[2])
+
+    def format_summary(self) -> str:
+        rows = self.summary()
+        width = max([len(name) for name, *_ in rows] + [len(name) for name in self.counters] + [len('Operation')])
+        lines = [f'{"Operation":<{width}} {"Calls":>8} {"Total ms":>12} {"Max ms":>10}']
+        for name, calls, total, longest in rows:
+            lines.append(f'{name:<{width}} {calls:>8} {total / 10 ** 6:>12.2f} {longest / 10 ** 6:>10.2f}')
+        lines.append('')
+        lines.append(f'{"Counter":<{width}} {"Value":>8}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{name:<{width}} {value:>8}')
+        return '\n'.join(lines)
+
+    def chrome_events(self) -> dict:
+        pid = getpid()
+        events = [{'name': span.name, 'cat': 'kit', 'ph': 'X', 'ts': span.start / 1000, 'dur': span.duration / 1000,
+                   'pid': pid, 'tid': span.thread} for span in self.spans]
+        end = max((span.start + span.duration for span in self.spans), default=0)
+        events.append({'name': 'counters', 'cat': 'kit', 'ph': 'C', 'ts': end / 1000, 'pid': pid, 'tid': 0,
+                       'args': dict(self.counters)})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, trace_path: str) -> None:
+        with open(trace_path, 'w') as f:
+            json.dump(self.chrome_events(), f)
+
+
+tracer = Tracer()
+
+
+def count(name: str, value: int = 1) -> None:
+    if tracer.enabled:
+        tracer.count(name, value)
+
+
+def traced(function):
+    name = function.__qualname__
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if not tracer.enabled:
+            return function(*args, **kwargs)
+        start = perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            tracer.add_span(name, start, perf_counter_ns())
+
+    return wrapper
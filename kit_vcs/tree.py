@@ -0,0 +1,22 @@
+TREE_HEADER = 'tree\n'
+MODE_FILE = '100644'
+MODE_TREE = '40000'
+
+
+def serialize_tree(entries: dict[str: (str, str)]) -> str:
+    lines = [TREE_HEADER]
+    for name in sorted(entries):
+        mode, object_hash = entries[name]
+        lines.append(f'{mode} {object_hash} {name}\n')
+    return ''.join(lines)
+
+
+def parse_tree(data: str) -> dict[str: (str, str)]:
+    if not data.startswith(TREE_HEADER):
+        raise ValueError('Object is not a tree')
+
+    entries = {}
+    for line in data[len(TREE_HEADER):].splitlines():
+        mode, object_hash, name = line.split(' ', 2)
+        entries[name] = (mode, object_hash)
+    return entries
@@ -1,8 +1,14 @@
-from os import path, sep, walk
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count, path, sep, stat, stat_result
 
 from xxhash import xxh3_128
 
 import kit_vcs.errors as errors
+import kit_vcs.trace as trace
+
+CHUNK_SIZE = 1024 * 1024
+TREE_SEED_OFFSET = 1 << 32
+COMMIT_SEED_OFFSET = 2 << 32
 
 
 class Utils:
@@ -20,44 +26,50 @@ class Utils:
         assert path.isfile(abs_path)
         cur_hash = xxh3_128(path.relpath(abs_path, start=workspace_path), seed=seed)
         with open(abs_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
                 cur_hash.update(chunk)
         return cur_hash
 
     @staticmethod
-    def get_string_hash(string: str, seed: int) -> xxh3_128:
-        return xxh3_128(string, seed=seed)
+    def get_content_hash(abs_path: str, seed: int) -> xxh3_128:
+        assert path.isfile(abs_path)
+        cur_hash = xxh3_128(seed=seed)
+        with open(abs_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                cur_hash.update(chunk)
+        return cur_hash
 
     @staticmethod
-    def get_tree_hash(workspace_path: str, seed: int) -> xxh3_128:
-        index_path = path.join(workspace_path, "INDEX")
-        assert path.isfile(index_path) and path.basename(index_path) == "INDEX"
-        cur_hash = xxh3_128('kit', seed=seed)
-        with open(index_path, 'r') as f:
-            for line in f:
-                local_path, file_hash, diff_type = line.split(',')
-                cur_hash.update(file_hash.strip())
-        return cur_hash
+    def get_stat_data(abs_path: str) -> tuple:
+        return Utils.to_stat_data(stat(abs_path))
 
     @staticmethod
-    def bool_to_sign(value: bool) -> str:
-        return "+" if value else "-"
+    def to_stat_data(file_stat: stat_result) -> tuple:
+        trace.count(trace.FILES_STATED)
+        return file_stat.st_mtime_ns, file_stat.st_ctime_ns, file_stat.st_size, file_stat.st_ino, file_stat.st_dev
 
     @staticmethod
-    def sign_to_bool(value: str) -> bool:
-        return True if value == '+' else False
+    def default_jobs() -> int:
+        return cpu_count() or 1
+
+    @staticmethod
+    def run_jobs(function, items: list, jobs: int) -> list:
+        if jobs <= 1 or len(items) <= 1:
+            return [function(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+            return list(executor.map(function, items))
 
     @staticmethod
-    def get_relative_paths(dir_path: str) -> set[str]:
-        relative_paths = set()
+    def get_string_hash(string: str, seed: int) -> xxh3_128:
+        return xxh3_128(string, seed=seed)
 
-        for root, _, files in walk(dir_path):
-            for file in files:
-                absolute_path = path.join(root, file)
-                relative_path = path.relpath(absolute_path, dir_path)
-                relative_paths.add(relative_path)
+    @staticmethod
+    def bool_to_sign(value: bool) -> str:
+        return "+" if value else "-"
 
-        return relative_paths
+    @staticmethod
+    def sign_to_bool(value: str) -> bool:
+        return True if value == '+' else False
 
     @staticmethod
     def parse_from_str_to_os_path(string_path: str):
@@ -68,3 +80,11 @@ class Utils:
         if path.isfile(filepath):
             return any(p.startswith('.') for p in filepath.split(sep)[:-1])
         return any(p.startswith('.') for p in filepath.split(sep))
+
+    @staticmethod
+    def split_local_path(local_path: str) -> list[str]:
+        return [part for part in path.normpath(local_path).split(sep) if part != '.']
+
+    @staticmethod
+    def is_path_within(local_path: str, folder: str) -> bool:
+        return folder == '.' or local_path == folder or local_path.startswith(folder + sep)
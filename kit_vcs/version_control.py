@@ -1,305 +1,356 @@
 from datetime import datetime
-from os import path, walk
+from os import path
 from random import randint
 
+import kit_vcs.cache as cache
+import kit_vcs.codec as codec
+import kit_vcs.diff as diff
 import kit_vcs.errors as errors
-from kit_vcs.drive_manager import DriveManager
-from kit_vcs.utils import Utils
+import kit_vcs.fsmonitor as fsmonitor
+from kit_vcs.drive_manager import NO_REF, DriveManager
+from kit_vcs.object_ids import ObjectIdIndex
+from kit_vcs.utils import COMMIT_SEED_OFFSET, Utils
 
 
 class VersionControl:
-    def __init__(self, username: str, workspace_path: str) -> None:
+    def __init__(self, username: str, workspace_path: str, jobs: int | None = None,
+                 diff_algorithm: str = diff.MYERS, cache_size: int = cache.DEFAULT_CACHE_SIZE) -> None:
         self.username = username
         self.workspace_path = workspace_path
         self.repo_path = path.abspath(path.join(workspace_path, ".kit"))
         self.index_path = path.join('.kit', 'INDEX')
-        self.drive = DriveManager(self.workspace_path)
+        self.drive = DriveManager(self.workspace_path, jobs, diff_algorithm, cache_size)
         self.head = self.drive.get_head()
         self.seed = self.drive.get_seed()
         self.current_id = self.drive.get_last_commit_id(self.head)
 
-    def init(self) -> None:
+    def init(self, compression: str | None = None) -> None:
         if self.drive.is_exist('.kit'):
             raise errors.AlreadyExistError(f'This directory already have repository')
 
         self.head = path.join('refs', 'heads', 'main')
         self.seed = randint(10 ** 7, 10 ** 8 - 1)
+        self.drive.hash_mode = 'content'
+        self.drive.compression = codec.parse_compression(compression or codec.DEFAULT_COMPRESSION)
 
         self.drive.initialize_directories()
         self.commit("initial commit")
 
         self.drive.write(path.join('.kit', 'HEAD'), self.head)
         self.drive.write(path.join('.kit', 'SEED'), str(self.seed))
+        self.drive.write(path.join('.kit', 'HASHING'), self.drive.hash_mode)
+        self.drive.write(path.join('.kit', 'COMPRESSION'), codec.format_compression(*self.drive.compression))
         self.drive.write(path.join('.kit', self.head), self.current_id)
 
     @Utils.check_repository_exists
     def add(self, local_path: str) -> None:
         self.drive.calculate_index_data(local_path, self.drive.get_commit_tree_hash(self.current_id), self.seed)
         self.drive.write_index_data()
-        self.drive.delete_if_empty(path.join('.kit', 'INDEX'))
 
     @Utils.check_repository_exists
     def rm(self, local_path: str) -> None:
         self.drive.calculate_index_data(local_path, self.drive.get_commit_tree_hash(self.current_id),
                                         self.seed, False)
         self.drive.write_index_data()
-        self.drive.delete_if_empty(path.join('.kit', 'INDEX'))
 
     @Utils.check_repository_exists
-    def index(self) -> str:
-        if not self.drive.is_exist(self.index_path):
-            return
-
-        for line in self.drive.read(self.index_path).split('\n')[:-1]:
-            yield line
+    def status(self) -> (str, str, str):
+        for filepath, (_, is_add) in sorted(self.drive.index_hashes.items()):
+            yield 'staged', Utils.bool_to_sign(is_add), filepath
+
+        head_tree_hash = self.drive.get_commit_tree_hash(self.current_id) if self.current_id is not None else None
+        modified, deleted, untracked = self.drive.get_workspace_status(head_tree_hash, self.seed)
+        changes = dict.fromkeys(modified, '~') | dict.fromkeys(deleted, '-')
+        for filepath in sorted(changes):
+            yield 'unstaged', changes[filepath], filepath
+        for filepath in untracked:
+            yield 'untracked', '?', filepath
 
     @Utils.check_repository_exists
     def commit(self, description: str) -> None:
-        if self.current_id is not None and not self.drive.is_exist(self.index_path):
+        if self.current_id is not None and not self.drive.index_hashes:
             raise errors.NothingToCommitError("No changes detected in the index. There is nothing to commit.")
 
         commit_time = datetime.now()
         commit_id = Utils.get_string_hash(''.join((self.username, description, commit_time.isoformat())),
-                                          seed=self.seed).hexdigest()
-        tree_hash = Utils.get_tree_hash(self.repo_path, self.seed).hexdigest()
+                                          seed=self.seed + COMMIT_SEED_OFFSET).hexdigest()
+        prev_tree_hash = self.drive.get_commit_tree_hash(self.current_id) if self.current_id is not None else None
+        tree_hash = self.drive.save_tree(prev_tree_hash, self.seed)
 
-        self.drive.write_commit_data(commit_id, self.username, commit_time, description, tree_hash, self.current_id)
+        self.drive.write_commit_data(commit_id, self.username, commit_time, description, tree_hash, self.current_id,
+                                     self.drive.get_merge_head())
+        self.drive.update_commit_graph(commit_id)
 
-        if self.current_id is not None:
-            self.drive.save_tree(tree_hash, self.drive.get_commit_tree_hash(self.current_id))
-
-        self.drive.rm_index_files()
         self.drive.save_files_from_index()
-        self.__update_head(commit_id)
+        self.__update_head(commit_id, self.current_id)
+        self.drive.rm_index_files()
+        self.drive.set_merge_head(None)
 
-        if self.drive.is_exist(self.index_path):
-            self.drive.remove(self.index_path)
-            self.drive.index_hashes.clear()
+        self.drive.index_hashes.clear()
+        self.drive.write_index_data()
 
     @Utils.check_repository_exists
     def amend(self, description: str) -> None:
-        parent = self.drive.read(path.join('.kit', 'objects', self.current_id[:2], self.current_id[2:])).split('\n')[4]
+        parents = self.drive.read_commit(self.current_id).split('\n')[4:]
         self.commit(description)
 
-        user, date, description, tree, _ = self.drive.read(path.join('.kit', 'objects', self.current_id[:2],
-                                                                     self.current_id[2:])).split('\n')
-        self.drive.write(path.join('.kit', 'objects', self.current_id[:2], self.current_id[2:]),
-                         '\n'.join([user, date, description, tree, parent]))
+        user, date, description, tree, *_ = self.drive.read_commit(self.current_id).split('\n')
+        self.drive.write_commit_data(self.current_id, user, date, description, tree, *parents)
+        self.drive.cache.discard(cache.COMMITS, self.current_id)
+        self.drive.update_commit_graph(self.current_id)
 
     @Utils.check_repository_exists
-    def commits_list(self) -> (str, str, str, str):
+    def commits_list(self, paths: list[str] = ()) -> (str, str, str, str):
+        paths = self.__normalize_paths(paths)
         name = self.current_id
 
-        while name != 'None':
-            user, date, description, _, parent = self.drive.read(
-                path.join('.kit', "objects", name[:2], name[2:])).split('\n')
-            yield name, user, date, description
+        while name is not None:
+            entry = self.drive.get_commit_entry(name)
+            parent = entry.parents[0] if entry.parents else None
+            if not paths or self.drive.paths_changed(self.drive.get_commit_tree_hash(parent) if parent else None,
+                                                     entry.tree, paths):
+                yield name, entry.user, entry.date, entry.description
             name = parent
 
     @Utils.check_repository_exists
-    def commits_diff(self, commit1_hash: str, commit2_hash: str) -> (str, str, str):
-        tree1_path = self.drive.commit_to_tree_path(commit1_hash)
-        tree2_path = self.drive.commit_to_tree_path(commit2_hash)
+    def commits_diff(self, commit1_hash: str, commit2_hash: str, paths: list[str] = ()) -> (str, str, str):
+        tree1_hash = self.drive.get_commit_tree_hash(commit1_hash)
+        tree2_hash = self.drive.get_commit_tree_hash(commit2_hash)
 
-        for line in self.drive.get_tree_diff(tree1_path, tree2_path):
+        for line in self.drive.get_tree_diff(tree1_hash, tree2_hash, self.__normalize_paths(paths)):
             yield line
 
     @Utils.check_repository_exists
     def files_diff(self, commit1_hash: str, commit2_hash: str, file: str) -> (str, str):
-        file1_path = path.join(self.drive.commit_to_tree_path(commit1_hash), file)
-        file2_path = path.join(self.drive.commit_to_tree_path(commit2_hash), file)
-        file1_hash = self.drive.read(file1_path) if path.exists(file1_path) else None
-        file2_hash = self.drive.read(file2_path) if path.exists(file2_path) else None
+        file1_hash = self.drive.get_tree_file_hash(self.drive.get_commit_tree_hash(commit1_hash), file)
+        file2_hash = self.drive.get_tree_file_hash(self.drive.get_commit_tree_hash(commit2_hash), file)
 
         for line in self.drive.get_files_diff(file1_hash, file2_hash):
             yield line
 
     @Utils.check_repository_exists
     def create_branch(self, name: str) -> None:
-        branch_path = path.join('.kit', 'refs', 'heads', name)
+        branch_path = path.join('refs', 'heads', name)
 
-        if self.drive.is_exist(branch_path):
+        if self.drive.read_ref(branch_path) is not None:
             raise errors.AlreadyExistError(f'Branch named {name} already exist')
 
-        self.drive.write(branch_path, self.current_id)
+        self.drive.update_ref(branch_path, self.current_id, NO_REF)
 
     @Utils.check_repository_exists
     def branches_list(self) -> (str, str, str):
-        branches_path = path.join('.kit', 'refs', 'heads')
-        for branch in self.drive.get_files_in_dir(branches_path):
-            yield branch
+        yield from self.drive.list_refs(path.join('refs', 'heads'))
 
     @Utils.check_repository_exists
     def remove_branch(self, name: str) -> None:
-        branch_path = path.join('.kit', 'refs', 'heads', name)
+        branch_path = path.join('refs', 'heads', name)
         current_branch = path.basename(self.head)
 
         if current_branch == name:
-            self.drive.write(path.join('.kit', 'HEAD'), self.current_id)
+            self.drive.update_ref('HEAD', self.current_id)
 
-        if self.drive.is_exist(branch_path):
-            self.drive.remove(branch_path)
+        if self.drive.read_ref(branch_path) is not None:
+            self.drive.delete_ref(branch_path)
 
     @Utils.check_repository_exists
     def create_tag(self, name: str, description: str = None) -> None:
-        tag_path = path.join('.kit', 'refs', 'tags', name)
+        tag_path = path.join('refs', 'tags', name)
 
-        if self.drive.is_exist(tag_path):
+        if self.drive.read_ref(tag_path) is not None:
             raise errors.AlreadyExistError(f'Tag named {name} already exist')
 
-        self.drive.write(tag_path, f"{self.username}\n{datetime.now()}\n{description}\n{self.current_id}")
+        self.drive.update_ref(tag_path, f"{self.username}\n{datetime.now()}\n{description}\n{self.current_id}",
+                              NO_REF)
 
     @Utils.check_repository_exists
     def tags_list(self) -> (str, str, str):
-        tags_path = path.join('.kit', 'refs', 'tags')
-        for tag in self.drive.get_files_in_dir(tags_path):
-            yield f'{tag}\n{self.drive.read(path.join(tags_path, tag))}'
+        for tag, data in self.drive.list_refs(path.join('refs', 'tags')).items():
+            yield f'{tag}\n{data}'
 
     @Utils.check_repository_exists
     def remove_tag(self, name: str) -> None:
-        tag_path = path.join('.kit', 'refs', 'tags', name)
+        tag_path = path.join('refs', 'tags', name)
 
-        if self.drive.is_exist(tag_path):
-            self.drive.remove(tag_path)
+        if self.drive.read_ref(tag_path) is not None:
+            self.drive.delete_ref(tag_path)
 
     @Utils.check_repository_exists
     def checkout_to_commit(self, name: str, force: bool) -> None:
-        commit_path = path.join("objects", name[:2], name[2:])
-        self.__check_checkout_possibility('Commit', force, commit_path, name)
-        commit_id = name
-        self.drive.write(path.join('.kit', 'HEAD'), commit_id)
+        commit_id = self.drive.resolve_commit(name)
+        self.__check_checkout_possibility('Commit', force, commit_id is not None, name)
+        self.drive.update_ref('HEAD', commit_id)
         self.__load_commit_data(commit_id)
 
     @Utils.check_repository_exists
     def checkout_to_tag(self, name: str, force: bool) -> None:
-        tag_path = path.join('refs', 'tags', name)
-        self.__check_checkout_possibility('Tag', force, tag_path, name)
-        commit_id = self.drive.read(path.join('.kit', tag_path)).split()[-1]
-        self.drive.write(path.join('.kit', 'HEAD'), commit_id)
+        tag_data = self.drive.read_ref(path.join('refs', 'tags', name))
+        self.__check_checkout_possibility('Tag', force, tag_data is not None, name)
+        commit_id = tag_data.split()[-1]
+        self.drive.update_ref('HEAD', commit_id)
         self.__load_commit_data(commit_id)
 
     @Utils.check_repository_exists
     def checkout_to_branch(self, name: str, force: bool) -> None:
         branch_path = path.join('refs', 'heads', name)
-        self.__check_checkout_possibility('Branch', force, branch_path, name)
-        commit_id = self.drive.read(path.join('.kit', branch_path))
-        self.drive.write(path.join('.kit', 'HEAD'), branch_path)
+        commit_id = self.drive.read_ref(branch_path)
+        self.__check_checkout_possibility('Branch', force, commit_id is not None, name)
+        self.drive.update_ref('HEAD', branch_path)
         self.__load_commit_data(commit_id)
 
     @Utils.check_repository_exists
     def checkout(self, name: str, force: bool) -> None:
         tag_path = path.join('refs', 'tags', name)
         branch_path = path.join('refs', 'heads', name)
-        commit_path = path.join('.kit', "objects", name[:2], name[2:])
-
-        if self.drive.is_exist(self.index_path) and not force:
+        if self.drive.index_hashes and not force:
             raise errors.UncommitedChangesError("You have uncommitted changes in your working directory. ""Please "
                                                 "commit or discard them before switching branches, tags, or commits.")
 
-        if self.drive.is_exist(path.join('.kit', branch_path)):
+        if self.drive.read_ref(branch_path) is not None:
             self.checkout_to_branch(name, force)
-        elif self.drive.is_exist(path.join('.kit', tag_path)):
+        elif self.drive.read_ref(tag_path) is not None:
             self.checkout_to_tag(name, force)
-        elif self.drive.is_exist(commit_path):
+        elif self.drive.resolve_commit(name) is not None:
             self.checkout_to_commit(name, force)
         else:
             raise errors.CheckoutError(f"Commit/branch/tag with name {name} does not exist")
 
     @Utils.check_repository_exists
     def current_branch(self) -> str:
-        if self.drive.is_exist(path.join('.kit', "objects", self.head[:2], self.head[2:])):
+        if self.drive.has_object(self.head):
             raise errors.NotOnBranchError("You are not on a branch")
 
         return path.basename(self.head)
 
     @Utils.check_repository_exists
     def merge_commits(self, main_commit, additional_commit, message, cherry_pick=False, no_commit=False) -> None:
-        if not self.drive.is_exist(path.join(self.repo_path, 'objects', main_commit[:2], main_commit[2:])):
-            raise errors.NotFoundError(f"Commit {main_commit} not found")
-
-        if not self.drive.is_exist(path.join(self.repo_path, 'objects', additional_commit[:2], additional_commit[2:])):
-            raise errors.NotFoundError(f"Commit {additional_commit} not found")
-
-        if not cherry_pick and self.drive.is_ancestor(main_commit, additional_commit):
-            self.__update_head(additional_commit)
-            self.__load_commit_data(additional_commit)
-            return
-
-        conflicts = self.__try_merge_commits(main_commit, additional_commit)
-        self.__try_merge_commits(additional_commit, main_commit)
-        if conflicts:
-            self.__mark_merge_conflicts(conflicts)
+        main_commit, additional_commit = self.__resolve_commit(main_commit), self.__resolve_commit(additional_commit)
 
+        if cherry_pick:
+            parents = self.drive.get_commit_parents(additional_commit)
+            base_commit = parents[0] if parents else None
+        else:
+            base_commit = self.drive.get_merge_base(main_commit, additional_commit)
+            if base_commit == additional_commit:
+                return
+            if base_commit == main_commit:
+                self.__load_commit_data(additional_commit)
+                self.__update_head(additional_commit, main_commit)
+                return
+
+        changes, conflicts = self.drive.merge_trees(*(self.drive.get_commit_tree_hash(commit_id) if commit_id else None
+                                                      for commit_id in (base_commit, main_commit, additional_commit)))
+        conflicted_files = self.__apply_merge(changes, conflicts)
+        if not cherry_pick:
+            self.drive.set_merge_head(additional_commit)
+
+        if conflicted_files:
+            raise errors.MergeConflictError(f"Merge conflict(s) detected in the following files: "
+                                            f"{', '.join(conflicted_files)}")
         if no_commit:
             return
         self.commit(message)
 
     @Utils.check_repository_exists
-    def get_branch_head(self, name: str) -> str:
-        branch_path = path.join('.kit', 'refs', 'heads', name)
+    def gc(self) -> (int, int):
+        refs_count = self.drive.pack_refs()
+        self.drive.write_commit_graph()
+        return self.drive.repack(), refs_count
 
-        if not self.drive.is_exist(branch_path):
-            raise errors.NotFoundError(f"Branch with name {name} does not exist")
+    @Utils.check_repository_exists
+    def start_fsmonitor(self) -> dict:
+        return fsmonitor.start(self.workspace_path)
+
+    @Utils.check_repository_exists
+    def stop_fsmonitor(self) -> bool:
+        return fsmonitor.stop(self.repo_path)
+
+    @Utils.check_repository_exists
+    def fsmonitor_status(self) -> dict | None:
+        return fsmonitor.status(self.repo_path)
 
-        return self.drive.read(branch_path)
+    @Utils.check_repository_exists
+    def object_id_index(self) -> ObjectIdIndex:
+        return self.drive.object_id_index()
 
-    def __mark_merge_conflicts(self, conflicts: list):
-        for file_path, main_hash, additional_hash in conflicts:
-            self.drive.write(file_path, '\n'.join(self.drive.merge_files_with_conflicts(main_hash, additional_hash)))
-            self.add(file_path)
+    @Utils.check_repository_exists
+    def get_branch_head(self, name: str) -> str:
+        commit_id = self.drive.read_ref(path.join('refs', 'heads', name))
 
-        raise errors.MergeConflictError(f"Merge conflict(s) detected in the following files: "
-                                        f"{', '.join([c[0] for c in conflicts])}")
+        if commit_id is None:
+            raise errors.NotFoundError(f"Branch with name {name} does not exist")
+
+        return commit_id
+
+    def __apply_merge(self, changes: dict[str: str | None], conflicts: list[(str, str, str, str)]) -> list[str]:
+        files_to_load = [(file_path, file_hash) for file_path, file_hash in sorted(changes.items()) if file_hash]
+        files_to_load += [(file_path, main_hash or additional_hash)
+                          for file_path, _, main_hash, additional_hash in sorted(conflicts)
+                          if main_hash is None or additional_hash is None]
+        self.drive.load_files(files_to_load)
+
+        self.drive.begin_index_update()
+        for file_path, file_hash in files_to_load:
+            self.drive.stage_index_file(file_path, file_hash)
+        for file_path, file_hash in sorted(changes.items()):
+            if file_hash is None:
+                self.drive.stage_index_path(file_path, False)
+
+        conflicted_files = []
+        for file_path, base_hash, main_hash, additional_hash in sorted(conflicts):
+            if main_hash is None or additional_hash is None:
+                conflicted_files.append(file_path)
+                continue
+
+            lines, has_conflict = self.drive.merge_files(base_hash, main_hash, additional_hash)
+            self.drive.write(file_path, '\n'.join(lines) + '\n' if lines else '')
+            if has_conflict:
+                conflicted_files.append(file_path)
+            self.drive.stage_index_path(file_path)
+
+        self.drive.commit_index_update(self.drive.get_commit_tree_hash(self.current_id), self.seed)
+        return conflicted_files
+
+    def __normalize_paths(self, paths: list[str]) -> list[str]:
+        normalized = []
+        for local_path in paths:
+            workspace_path = path.abspath(self.workspace_path)
+            relative_path = path.relpath(path.abspath(path.join(workspace_path, local_path)), workspace_path)
+            if relative_path == path.pardir or relative_path.startswith(path.pardir + path.sep):
+                raise errors.NotFoundError(f"Path {local_path} is outside the repository")
+            normalized.append(relative_path)
+        return normalized
+
+    def __resolve_commit(self, name: str) -> str:
+        commit_id = self.drive.resolve_commit(name)
+        if commit_id is None:
+            raise errors.NotFoundError(f"Commit {name} not found")
+        return commit_id
 
     def __load_commit_data(self, commit_id: str) -> None:
         self.head = self.drive.get_head()
-        self.drive.delete_tree_files(self.drive.get_commit_tree_hash(self.current_id))
-        self.drive.load_tree_files(self.drive.get_commit_tree_hash(commit_id))
+        self.drive.checkout_tree(self.drive.get_commit_tree_hash(self.current_id),
+                                 self.drive.get_commit_tree_hash(commit_id), set(self.drive.index_hashes))
         self.current_id = commit_id
+        self.drive.set_merge_head(None)
+
+        self.drive.index_hashes.clear()
+        self.drive.write_index_data()
 
-    def __check_checkout_possibility(self, checkout_type: str, force: bool, checkout_path, name) -> None:
-        if self.drive.is_exist(self.index_path) and not force:
+    def __check_checkout_possibility(self, checkout_type: str, force: bool, target_exists: bool, name) -> None:
+        if self.drive.index_hashes and not force:
             raise errors.UncommitedChangesError("You have uncommitted changes in your working directory. ""Please "
                                                 "commit or discard them before switching branches, tags, or commits.")
 
-        if not self.drive.is_exist(path.join('.kit', checkout_path)):
+        if not target_exists:
             raise errors.CheckoutError(f"{checkout_type} with name {name} does not exist")
 
-    def __try_merge_commits(self, main_commit: str, additional_commit: str) -> list[(str, str, str)]:
-        main_tree_id = self.drive.get_commit_tree_hash(main_commit)
-        additional_tree_id = self.drive.get_commit_tree_hash(additional_commit)
-        main_tree_path = path.join(main_tree_id[:2], main_tree_id[2:])
-        drive_main_tree_path = path.join(self.repo_path, 'objects', main_tree_path)
-        additional_tree_path = path.join(additional_tree_id[:2], additional_tree_id[2:])
-
-        conflicts = []
-        for root, _, files in walk(drive_main_tree_path):
-            for file in files:
-                rel_path = path.relpath(root, start=drive_main_tree_path)
-                main_file_path = path.join(main_tree_path, rel_path, file)
-                additional_file_path = path.join(additional_tree_path, rel_path, file)
-                drive_additional_file_path = path.join('.kit', 'objects', additional_file_path)
-                main_file_hash = self.drive.read(path.join('.kit', 'objects', main_file_path))
-
-                if not self.drive.is_exist(drive_additional_file_path):
-                    self.drive.load_file(main_file_hash, path.join(self.workspace_path, rel_path, file))
-                    self.add(path.join(rel_path, file))
-                    continue
-
-                additional_file_hash = self.drive.read(path.join('.kit', 'objects', additional_file_path))
-
-                if main_file_hash != additional_file_hash:
-                    conflicts.append((path.join(rel_path, file), main_file_hash, additional_file_hash))
-
-        return conflicts
-
-    def __update_head(self, new_head: str) -> None:
+    def __update_head(self, new_head: str, expected_head: str | None) -> None:
         self.current_id = new_head
 
-        if path.exists(path.join(self.repo_path, 'objects', self.head[:2], self.head[2:])):
-            self.drive.write(path.join('.kit', 'HEAD'), self.current_id)
+        if self.drive.has_object(self.head):
+            self.drive.update_ref('HEAD', self.current_id, expected_head or NO_REF)
         else:
-            self.drive.write(path.join('.kit', self.head), self.current_id)
+            self.drive.update_ref(self.head, self.current_id, expected_head or NO_REF)
 
 
 if __name__ == '__main__':
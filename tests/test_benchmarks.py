@@ -0,0 +1,89 @@
+from os import path
+
+import pytest
+
+from benchmarks.generator import RepoSpec, branch_name, file_name, generate_repo
+from benchmarks.measure import measure
+from benchmarks.suite import OPERATIONS, compare, load_results, run_scenario, save_results
+from kit_vcs.version_control import VersionControl
+
+SPEC = RepoSpec(files=30, file_size=256, depth=3, branches=2, change_ratio=0.2, seed=7)
+
+
+def make_results(spec: dict, seconds: float, peak_rss: int) -> dict:
+    return {'format': 1, 'scenarios': {'base': {'spec': spec, 'operations': {
+        'add': {'seconds': seconds, 'peak_rss': peak_rss, 'read_bytes': 0, 'write_bytes': 0}}}}}
+
+
+def read_files(workspace_path: str) -> list[bytes]:
+    files = []
+    for index in range(SPEC.files):
+        with open(path.join(workspace_path, file_name(index)), 'rb') as f:
+            files.append(f.read())
+    return files
+
+
+def test_generate_repo(tmp_path):
+    workspace_path = str(tmp_path / 'repo')
+
+    generate_repo(workspace_path, SPEC)
+
+    vcs = VersionControl('user', workspace_path)
+    assert vcs.current_branch() == 'main'
+    assert len(list(vcs.commits_list())) == SPEC.depth + 1
+    assert sorted(vcs.branches_list()) == sorted(['main'] + [branch_name(i) for i in range(SPEC.branches)])
+    assert all(len(content) == SPEC.file_size for content in read_files(workspace_path))
+    assert list(vcs.status()) == []
+
+
+def test_generate_repo_reproducible(tmp_path):
+    generate_repo(str(tmp_path / 'first'), SPEC)
+    generate_repo(str(tmp_path / 'second'), SPEC)
+    generate_repo(str(tmp_path / 'other'), SPEC._replace(seed=8))
+
+    assert read_files(str(tmp_path / 'first')) == read_files(str(tmp_path / 'second'))
+    assert read_files(str(tmp_path / 'first')) != read_files(str(tmp_path / 'other'))
+
+
+def test_run_scenario(tmp_path):
+    result = run_scenario(SPEC, str(tmp_path), repeat=2)
+
+    assert result['spec'] == SPEC._asdict()
+    assert list(result['operations']) == list(OPERATIONS)
+    assert all(metrics['seconds'] > 0 and metrics['peak_rss'] > 0 for metrics in result['operations'].values())
+    assert result['operations']['add']['write_bytes'] > 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_measure(tmp_path):
+    def write_file() -> str:
+        with open(tmp_path / 'data', 'wb') as f:
+            f.write(b'x' * 100_000)
+        return 'done'
+
+    result, measurement = measure(write_file)
+
+    assert result == 'done'
+    assert measurement.seconds > 0
+    assert measurement.write_bytes >= 100_000
+
+
+def test_compare():
+    spec = SPEC._asdict()
+    thresholds = {'seconds': 0.2, 'peak_rss': 0.1}
+
+    assert compare(make_results(spec, 1.0, 100 * 2 ** 20), make_results(spec, 1.1, 105 * 2 ** 20), thresholds) == []
+    assert compare(make_results(spec, 1.0, 100 * 2 ** 20), make_results(spec, 1.5, 200 * 2 ** 20), thresholds) == [
+        ('base', 'add', 'seconds', 1.0, 1.5), ('base', 'add', 'peak_rss', 100 * 2 ** 20, 200 * 2 ** 20)]
+    assert compare(make_results(spec, 0.001, 0), make_results(spec, 0.005, 0), thresholds) == []
+    assert compare(make_results(spec | {'files': 1}, 1.0, 0), make_results(spec, 2.0, 0), thresholds) == []
+
+
+def test_results_round_trip(tmp_path):
+    results = make_results(SPEC._asdict(), 1.0, 1)
+    save_results(results, str(tmp_path / 'results.json'))
+
+    assert load_results(str(tmp_path / 'results.json')) == results
+    save_results(results | {'format': 0}, str(tmp_path / 'old.json'))
+    with pytest.raises(ValueError):
+        load_results(str(tmp_path / 'old.json'))
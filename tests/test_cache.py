@@ -0,0 +1,60 @@
+import kit_vcs.trace as trace
+from kit_vcs.cache import BLOBS, TREES, LRUCache, tree_size
+
+
+def test_cache_get_put():
+    cache = LRUCache(100)
+    cache.put(BLOBS, 'a', b'a' * 10, 10)
+
+    assert cache.get(BLOBS, 'a') == b'a' * 10
+    assert cache.get(TREES, 'a') is None
+    assert cache.get(BLOBS, 'b') is None
+    assert cache.stats() == {BLOBS: (1, 1), TREES: (0, 1)}
+
+
+def test_cache_evicts_least_recently_used():
+    cache = LRUCache(100)
+    for key in 'abc':
+        cache.put(BLOBS, key, key, 40)
+    assert (BLOBS, 'a') not in cache
+
+    cache.get(BLOBS, 'b')
+    cache.put(BLOBS, 'd', 'd', 40)
+
+    assert (BLOBS, 'b') in cache and (BLOBS, 'd') in cache
+    assert (BLOBS, 'c') not in cache
+    assert cache.size == 80
+
+
+def test_cache_replace_and_discard():
+    cache = LRUCache(100)
+    cache.put(BLOBS, 'a', 'old', 30)
+    cache.put(BLOBS, 'a', 'new', 50)
+
+    assert cache.size == 50
+    assert cache.get(BLOBS, 'a') == 'new'
+    cache.discard(BLOBS, 'a')
+    cache.discard(BLOBS, 'missing')
+    assert cache.size == 0 and len(cache) == 0
+
+
+def test_cache_keeps_single_oversized_entry():
+    cache = LRUCache(10)
+    cache.put(BLOBS, 'a', 'a', 5)
+    cache.put(BLOBS, 'big', 'big', 50)
+
+    assert len(cache) == 1
+    assert cache.get(BLOBS, 'big') == 'big'
+
+
+def test_cache_trace_counters():
+    cache = LRUCache(100)
+    cache.put(TREES, 'tree', {}, tree_size({}))
+    trace.tracer.enable()
+    try:
+        cache.get(TREES, 'tree')
+        cache.get(TREES, 'missing')
+    finally:
+        trace.tracer.disable()
+
+    assert trace.tracer.counters == {'cache_trees_hits': 1, 'cache_trees_misses': 1}
@@ -0,0 +1,60 @@
+import lzma
+import os
+import zlib
+
+import pytest
+
+import kit_vcs.codec as codec
+import kit_vcs.errors as errors
+
+
+@pytest.mark.parametrize('codec_name', codec.available_codecs())
+def test_compress_roundtrip(codec_name):
+    data = b'line of text\n' * 1000
+
+    compressed = codec.compress(data, codec_name, codec.DEFAULT_LEVELS[codec_name])
+
+    assert compressed.startswith(codec.header(codec_name))
+    assert codec.decompress(compressed) == data
+
+
+def test_decompress_legacy_lzma():
+    assert codec.decompress(lzma.compress(b'legacy data')) == b'legacy data'
+
+
+def test_decompress_unknown_header():
+    with pytest.raises(errors.UnsupportedCodecError):
+        codec.decompress(b'plain text')
+
+
+def test_compress_incompressible_stored_raw():
+    data = os.urandom(100000)
+
+    compressed = codec.compress(data, 'zlib', 6)
+
+    assert compressed == codec.header('raw') + data
+
+
+def test_is_incompressible():
+    assert codec.is_incompressible(b'\x89PNG\r\n\x1a\n' + b'\x00' * 1000)
+    assert codec.is_incompressible(zlib.compress(os.urandom(10000)))
+    assert not codec.is_incompressible(b'text\n' * 1000)
+    assert not codec.is_incompressible(b'short')
+
+
+def test_parse_compression():
+    assert codec.parse_compression('zlib') == ('zlib', 6)
+    assert codec.parse_compression('lzma:9\n') == ('lzma', 9)
+    assert codec.parse_compression('raw') == ('raw', 0)
+
+
+@pytest.mark.parametrize('value', ['gzip', 'zlib:10', 'zlib:fast'])
+def test_parse_compression_invalid(value):
+    with pytest.raises(errors.UnsupportedCodecError):
+        codec.parse_compression(value)
+
+
+def test_is_compressed_object():
+    assert codec.is_compressed_object(codec.header('zlib') + b'data')
+    assert codec.is_compressed_object(lzma.compress(b'data'))
+    assert not codec.is_compressed_object(b'tree\n')
@@ -0,0 +1,141 @@
+from os import path
+
+import pytest
+
+from kit_vcs.commit_graph import TAIL_SUFFIX, CommitEntry, CommitGraph, parse_commit
+
+ROOT = '00' * 16
+LEFT = 'aa' * 16
+RIGHT = '11' * 16
+MERGE = 'f0' * 16
+TREE = '7e' * 16
+
+
+def make_entry(commit_id: str, parents: list[str], description: str = 'description') -> CommitEntry:
+    return CommitEntry(commit_id, TREE, parents, 0, 0, 'user', '2024-01-01 12:00:00', description)
+
+
+@pytest.fixture
+def graph_path(tmp_path):
+    return str(tmp_path / 'COMMIT_GRAPH')
+
+
+@pytest.fixture
+def graph(graph_path):
+    graph = CommitGraph(graph_path)
+    graph.add(make_entry(ROOT, []))
+    graph.add(make_entry(LEFT, [ROOT]))
+    graph.add(make_entry(RIGHT, [ROOT]))
+    graph.add(make_entry(MERGE, [LEFT, RIGHT], 'merge\nwith details'))
+    yield graph
+    graph.close()
+
+
+def test_commit_graph_add(graph_path, graph: CommitGraph):
+    loaded = CommitGraph(graph_path)
+
+    assert len(loaded) == 4
+    assert loaded.get(MERGE) == CommitEntry(MERGE, TREE, [LEFT, RIGHT], 3, 0, 'user', '2024-01-01 12:00:00',
+                                            'merge\nwith details')
+    assert loaded.get(ROOT).parents == []
+    assert [loaded.get(commit_id).generation for commit_id in (ROOT, LEFT, RIGHT)] == [1, 2, 2]
+    assert loaded.get('ab' * 16) is None
+    assert 'not-a-commit' not in loaded
+    loaded.close()
+
+
+def test_commit_graph_replace_entry(graph: CommitGraph):
+    graph.add(make_entry(RIGHT, [], 'amended'))
+
+    assert len(graph) == 4
+    assert graph.get(RIGHT).parents == []
+    assert graph.get(RIGHT).generation == 1
+    assert graph.get(RIGHT).description == 'amended'
+    assert graph.get(MERGE).parents == [LEFT, RIGHT]
+
+
+def test_commit_graph_add_missing_parent(graph_path):
+    graph = CommitGraph(graph_path)
+
+    with pytest.raises(ValueError):
+        graph.add(make_entry(LEFT, [ROOT]))
+
+
+def test_commit_graph_write(graph_path):
+    graph = CommitGraph(graph_path)
+    graph.write([make_entry(ROOT, []), make_entry(RIGHT, [ROOT]), make_entry(LEFT, ['cd' * 16]),
+                 make_entry(MERGE, [RIGHT])])
+
+    assert len(graph) == 3
+    assert LEFT not in graph
+    assert graph.get(MERGE).generation == 3
+    graph.close()
+
+
+def test_commit_graph_add_appends(graph_path, graph: CommitGraph):
+    size = path.getsize(graph_path + TAIL_SUFFIX)
+
+    graph.add(make_entry('cd' * 16, [MERGE]))
+
+    assert not path.exists(graph_path)
+    assert path.getsize(graph_path + TAIL_SUFFIX) - size < 200
+    assert CommitGraph(graph_path).get('cd' * 16).generation == 4
+
+
+def test_commit_graph_write_merges_tail(graph_path, graph: CommitGraph):
+    graph.write([graph.get(commit_id) for commit_id in (ROOT, LEFT, RIGHT, MERGE)])
+    graph.add(make_entry('cd' * 16, [MERGE]))
+
+    loaded = CommitGraph(graph_path)
+    assert len(loaded) == 5
+    assert loaded.get(MERGE).parents == [LEFT, RIGHT]
+    assert loaded.get('cd' * 16).parents == [MERGE]
+    assert loaded.get('cd' * 16).generation == 4
+    loaded.close()
+
+
+def test_commit_graph_folds_tail(graph_path, graph: CommitGraph, monkeypatch):
+    monkeypatch.setattr('kit_vcs.commit_graph.MIN_TAIL_FOLD_SIZE', 0)
+    graph.write([graph.get(commit_id) for commit_id in (ROOT, LEFT, RIGHT, MERGE)])
+    graph.add(make_entry('cd' * 16, [MERGE]))
+    assert path.exists(graph_path + TAIL_SUFFIX)
+
+    graph.add(make_entry(RIGHT, [ROOT], 'amended'))
+
+    assert not path.exists(graph_path + TAIL_SUFFIX)
+    loaded = CommitGraph(graph_path)
+    assert loaded.tail == {}
+    assert len(loaded) == 5
+    assert loaded.get('cd' * 16).generation == 4
+    assert loaded.get(RIGHT).description == 'amended'
+    loaded.close()
+
+
+def test_commit_graph_corrupted(graph_path, graph: CommitGraph):
+    graph.write([graph.get(commit_id) for commit_id in (ROOT, LEFT, RIGHT, MERGE)])
+    graph.close()
+    with open(graph_path, 'r+b') as f:
+        f.seek(-20, 2)
+        f.write(b'\xff')
+
+    assert CommitGraph(graph_path).get(ROOT) is None
+
+
+def test_commit_graph_truncated_tail(graph_path, graph: CommitGraph):
+    with open(graph_path + TAIL_SUFFIX, 'r+b') as f:
+        f.truncate(path.getsize(graph_path + TAIL_SUFFIX) - 1)
+
+    loaded = CommitGraph(graph_path)
+    assert len(loaded) == 3
+    assert MERGE not in loaded
+    loaded.close()
+
+
+def test_parse_commit():
+    entry = parse_commit(LEFT, f'user\n2024-01-01 12:00:00\ndescription\n{TREE}\n{ROOT}\n{RIGHT}')
+
+    assert entry.parents == [ROOT, RIGHT]
+    assert entry.tree == TREE
+    assert entry.generation == 0
+    assert entry.timestamp > 0
+    assert parse_commit(ROOT, f'user\n2024-01-01\ndescription\n{TREE}\nNone').parents == []
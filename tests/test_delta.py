@@ -0,0 +1,38 @@
+import pytest
+
+from kit_vcs.delta import apply_delta, create_delta, decode_varint, encode_varint
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 300, 2 ** 40])
+def test_varint_roundtrip(value: int):
+    encoded = encode_varint(value)
+    assert decode_varint(encoded + b'tail', 0) == (value, len(encoded))
+
+
+@pytest.mark.parametrize("base, target", [
+    (b'', b''),
+    (b'', b'new file\n'),
+    (b'old file\n', b''),
+    (b'line number one\nline number two\n', b'line number one\nline number two\nline number three\n'),
+    (b'line number one\nline number two\n', b'inserted at start\nline number one\nline number two'),
+    (b'\x00\x01binary\xffdata', b'\x00\x01binary\xfedata'),
+])
+def test_delta_roundtrip(base: bytes, target: bytes):
+    assert apply_delta(base, create_delta(base, target)) == target
+
+
+def test_delta_is_small_for_appended_lines():
+    base = b''.join(f'log entry number {i}\n'.encode() for i in range(10000))
+    target = base + b'one more log entry\n'
+
+    delta = create_delta(base, target)
+
+    assert len(delta) < 64
+    assert apply_delta(base, delta) == target
+
+
+def test_delta_wrong_base():
+    delta = create_delta(b'base content line\n', b'target content line\n')
+
+    with pytest.raises(ValueError):
+        apply_delta(b'other', delta)
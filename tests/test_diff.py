@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from kit_vcs.diff import ALGORITHMS, HISTOGRAM, MYERS, PATIENCE, Hunk, diff, diff_lines, merge3
+
+
+def apply_ops(ops: list) -> (list[str], list[str]):
+    return [line for sign, line in ops if sign != '+'], [line for sign, line in ops if sign != '-']
+
+
+def lcs_length(a: list[str], b: list[str]) -> int:
+    lengths = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a)):
+        for j in range(len(b)):
+            lengths[i + 1][j + 1] = lengths[i][j] + 1 if a[i] == b[j] else max(lengths[i][j + 1], lengths[i + 1][j])
+    return lengths[-1][-1]
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_diff_identical(algorithm):
+    assert diff(['a', 'b'], ['a', 'b'], algorithm) == []
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_diff_hunks(algorithm):
+    a = ['a', 'b', 'c', 'd', 'e']
+    b = ['a', 'x', 'c', 'd', 'e', 'f']
+
+    assert diff(a, b, algorithm) == [Hunk(1, 2, 1, 2), Hunk(5, 5, 5, 6)]
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_diff_lines_order(algorithm):
+    ops = list(diff_lines(['line1', 'line2'], ['line1', 'line3'], algorithm))
+
+    assert ops == [(' ', 'line1'), ('-', 'line2'), ('+', 'line3')]
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_diff_empty_sides(algorithm):
+    assert list(diff_lines([], ['a'], algorithm)) == [('+', 'a')]
+    assert list(diff_lines(['a'], [], algorithm)) == [('-', 'a')]
+    assert diff([], [], algorithm) == []
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_diff_random_roundtrip(algorithm):
+    generator = random.Random(42)
+    for _ in range(300):
+        a = [generator.choice('abcdef') for _ in range(generator.randint(0, 25))]
+        b = [generator.choice('abcdef') for _ in range(generator.randint(0, 25))]
+
+        assert apply_ops(list(diff_lines(a, b, algorithm))) == (a, b)
+
+
+def test_myers_minimal():
+    generator = random.Random(7)
+    for _ in range(300):
+        a = [generator.choice('abcd') for _ in range(generator.randint(0, 25))]
+        b = [generator.choice('abcd') for _ in range(generator.randint(0, 25))]
+
+        ops = list(diff_lines(a, b, MYERS))
+
+        assert sum(1 for sign, _ in ops if sign == ' ') == lcs_length(a, b)
+
+
+@pytest.mark.parametrize('algorithm', [PATIENCE, HISTOGRAM])
+def test_diff_anchors_on_unique_lines(algorithm):
+    a = ['}', '}', 'def unique():', 'x']
+    b = ['def unique():', '}', '}']
+
+    ops = list(diff_lines(a, b, algorithm))
+
+    assert apply_ops(ops) == (a, b)
+    assert (' ', 'def unique():') in ops
+    assert (' ', 'def unique():') not in list(diff_lines(a, b, MYERS))
+
+
+def test_diff_large_file():
+    a = [f'line {i}' for i in range(20000)]
+    b = list(a)
+    b[100] = 'changed'
+    b.insert(15000, 'inserted')
+
+    assert diff(a, b) == [Hunk(100, 101, 100, 101), Hunk(15000, 15000, 15000, 15001)]
+
+
+def test_diff_unknown_algorithm():
+    with pytest.raises(ValueError):
+        diff(['a'], ['b'], 'ndiff')
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_merge3_clean(algorithm):
+    base = ['a', 'b', 'c', 'd', 'e']
+    ours = ['a', 'B', 'c', 'd', 'e']
+    theirs = ['a', 'b', 'c', 'D', 'e', 'f']
+
+    assert merge3(base, ours, theirs, algorithm) == (['a', 'B', 'c', 'D', 'e', 'f'], False)
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_merge3_same_change(algorithm):
+    assert merge3(['a', 'b'], ['a', 'x'], ['a', 'x'], algorithm) == (['a', 'x'], False)
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_merge3_conflict(algorithm):
+    result = merge3(['a', 'b', 'c'], ['a', 'x', 'c'], ['a', 'y', 'c'], algorithm)
+
+    assert result == (['a', '<<<<<<< YOURS', 'x', '=======', 'y', '>>>>>>> THEIRS', 'c'], True)
+
+
+def test_merge3_one_side_unchanged():
+    generator = random.Random(3)
+    for _ in range(200):
+        base = [generator.choice('abcdef') for _ in range(generator.randint(0, 20))]
+        changed = [generator.choice('abcdef') for _ in range(generator.randint(0, 20))]
+
+        assert merge3(base, base, changed) == (changed, False)
+        assert merge3(base, changed, base) == (changed, False)
@@ -1,10 +1,18 @@
+import lzma
 import platform
-from os import sep
+from os import listdir, makedirs, path, remove, rmdir, scandir, utime
 
 import pytest
 from pytest_mock import MockerFixture
 
-from kit_vcs.drive_manager import DriveManager
+import kit_vcs.codec as codec
+import kit_vcs.errors as errors
+import kit_vcs.fsmonitor as fsmonitor
+from kit_vcs.drive_manager import NO_REF, DriveManager
+from kit_vcs.index import IndexEntry
+from kit_vcs.lockfile import LockFile
+from kit_vcs.pack import OBJ_COMMIT
+from kit_vcs.tree import MODE_FILE, MODE_TREE, serialize_tree
 from kit_vcs.utils import Utils
 
 
@@ -17,50 +25,128 @@ def drive_manager(mocker: MockerFixture):
 @pytest.fixture
 def calculate_index_mock(mocker: MockerFixture):
     mock_isdir = mocker.patch('kit_vcs.drive_manager.path.isdir')
-    mock_exists = mocker.patch('kit_vcs.drive_manager.path.exists')
+    mock_prev_hash = mocker.patch('kit_vcs.drive_manager.DriveManager.get_tree_file_hash')
     mock_open_fn = mocker.patch('builtins.open', mocker.mock_open())
     mock_hash = mocker.patch('kit_vcs.utils.Utils.get_file_hash',
                              return_value=mocker.Mock(hexdigest=lambda: 'filehash'))
     mock_walk = mocker.patch('kit_vcs.drive_manager.walk')
-    return mock_isdir, mock_exists, mock_open_fn, mock_hash, mock_walk
+    mocker.patch('kit_vcs.utils.Utils.get_stat_data', return_value=(1, 2, 3, 4, 5))
+    mocker.patch('kit_vcs.drive_manager.DriveManager.hash_and_save_file', return_value='filehash')
+    mocker.patch('kit_vcs.drive_manager.DriveManager.has_object', return_value=True)
+    return mock_isdir, mock_prev_hash, mock_open_fn, mock_hash, mock_walk
 
 
 @pytest.fixture
-def save_tree_mock(mocker: MockerFixture):
-    mock_makedirs = mocker.patch('kit_vcs.drive_manager.makedirs')
-    mock_exists = mocker.patch('kit_vcs.drive_manager.path.exists', return_value=True)
-    mock_copy_tree = mocker.patch('kit_vcs.drive_manager.copy_tree')
-    return mock_makedirs, mock_exists, mock_copy_tree
+def tree_drive_manager(tmp_path):
+    (tmp_path / '.kit' / 'objects').mkdir(parents=True)
+    return DriveManager(workspace_path=str(tmp_path))
 
 
 @pytest.fixture
 def get_files_diff_merge_files_mock(drive_manager: DriveManager, mocker: MockerFixture):
+    mock_read_blob = mocker.patch.object(drive_manager, 'read_blob', return_value=b"line1\nline2\n")
     mock_load_file = mocker.patch.object(drive_manager, 'load_file')
-    mock_read = mocker.patch.object(drive_manager, 'read', return_value="line1\nline2\n")
-    mock_remove = mocker.patch.object(drive_manager, 'remove')
-    return mock_load_file, mock_read, mock_remove, drive_manager
+    return mock_read_blob, mock_load_file, drive_manager
+
+
+def test_save_file(tree_drive_manager: DriveManager):
+    with open(path.join(tree_drive_manager.workspace_path, 'file.txt'), 'wb') as f:
+        f.write(b'test data\n' * 100)
+    tree_drive_manager.compression = ('zlib', 6)
+
+    tree_drive_manager.save_file('file.txt', 'a1b2c3d4e5f6')
+
+    with open(tree_drive_manager.object_path('a1b2c3d4e5f6'), 'rb') as f:
+        data = f.read()
+    assert data.startswith(codec.header('zlib'))
+    assert tree_drive_manager.read_blob('a1b2c3d4e5f6') == b'test data\n' * 100
 
 
-def test_save_file(drive_manager: DriveManager, mocker: MockerFixture):
+def test_save_file_incompressible(tree_drive_manager: DriveManager):
+    content = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 4
+    with open(path.join(tree_drive_manager.workspace_path, 'image.png'), 'wb') as f:
+        f.write(content)
+
+    tree_drive_manager.save_file('image.png', 'a1b2c3d4e5f6')
+
+    with open(tree_drive_manager.object_path('a1b2c3d4e5f6'), 'rb') as f:
+        assert f.read() == codec.header('raw') + content
+
+
+def test_save_file_already_exists(drive_manager: DriveManager, mocker: MockerFixture):
+    mocker.patch('kit_vcs.drive_manager.path.exists', return_value=True)
     mock_open = mocker.patch('builtins.open', mocker.mock_open(read_data=b'test data'))
-    mock_lzma_open = mocker.patch('lzma.open', mocker.mock_open())
 
     drive_manager.save_file(Utils.parse_from_str_to_os_path('local/path'), 'a1b2c3d4e5f6')
 
-    mock_open.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/local/path'), 'rb')
-    mock_lzma_open.assert_called_once_with(
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6'), 'wb')
+    mock_open.assert_not_called()
+
+
+@pytest.mark.parametrize('compressed', [codec.compress(b'test data', 'zlib', 6), codec.compress(b'test data', 'raw', 0),
+                                        lzma.compress(b'test data')])
+def test_load_file(tree_drive_manager: DriveManager, compressed: bytes):
+    object_path = tree_drive_manager.object_path('a1b2c3d4e5f6')
+    makedirs(path.dirname(object_path))
+    with open(object_path, 'wb') as f:
+        f.write(compressed)
+    output_path = path.join(tree_drive_manager.workspace_path, 'output', 'path')
+
+    tree_drive_manager.load_file('a1b2c3d4e5f6', output_path)
+
+    with open(output_path, 'rb') as f:
+        assert f.read() == b'test data'
+
+
+def test_read_blob(tree_drive_manager: DriveManager):
+    object_path = tree_drive_manager.object_path('a1b2c3d4e5f6')
+    makedirs(path.dirname(object_path))
+    with open(object_path, 'wb') as f:
+        f.write(codec.compress(b'line1\r\nline2\n', 'zlib', 6))
+
+    assert tree_drive_manager.read_blob('a1b2c3d4e5f6') == b'line1\r\nline2\n'
+    assert tree_drive_manager.read_blob('a1b2c3d4e5f6', as_memoryview=True)[:5] == b'line1'
+    assert tree_drive_manager.read_blob_lines('a1b2c3d4e5f6') == ['line1', 'line2']
+    assert tree_drive_manager.read_blob('ffffffffffff') is None
+
+
+def test_iter_blob_missing(tree_drive_manager: DriveManager):
+    with pytest.raises(errors.NotFoundError):
+        list(tree_drive_manager.iter_blob('ffffffffffff'))
+
 
+def test_get_compression(tree_drive_manager: DriveManager):
+    assert tree_drive_manager.get_compression() == ('lzma', 6)
 
-def test_load_file(drive_manager: DriveManager, mocker: MockerFixture):
+    with open(path.join(tree_drive_manager.repo_path, 'COMPRESSION'), 'w') as f:
+        f.write('zlib:1')
+
+    assert tree_drive_manager.get_compression() == ('zlib', 1)
+
+
+def test_load_file_from_pack(drive_manager: DriveManager, mocker: MockerFixture):
+    mocker.patch('kit_vcs.drive_manager.path.exists', return_value=False)
     mock_open = mocker.patch('builtins.open', mocker.mock_open())
-    mock_lzma_open = mocker.patch('lzma.open', mocker.mock_open(read_data=b'test data'))
+    mock_get = mocker.patch.object(drive_manager.packs, 'get_content', return_value=b'test data')
 
     drive_manager.load_file('a1b2c3d4e5f6', Utils.parse_from_str_to_os_path('output/path'))
 
-    mock_lzma_open.assert_called_once_with(
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6'), 'rb')
+    mock_get.assert_called_once_with('a1b2c3d4e5f6')
     mock_open.assert_called_once_with(Utils.parse_from_str_to_os_path('output/path'), 'wb')
+    mock_open().write.assert_called_once_with(b'test data')
+
+
+def test_read_commit_from_pack(drive_manager: DriveManager, mocker: MockerFixture):
+    mocker.patch('kit_vcs.drive_manager.path.exists', return_value=False)
+    mocker.patch.object(drive_manager.packs, 'get', return_value=b'user\ndate\ndescription\ntree\nNone')
+
+    assert drive_manager.read_commit('a1b2c3d4e5f6') == 'user\ndate\ndescription\ntree\nNone'
+
+
+def test_has_object(drive_manager: DriveManager, mocker: MockerFixture):
+    mocker.patch('kit_vcs.drive_manager.path.exists', return_value=False)
+    mocker.patch.object(drive_manager.packs, 'locate', return_value=None)
+
+    assert drive_manager.has_object('a1b2c3d4e5f6') is False
 
 
 def test_write(drive_manager: DriveManager, mocker: MockerFixture):
@@ -82,12 +168,14 @@ def test_read(drive_manager: DriveManager, mocker: MockerFixture):
 
 
 def test_write_commit_data(drive_manager: DriveManager, mocker: MockerFixture):
-    mock_open = mocker.patch('builtins.open', mocker.mock_open())
+    mocker.patch('kit_vcs.drive_manager.makedirs')
+    mock_atomic_write = mocker.patch('kit_vcs.drive_manager.atomic_write')
 
     drive_manager.write_commit_data('a1b2c3d4e5f6', 'username', '2024-01-01', 'description', 'tree', 'parent')
 
-    mock_open.assert_called_with(Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6'), 'w')
-    mock_open().write.assert_called_once_with('username\n2024-01-01\ndescription\ntree\nparent')
+    mock_atomic_write.assert_called_once_with(
+        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6'),
+        'commit\nusername\n2024-01-01\ndescription\ntree\nparent')
 
 
 def test_initialize_directories(drive_manager: DriveManager, mocker: MockerFixture):
@@ -112,13 +200,12 @@ def test_initialize_directories(drive_manager: DriveManager, mocker: MockerFixtu
 
 
 def test_get_index_hashes(drive_manager: DriveManager, mocker: MockerFixture):
-    mocker.patch('kit_vcs.drive_manager.path.exists', return_value=True)
-    mock_open = mocker.patch('builtins.open', mocker.mock_open(read_data='filepath,filehash,+\n'))
+    mocker.patch.object(drive_manager.index, 'staged', return_value={'added': IndexEntry('hash1', '+', None),
+                                                                     'removed': IndexEntry('hash2', '-', None)})
 
     result = drive_manager.get_index_hashes()
 
-    mock_open.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/.kit/INDEX'), 'r')
-    assert result == {'filepath': ('filehash', True)}
+    assert result == {'added': ('hash1', True), 'removed': ('hash2', False)}
 
 
 def test_get_head_success(drive_manager: DriveManager, mocker: MockerFixture):
@@ -151,6 +238,32 @@ def test_get_seed_no_path(drive_manager: DriveManager, mocker: MockerFixture):
     assert drive_manager.get_seed() is None
 
 
+def test_get_hash_mode(drive_manager: DriveManager, mocker: MockerFixture):
+    mocker.patch('kit_vcs.drive_manager.path.exists', return_value=True)
+    mock_open = mocker.patch('builtins.open', mocker.mock_open(read_data='content\n'))
+
+    result = drive_manager.get_hash_mode()
+
+    mock_open.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/.kit/HASHING'), 'r')
+    assert result == 'content'
+
+
+def test_get_hash_mode_no_path(drive_manager: DriveManager, mocker: MockerFixture):
+    mocker.patch('kit_vcs.drive_manager.path.exists', return_value=False)
+    assert drive_manager.get_hash_mode() == 'path'
+
+
+def test_get_file_hash_content_mode(drive_manager: DriveManager, mocker: MockerFixture):
+    mock_content_hash = mocker.patch('kit_vcs.utils.Utils.get_content_hash',
+                                     return_value=mocker.Mock(hexdigest=lambda: 'contenthash'))
+    mock_file_hash = mocker.patch('kit_vcs.utils.Utils.get_file_hash')
+    drive_manager.hash_mode = 'content'
+
+    assert drive_manager.get_file_hash('file', 42) == 'contenthash'
+    mock_content_hash.assert_called_once_with('file', 42)
+    mock_file_hash.assert_not_called()
+
+
 def test_get_last_commit_id_success(drive_manager: DriveManager, mocker: MockerFixture):
     mocker.patch('kit_vcs.drive_manager.path.exists', return_value=False)
     mocker.patch('builtins.open', mocker.mock_open(read_data='branch_path'))
@@ -234,57 +347,64 @@ def test_delete_if_empty_not_exist(drive_manager: DriveManager, mocker: MockerFi
     mock_exist.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/local/path/dir'))
 
 
-def test_get_files_in_dir(drive_manager: DriveManager, mocker: MockerFixture):
-    mock_walk = mocker.patch('kit_vcs.drive_manager.walk',
-                             return_value=[(Utils.parse_from_str_to_os_path('/fake/workspace/local_path'), [],
-                                            ['file1', 'file2'])])
-
-    result = list(drive_manager.get_files_in_dir('local_path'))
-
-    mock_walk.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/local_path'))
-    assert result == ['file1', 'file2']
-
-
 def test_remove(drive_manager: DriveManager, mocker: MockerFixture):
     mock_remove = mocker.patch('kit_vcs.drive_manager.remove')
     drive_manager.remove(Utils.parse_from_str_to_os_path('local/path'))
     mock_remove.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/local/path'))
 
 
-def test_save_tree_add(drive_manager: DriveManager, save_tree_mock: (MockerFixture, MockerFixture, MockerFixture),
-                       mocker: MockerFixture):
-    mock_makedirs, mock_exists, mock_copy_tree = save_tree_mock
-    mock_open = mocker.patch('builtins.open', mocker.mock_open())
+def test_save_tree_add(tree_drive_manager: DriveManager):
+    tree_drive_manager.index_hashes = {Utils.parse_from_str_to_os_path('folder/file'): ('filehash', True),
+                                       'root_file': ('roothash', True)}
 
-    drive_manager.index_hashes = {'filepath/file': ('filehash', True)}
-    drive_manager.save_tree('a1b2c3d4e5f6', 'p1e2v3h4a5s6')
+    tree_hash = tree_drive_manager.save_tree(None, 42)
 
-    mock_makedirs.assert_called_with(
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6/filepath'), exist_ok=True)
-    mock_exists.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/p1/e2v3h4a5s6'))
-    mock_copy_tree.assert_called_once_with(
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/p1/e2v3h4a5s6'),
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6'))
-    mock_open.assert_called_once_with(
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6/filepath/file'), 'w')
+    root = tree_drive_manager.read_tree(tree_hash)
+    assert root['root_file'] == (MODE_FILE, 'roothash')
+    assert root['folder'][0] == MODE_TREE
+    assert tree_drive_manager.read_tree(root['folder'][1]) == {'file': (MODE_FILE, 'filehash')}
 
 
-def test_save_tree_remove(drive_manager: DriveManager, save_tree_mock: (MockerFixture, MockerFixture, MockerFixture),
-                          mocker: MockerFixture):
-    mock_makedirs, mock_exists, mock_copy_tree = save_tree_mock
-    mock_remove = mocker.patch('kit_vcs.drive_manager.remove')
+def test_save_tree_remove(tree_drive_manager: DriveManager):
+    tree_drive_manager.index_hashes = {Utils.parse_from_str_to_os_path('folder/file'): ('filehash', True),
+                                       'root_file': ('roothash', True)}
+    prev_tree_hash = tree_drive_manager.save_tree(None, 42)
+
+    tree_drive_manager.index_hashes = {Utils.parse_from_str_to_os_path('folder/file'): ('filehash', False)}
+    tree_hash = tree_drive_manager.save_tree(prev_tree_hash, 42)
+
+    assert tree_drive_manager.read_tree(tree_hash) == {'root_file': (MODE_FILE, 'roothash')}
+
+
+def test_save_tree_shares_unchanged_subtrees(tree_drive_manager: DriveManager):
+    tree_drive_manager.index_hashes = {Utils.parse_from_str_to_os_path('first/file'): ('hash1', True),
+                                       Utils.parse_from_str_to_os_path('second/file'): ('hash2', True)}
+    prev_tree_hash = tree_drive_manager.save_tree(None, 42)
+
+    tree_drive_manager.index_hashes = {Utils.parse_from_str_to_os_path('second/file'): ('hash3', True)}
+    tree_hash = tree_drive_manager.save_tree(prev_tree_hash, 42)
+
+    prev_root = tree_drive_manager.read_tree(prev_tree_hash)
+    root = tree_drive_manager.read_tree(tree_hash)
+    assert root['first'] == prev_root['first'] and root['second'] != prev_root['second']
+
+
+def test_save_tree_empty(tree_drive_manager: DriveManager):
+    tree_hash = tree_drive_manager.save_tree(None, 42)
 
-    drive_manager.index_hashes = {'filepath/file': ('filehash', False)}
-    drive_manager.save_tree('a1b2c3d4e5f6', 'p1e2v3h4a5s6')
+    assert tree_drive_manager.read_tree(tree_hash) == {}
 
-    mock_makedirs.assert_called_with(
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6/filepath'), exist_ok=True)
-    mock_exists.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/p1/e2v3h4a5s6'))
-    mock_copy_tree.assert_called_once_with(
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/p1/e2v3h4a5s6'),
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6'))
-    mock_remove.assert_called_once_with(
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6/filepath/file'))
+
+def test_get_tree_file_hash(tree_drive_manager: DriveManager):
+    tree_drive_manager.index_hashes = {Utils.parse_from_str_to_os_path('folder/file'): ('filehash', True)}
+    tree_hash = tree_drive_manager.save_tree(None, 42)
+
+    file_path = Utils.parse_from_str_to_os_path('folder/file')
+
+    assert tree_drive_manager.get_tree_file_hash(tree_hash, file_path) == 'filehash'
+    assert tree_drive_manager.get_tree_file_hash(tree_hash, 'folder') is None
+    assert tree_drive_manager.get_tree_file_hash(tree_hash, Utils.parse_from_str_to_os_path('other/file')) is None
+    assert tree_drive_manager.get_tree_file_hash(None, 'folder') is None
 
 
 def test_save_files_from_index(drive_manager: DriveManager, mocker: MockerFixture):
@@ -296,19 +416,91 @@ def test_save_files_from_index(drive_manager: DriveManager, mocker: MockerFixtur
     mock_save_file.assert_called_once_with('filepath', 'filehash')
 
 
+def test_save_files_from_index_deduplicates(drive_manager: DriveManager, mocker: MockerFixture):
+    mock_save_file = mocker.patch.object(drive_manager, 'save_file')
+
+    drive_manager.jobs = 4
+    drive_manager.index_hashes = {'a': ('hash1', True), 'b': ('hash1', True), 'c': ('hash2', True),
+                                  'd': ('hash3', False)}
+    drive_manager.save_files_from_index()
+
+    assert sorted(mock_save_file.call_args_list) == [mocker.call('a', 'hash1'), mocker.call('c', 'hash2')]
+
+
+def test_calculate_index_data_directory(tree_drive_manager: DriveManager):
+    for name in ('b.txt', 'a/c.txt', 'a/d/e.txt', '.hidden/f.txt'):
+        file_path = tree_drive_manager.workspace_path + '/' + name
+        makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(name)
+
+    tree_drive_manager.jobs = 4
+    tree_drive_manager.calculate_index_data('.', None, 42)
+
+    assert list(tree_drive_manager.index_hashes) == sorted([Utils.parse_from_str_to_os_path('a/c.txt'),
+                                                            Utils.parse_from_str_to_os_path('a/d/e.txt'), 'b.txt'])
+    assert tree_drive_manager.index_hashes['b.txt'][0] == tree_drive_manager.get_file_hash(
+        path.join(tree_drive_manager.workspace_path, 'b.txt'), 42)
+
+
+@pytest.mark.parametrize('hash_mode', ['content', 'path'])
+def test_calculate_index_data_saves_objects(tree_drive_manager: DriveManager, mocker: MockerFixture, hash_mode: str):
+    file_path = path.join(tree_drive_manager.workspace_path, 'file.txt')
+    with open(file_path, 'w') as f:
+        f.write('staged content\n')
+    tree_drive_manager.hash_mode = hash_mode
+    tree_drive_manager.compression = ('zlib', 6)
+
+    tree_drive_manager.calculate_index_data('file.txt', None, 42)
+    with open(file_path, 'w') as f:
+        f.write('changed after add\n')
+    mock_write_blob = mocker.spy(tree_drive_manager, 'write_blob')
+    tree_drive_manager.save_files_from_index()
+
+    file_hash = tree_drive_manager.index_hashes['file.txt'][0]
+    assert tree_drive_manager.read_blob(file_hash) == b'staged content\n'
+    mock_write_blob.assert_not_called()
+    assert [name for name in listdir(path.join(tree_drive_manager.repo_path, 'objects')) if len(name) != 2] == []
+
+
+def test_hash_and_save_file_existing_object(tree_drive_manager: DriveManager):
+    with open(path.join(tree_drive_manager.workspace_path, 'file.txt'), 'w') as f:
+        f.write('content')
+    file_hash = tree_drive_manager.hash_and_save_file('file.txt', 42)
+    object_stat = Utils.get_stat_data(tree_drive_manager.object_path(file_hash))
+
+    assert tree_drive_manager.hash_and_save_file('file.txt', 42) == file_hash
+    assert file_hash == tree_drive_manager.get_file_hash(path.join(tree_drive_manager.workspace_path, 'file.txt'), 42)
+    assert Utils.get_stat_data(tree_drive_manager.object_path(file_hash)) == object_stat
+
+
+def test_blob_with_tree_content(tree_drive_manager: DriveManager):
+    tree_drive_manager.hash_mode = 'content'
+    tree_hash = tree_drive_manager.write_tree({}, 42)
+    with open(path.join(tree_drive_manager.workspace_path, 'file.txt'), 'w') as f:
+        f.write(serialize_tree({}))
+
+    tree_drive_manager.calculate_index_data('file.txt', None, 42)
+
+    file_hash = tree_drive_manager.index_hashes['file.txt'][0]
+    assert file_hash != tree_hash
+    assert tree_drive_manager.read_blob(file_hash) == serialize_tree({}).encode()
+    assert tree_drive_manager.read_tree(tree_hash) == {}
+
+
 def test_calculate_index_data_file_not_in_prev_tree(drive_manager: DriveManager,
                                                     calculate_index_mock: (
                                                             MockerFixture, MockerFixture, MockerFixture, MockerFixture,
                                                             MockerFixture)):
-    mock_isdir, mock_exists, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
+    mock_isdir, mock_prev_hash, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
     mock_isdir.return_value = False
-    mock_exists.return_value = False
+    mock_prev_hash.return_value = None
 
     filepath = Utils.parse_from_str_to_os_path('local/path')
     drive_manager.calculate_index_data(filepath, 'p1e2v3h4a5s6', 42)
 
-    mock_hash.assert_called_once_with(Utils.parse_from_str_to_os_path('fake/workspace/local/path'),
-                                      drive_manager.workspace_path, 42)
+    mock_hash.assert_not_called()
+    drive_manager.hash_and_save_file.assert_called_once_with(filepath, 42)
     assert drive_manager.index_hashes == {filepath: ('filehash', True)}
 
 
@@ -324,16 +516,15 @@ def test_calculate_index_data_file_differs_in_prev_tree(drive_manager: DriveMana
                                                         calculate_index_mock: (
                                                                 MockerFixture, MockerFixture, MockerFixture,
                                                                 MockerFixture, MockerFixture)):
-    mock_isdir, mock_exists, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
+    mock_isdir, mock_prev_hash, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
     mock_isdir.return_value = False
-    mock_exists.side_effect = [True, False]
-    mock_open_fn.return_value.read.return_value = 'different_hash'
+    mock_prev_hash.return_value = 'different_hash'
 
     filepath = Utils.parse_from_str_to_os_path('local/path')
     drive_manager.calculate_index_data(filepath, 'p1e2v3h4a5s6', 42)
 
-    mock_hash.assert_called_once_with(Utils.parse_from_str_to_os_path('fake/workspace/local/path'),
-                                      drive_manager.workspace_path, 42)
+    mock_hash.assert_not_called()
+    drive_manager.hash_and_save_file.assert_called_once_with(filepath, 42)
     assert drive_manager.index_hashes == {filepath: ('filehash', True)}
 
 
@@ -341,16 +532,15 @@ def test_calculate_index_data_file_same_in_prev_tree(drive_manager: DriveManager
                                                      calculate_index_mock: (
                                                              MockerFixture, MockerFixture, MockerFixture,
                                                              MockerFixture, MockerFixture)):
-    mock_isdir, mock_exists, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
+    mock_isdir, mock_prev_hash, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
     mock_isdir.return_value = False
-    mock_exists.side_effect = [True, True]
-    mock_open_fn.return_value.read.return_value = 'filehash'
+    mock_prev_hash.return_value = 'filehash'
 
     filepath = Utils.parse_from_str_to_os_path('local/path')
     drive_manager.calculate_index_data(filepath, 'p1e2v3h4a5s6', 42)
 
-    mock_hash.assert_called_once_with(Utils.parse_from_str_to_os_path('fake/workspace/local/path'),
-                                      drive_manager.workspace_path, 42)
+    mock_hash.assert_not_called()
+    drive_manager.hash_and_save_file.assert_called_once_with(filepath, 42)
     assert drive_manager.index_hashes == {}
 
 
@@ -358,10 +548,9 @@ def test_calculate_index_data_remove_file(drive_manager: DriveManager,
                                           calculate_index_mock: (
                                                   MockerFixture, MockerFixture, MockerFixture,
                                                   MockerFixture, MockerFixture)):
-    mock_isdir, mock_exists, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
+    mock_isdir, mock_prev_hash, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
     mock_isdir.return_value = False
-    mock_exists.side_effect = [True, True]
-    mock_open_fn.return_value.read.return_value = 'filehash'
+    mock_prev_hash.return_value = 'filehash'
 
     filepath = Utils.parse_from_str_to_os_path('local/path')
     drive_manager.index_hashes[filepath] = ('filehash', True)
@@ -376,9 +565,9 @@ def test_calculate_index_data_remove_nonexistent_file(drive_manager: DriveManage
                                                       calculate_index_mock: (
                                                               MockerFixture, MockerFixture, MockerFixture,
                                                               MockerFixture, MockerFixture)):
-    mock_isdir, mock_exists, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
+    mock_isdir, mock_prev_hash, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
     mock_isdir.return_value = False
-    mock_exists.return_value = False
+    mock_prev_hash.return_value = None
 
     filepath = Utils.parse_from_str_to_os_path('local/path')
     drive_manager.index_hashes[filepath] = ('filehash', True)
@@ -391,28 +580,62 @@ def test_calculate_index_data_same_as_prev_but_dif_in_index(drive_manager: Drive
                                                             calculate_index_mock: (
                                                                     MockerFixture, MockerFixture, MockerFixture,
                                                                     MockerFixture, MockerFixture)):
-    mock_isdir, mock_exists, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
+    mock_isdir, mock_prev_hash, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
     mock_isdir.return_value = False
-    mock_exists.side_effect = [True, True]
-    mock_open_fn.return_value.read.return_value = 'filehash'
+    mock_prev_hash.return_value = 'filehash'
 
     filepath = Utils.parse_from_str_to_os_path('local/path')
     drive_manager.index_hashes[filepath] = ('dif_filehash', True)
     drive_manager.calculate_index_data(filepath, 'p1e2v3h4a5s6', 42, is_add=True)
 
-    mock_hash.assert_called_once_with(Utils.parse_from_str_to_os_path('fake/workspace/local/path'),
-                                      drive_manager.workspace_path, 42)
+    mock_hash.assert_not_called()
+    drive_manager.hash_and_save_file.assert_called_once_with(filepath, 42)
     assert filepath not in drive_manager.index_hashes
 
 
+def test_calculate_index_data_stat_cache_hit(drive_manager: DriveManager,
+                                             calculate_index_mock: (
+                                                     MockerFixture, MockerFixture, MockerFixture,
+                                                     MockerFixture, MockerFixture)):
+    mock_isdir, mock_prev_hash, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
+    mock_isdir.return_value = False
+    mock_prev_hash.return_value = None
+
+    filepath = Utils.parse_from_str_to_os_path('local/path')
+    drive_manager.index.put(filepath, 'cachedhash', '=', (1, 2, 3, 4, 5))
+    drive_manager.calculate_index_data(filepath, 'p1e2v3h4a5s6', 42)
+
+    mock_hash.assert_not_called()
+    assert drive_manager.index_hashes == {filepath: ('cachedhash', True)}
+
+
+def test_calculate_index_data_stat_changed(drive_manager: DriveManager,
+                                           calculate_index_mock: (
+                                                   MockerFixture, MockerFixture, MockerFixture,
+                                                   MockerFixture, MockerFixture)):
+    mock_isdir, mock_prev_hash, mock_open_fn, mock_hash, mock_walk = calculate_index_mock
+    mock_isdir.return_value = False
+    mock_prev_hash.return_value = None
+
+    filepath = Utils.parse_from_str_to_os_path('local/path')
+    drive_manager.index.put(filepath, 'cachedhash', '=', (1, 2, 4, 4, 5))
+    drive_manager.calculate_index_data(filepath, 'p1e2v3h4a5s6', 42)
+
+    drive_manager.hash_and_save_file.assert_called_once()
+    assert drive_manager.index.get(filepath) == IndexEntry('filehash', '=', (1, 2, 3, 4, 5))
+
+
 def test_write_index_data(drive_manager: DriveManager, mocker: MockerFixture):
-    mock_open = mocker.patch('builtins.open', mocker.mock_open())
+    mock_write = mocker.patch.object(drive_manager.index, 'write')
+    drive_manager.index.put('unstaged', 'hash2', '+', (1, 2, 3, 4, 5))
+    drive_manager.index.put('filepath', 'filehash', '=', (6, 7, 8, 9, 10))
 
     drive_manager.index_hashes = {'filepath': ('filehash', True)}
     drive_manager.write_index_data()
 
-    mock_open.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/.kit/INDEX'), 'w')
-    mock_open().write.assert_called_once_with('filepath,filehash,+\n')
+    mock_write.assert_called_once()
+    assert drive_manager.index.get('filepath') == IndexEntry('filehash', '+', (6, 7, 8, 9, 10))
+    assert drive_manager.index.get('unstaged') == IndexEntry('hash2', '=', (1, 2, 3, 4, 5))
 
 
 def test_rm_index_files(drive_manager: DriveManager, mocker: MockerFixture):
@@ -427,146 +650,634 @@ def test_rm_index_files(drive_manager: DriveManager, mocker: MockerFixture):
     mock_remove.assert_called_once_with(filepath)
 
 
-def test_load_tree_files_success(drive_manager: DriveManager, mocker: MockerFixture):
-    mocker.patch('kit_vcs.drive_manager.walk', return_value=[
-        (Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6'), [], ['file'])])
-    mocker.patch('kit_vcs.drive_manager.makedirs')
-    mock_open = mocker.patch('builtins.open', mocker.mock_open(read_data='filehash'))
+def test_checkout_tree_loads_changed_files(drive_manager: DriveManager, mocker: MockerFixture):
+    mocker.patch.object(drive_manager, 'compare_trees', return_value=({'added'}, set(), {'changed'}))
+    mocker.patch.object(drive_manager, 'get_tree_file_hash', side_effect=lambda _, rel_path: rel_path + '_hash')
+    mocker.patch.object(drive_manager, 'is_file_up_to_date', side_effect=lambda rel_path, _: rel_path == 'changed')
+    mocker.patch('kit_vcs.utils.Utils.get_stat_data', return_value=(1, 2, 3, 4, 5))
     mock_load_file = mocker.patch.object(drive_manager, 'load_file')
 
-    drive_manager.load_tree_files('a1b2c3d4e5f6')
-
-    mock_open.assert_called_once_with(
-        Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6/file'), 'r')
-    mock_load_file.assert_called_once_with('filehash', Utils.parse_from_str_to_os_path(
-        'fake/workspace/./file'))
-
+    drive_manager.checkout_tree('old_tree', 'new_tree')
 
-def test_load_tree_files_no_tree_hash(drive_manager: DriveManager, mocker: MockerFixture):
-    drive_manager.load_tree_files('')
-    mock_walk = mocker.patch('kit_vcs.drive_manager.walk', return_value=[])
-    mock_walk.assert_not_called()
+    mock_load_file.assert_called_once_with('added_hash', Utils.parse_from_str_to_os_path('/fake/workspace/added'))
+    assert drive_manager.index.get('added') == IndexEntry('added_hash', '=', (1, 2, 3, 4, 5))
 
 
-def test_delete_tree_files_success(drive_manager: DriveManager, mocker: MockerFixture):
-    mocker.patch('kit_vcs.drive_manager.walk',
-                 return_value=[(Utils.parse_from_str_to_os_path('/fake/workspace/.kit/objects/a1/b2c3d4e5f6'), ['dir'],
-                                ['file'])])
+def test_checkout_tree_removes_files(drive_manager: DriveManager, mocker: MockerFixture):
+    removed_file = Utils.parse_from_str_to_os_path('dir/file')
+    mocker.patch.object(drive_manager, 'compare_trees', return_value=(set(), {removed_file}, set()))
+    mocker.patch.object(drive_manager, 'get_tree_file_hash', return_value=None)
     mocker.patch('kit_vcs.drive_manager.path.exists', return_value=True)
     mock_remove = mocker.patch('kit_vcs.drive_manager.remove')
-    mock_rmdir = mocker.patch('kit_vcs.drive_manager.rmdir')
-
-    drive_manager.delete_tree_files('a1b2c3d4e5f6')
-
-    mock_remove.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/file'))
-    mock_rmdir.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/dir'))
-
+    mock_load_file = mocker.patch.object(drive_manager, 'load_file')
+    mock_delete_if_empty = mocker.patch.object(drive_manager, 'delete_if_empty')
 
-def test_delete_tree_files_no_tree_hash(drive_manager: DriveManager, mocker: MockerFixture):
-    drive_manager.delete_tree_files('')
-    mock_walk = mocker.patch('kit_vcs.drive_manager.walk', return_value=[])
-    mock_walk.assert_not_called()
+    drive_manager.checkout_tree('old_tree', 'new_tree')
 
+    mock_remove.assert_called_once_with(Utils.parse_from_str_to_os_path('/fake/workspace/dir/file'))
+    mock_delete_if_empty.assert_called_once_with('dir')
+    mock_load_file.assert_not_called()
 
-def test_commit_to_tree_path(drive_manager: DriveManager, mocker: MockerFixture):
-    fullpath = Utils.parse_from_str_to_os_path("/fake/path/to/tree")
 
-    mocker.patch("kit_vcs.drive_manager.path.abspath", return_value=fullpath)
-    mocker.patch.object(drive_manager, "get_commit_tree_hash", return_value="1234567890abcdef")
+def test_checkout_tree_same_tree(drive_manager: DriveManager, mocker: MockerFixture):
+    mock_load_file = mocker.patch.object(drive_manager, 'load_file')
+    mock_remove = mocker.patch('kit_vcs.drive_manager.remove')
 
-    assert drive_manager.commit_to_tree_path("1234567890abcdef") == fullpath
+    drive_manager.checkout_tree('a1b2c3d4e5f6', 'a1b2c3d4e5f6')
+
+    mock_load_file.assert_not_called()
+    mock_remove.assert_not_called()
+
+
+def test_checkout_tree_keeps_unchanged_files(tree_drive_manager: DriveManager):
+    workspace = tree_drive_manager.workspace_path
+    for name, content in (('same.txt', 'same'), ('changed.txt', 'old')):
+        with open(path.join(workspace, name), 'w') as f:
+            f.write(content)
+    tree_drive_manager.calculate_index_data('.', None, 42)
+    old_tree = tree_drive_manager.save_tree(None, 42)
+    tree_drive_manager.save_files_from_index()
+
+    with open(path.join(workspace, 'changed.txt'), 'w') as f:
+        f.write('new')
+    tree_drive_manager.index_hashes.clear()
+    tree_drive_manager.calculate_index_data('changed.txt', old_tree, 42)
+    new_tree = tree_drive_manager.save_tree(old_tree, 42)
+    tree_drive_manager.save_files_from_index()
+    same_stat = Utils.get_stat_data(path.join(workspace, 'same.txt'))
+
+    tree_drive_manager.checkout_tree(new_tree, old_tree)
+
+    with open(path.join(workspace, 'changed.txt')) as f:
+        assert f.read() == 'old'
+    assert Utils.get_stat_data(path.join(workspace, 'same.txt')) == same_stat
+
+
+def test_index_update_writes_once(tree_drive_manager: DriveManager, mocker: MockerFixture):
+    workspace = tree_drive_manager.workspace_path
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        with open(path.join(workspace, name), 'w') as f:
+            f.write(name)
+    tree_drive_manager.calculate_index_data('.', None, 42)
+    tree = tree_drive_manager.save_tree(None, 42)
+    tree_drive_manager.index_hashes.clear()
+    with open(path.join(workspace, 'd.txt'), 'w') as f:
+        f.write('d')
+    mock_write = mocker.spy(tree_drive_manager.index, 'write')
+    mock_run_jobs = mocker.spy(Utils, 'run_jobs')
+
+    tree_drive_manager.begin_index_update()
+    tree_drive_manager.stage_index_path('a.txt', False)
+    tree_drive_manager.stage_index_path('b.txt')
+    tree_drive_manager.stage_index_path('d.txt')
+    tree_drive_manager.commit_index_update(tree, 42)
+
+    assert set(tree_drive_manager.index_hashes) == {'a.txt', 'd.txt'}
+    assert tree_drive_manager.index_hashes['a.txt'][1] is False
+    assert tree_drive_manager.pending_index_paths == {}
+    mock_write.assert_called_once()
+    mock_run_jobs.assert_called_once()
+
+
+def test_scan_workspace(tree_drive_manager: DriveManager):
+    for name in ('a.txt', 'src/b.txt', '.hidden/c.txt', '.env'):
+        file_path = path.join(tree_drive_manager.workspace_path, name)
+        makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(name)
+
+    files = tree_drive_manager.scan_workspace()
+
+    assert sorted(files) == ['.env', 'a.txt', path.join('src', 'b.txt')]
+    assert files['a.txt'] == Utils.get_stat_data(path.join(tree_drive_manager.workspace_path, 'a.txt'))
+
+
+def test_scan_workspace_with_fsmonitor(tree_drive_manager: DriveManager, mocker: MockerFixture):
+    workspace = tree_drive_manager.workspace_path
+    for name in ('a.txt', 'b.txt', 'src/c.txt', 'src/d.txt'):
+        file_path = path.join(workspace, name)
+        makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(name)
+    with open(path.join(tree_drive_manager.repo_path, fsmonitor.MONITOR_FILE), 'w') as f:
+        f.write('12345 key\n')
+    mock_query = mocker.patch('kit_vcs.drive_manager.fsmonitor.query', return_value=('epoch:1', None))
+
+    assert sorted(tree_drive_manager.scan_workspace()) == ['a.txt', 'b.txt', path.join('src', 'c.txt'),
+                                                           path.join('src', 'd.txt')]
+
+    remove(path.join(workspace, 'b.txt'))
+    remove(path.join(workspace, 'src', 'c.txt'))
+    remove(path.join(workspace, 'src', 'd.txt'))
+    rmdir(path.join(workspace, 'src'))
+    with open(path.join(workspace, 'a.txt'), 'w') as f:
+        f.write('changed content')
+    mock_query.return_value = ('epoch:4', ['a.txt', 'b.txt', 'src'])
+    mock_walk = mocker.patch.object(tree_drive_manager, 'walk_workspace')
+
+    files = tree_drive_manager.scan_workspace()
+
+    assert files == {'a.txt': Utils.get_stat_data(path.join(workspace, 'a.txt'))}
+    mock_query.assert_called_with(tree_drive_manager.repo_path, 'epoch:1')
+    mock_walk.assert_not_called()
+    assert fsmonitor.read_state(tree_drive_manager.repo_path) == ('epoch:4', files)
+
+
+def test_scan_workspace_fsmonitor_missing(tree_drive_manager: DriveManager, mocker: MockerFixture):
+    with open(path.join(tree_drive_manager.workspace_path, 'a.txt'), 'w') as f:
+        f.write('a')
+    with open(path.join(tree_drive_manager.repo_path, fsmonitor.MONITOR_FILE), 'w') as f:
+        f.write('12345 key\n')
+    fsmonitor.write_state(tree_drive_manager.repo_path, 'epoch:1', {'stale.txt': (1, 2, 3, 4, 5)})
+    mocker.patch('kit_vcs.drive_manager.fsmonitor.query', return_value=None)
+
+    assert list(tree_drive_manager.scan_workspace()) == ['a.txt']
+
+
+def test_walk_workspace_prunes_ignored(tree_drive_manager: DriveManager, mocker: MockerFixture):
+    workspace = tree_drive_manager.workspace_path
+    for name, content in (('.kitignore', 'node_modules/\n*.log\n'), ('a.txt', 'a'), ('debug.log', 'log'),
+                          ('node_modules/pkg/index.js', 'js'), ('src/.kitignore', '!keep.log\n'),
+                          ('src/keep.log', 'keep')):
+        file_path = path.join(workspace, name)
+        makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(content)
+    mock_scandir = mocker.patch('kit_vcs.drive_manager.scandir', wraps=scandir)
+
+    assert tree_drive_manager.get_workspace_files(workspace) == ['.kitignore', 'a.txt',
+                                                                 path.join('src', '.kitignore'),
+                                                                 path.join('src', 'keep.log')]
+    assert path.join(workspace, 'node_modules') not in [call.args[0] for call in mock_scandir.call_args_list]
+    assert tree_drive_manager.get_workspace_files(path.join(workspace, 'node_modules')) == [
+        path.join('node_modules', 'pkg', 'index.js')]
+
+
+def test_get_workspace_status(tree_drive_manager: DriveManager, mocker: MockerFixture):
+    workspace = tree_drive_manager.workspace_path
+    for name in ('same.txt', 'changed.txt', 'deleted.txt', 'touched.txt'):
+        with open(path.join(workspace, name), 'w') as f:
+            f.write(name)
+        utime(path.join(workspace, name), (1, 1))
+    tree_drive_manager.calculate_index_data('.', None, 42)
+    tree = tree_drive_manager.save_tree(None, 42)
+    tree_drive_manager.index_hashes.clear()
+    tree_drive_manager.write_index_data()
+
+    with open(path.join(workspace, 'changed.txt'), 'w') as f:
+        f.write('new content')
+    with open(path.join(workspace, 'touched.txt'), 'w') as f:
+        f.write('touched.txt')
+    utime(path.join(workspace, 'touched.txt'), (2, 2))
+    remove(path.join(workspace, 'deleted.txt'))
+    with open(path.join(workspace, 'new.txt'), 'w') as f:
+        f.write('new')
+    mock_hash = mocker.spy(tree_drive_manager, 'get_file_hash')
+
+    assert tree_drive_manager.get_workspace_status(tree, 42) == (['changed.txt'], ['deleted.txt'], ['new.txt'])
+    assert sorted(call.args[0] for call in mock_hash.call_args_list) == [path.join(workspace, 'changed.txt'),
+                                                                         path.join(workspace, 'touched.txt')]
+    assert tree_drive_manager.index.get('touched.txt').stat is not None
+
+
+def test_calculate_index_data_single_index_pass(tree_drive_manager: DriveManager, mocker: MockerFixture):
+    for index in range(20):
+        with open(path.join(tree_drive_manager.workspace_path, f'file{index}.txt'), 'w') as f:
+            f.write(str(index))
+        utime(path.join(tree_drive_manager.workspace_path, f'file{index}.txt'), (1, 1))
+    tree_drive_manager.calculate_index_data('.', None, 42)
+    tree = tree_drive_manager.save_tree(None, 42)
+    tree_drive_manager.index_hashes.clear()
+    tree_drive_manager.write_index_data()
+    mock_get = mocker.spy(tree_drive_manager.index, 'get')
+    mock_hash = mocker.spy(tree_drive_manager, 'hash_and_save_file')
+
+    tree_drive_manager.calculate_index_data('.', tree, 42)
+
+    mock_get.assert_not_called()
+    mock_hash.assert_not_called()
+    assert tree_drive_manager.index_hashes == {}
+    assert tree_drive_manager.index.changes == {}
+
+
+def test_get_workspace_status_index_locked(tree_drive_manager: DriveManager, mocker: MockerFixture):
+    with open(path.join(tree_drive_manager.workspace_path, 'file.txt'), 'w') as f:
+        f.write('content')
+    tree_drive_manager.calculate_index_data('file.txt', None, 42)
+    tree = tree_drive_manager.save_tree(None, 42)
+    tree_drive_manager.index_hashes.clear()
+    tree_drive_manager.write_index_data()
+    utime(path.join(tree_drive_manager.workspace_path, 'file.txt'), (2, 2))
+    mock_acquire = mocker.spy(LockFile, 'acquire')
+
+    with LockFile(tree_drive_manager.index_path):
+        assert tree_drive_manager.get_workspace_status(tree, 42) == ([], [], [])
+
+    assert mock_acquire.call_count == 1
+
+
+def test_get_workspace_status_staged_removal(tree_drive_manager: DriveManager):
+    with open(path.join(tree_drive_manager.workspace_path, 'file.txt'), 'w') as f:
+        f.write('content')
+    tree_drive_manager.calculate_index_data('file.txt', None, 42)
+    tree = tree_drive_manager.save_tree(None, 42)
+    tree_drive_manager.index_hashes.clear()
+    tree_drive_manager.write_index_data()
+
+    tree_drive_manager.calculate_index_data('file.txt', tree, 42, False)
+
+    assert tree_drive_manager.index_hashes['file.txt'][1] is False
+    assert tree_drive_manager.get_workspace_status(tree, 42) == ([], [], [])
 
 
 def test_get_files_diff_hash1_none_hash2_exists(
-        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, MockerFixture, DriveManager)):
-    mock_load_file, mock_read, mock_remove, drive_mng = get_files_diff_merge_files_mock
+        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, DriveManager)):
+    mock_read_blob, mock_load_file, drive_mng = get_files_diff_merge_files_mock
 
     diff = list(drive_mng.get_files_diff(None, "123456"))
 
-    mock_load_file.assert_called_once_with("123456", drive_mng.temp_path)
-    mock_read.assert_called_once_with(drive_mng.temp_path)
-    mock_remove.assert_called_once_with(drive_mng.temp_path)
+    mock_read_blob.assert_called_once_with("123456")
+    mock_load_file.assert_not_called()
 
     assert diff == ['+;line1', '+;line2']
 
 
 def test_get_files_diff_hash1_exists_hash2_none(
-        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, MockerFixture, DriveManager)):
-    mock_load_file, mock_read, _, drive_mng = get_files_diff_merge_files_mock
+        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, DriveManager)):
+    mock_read_blob, _, drive_mng = get_files_diff_merge_files_mock
 
     diff = list(drive_mng.get_files_diff("abcdef", None))
 
-    mock_load_file.assert_called_once_with("abcdef", drive_mng.temp_path)
-    mock_read.assert_called_once_with(drive_mng.temp_path)
+    mock_read_blob.assert_called_once_with("abcdef")
 
     assert diff == ['-;line1', '-;line2']
 
 
 def test_get_files_diff_hash1_exists_hash2_exists(
-        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, MockerFixture, DriveManager)):
-    mock_load_file, mock_read, mock_remove, drive_mng = get_files_diff_merge_files_mock
-    mock_read.side_effect = [
-        "line1\nline2\n",
-        "line1\nline3\n"
+        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, DriveManager)):
+    mock_read_blob, mock_load_file, drive_mng = get_files_diff_merge_files_mock
+    mock_read_blob.side_effect = [
+        b"line1\nline2\n",
+        b"line1\nline3\n"
     ]
 
     diff = list(drive_mng.get_files_diff("abcdef", "123456"))
 
-    assert mock_load_file.call_count == 2
-    mock_load_file.assert_any_call("abcdef", drive_mng.temp_path)
-    mock_load_file.assert_any_call("123456", drive_mng.temp_path)
-    mock_remove.assert_called_once_with(drive_mng.temp_path)
-    assert mock_read.call_count == 2
+    assert mock_read_blob.call_count == 2
+    mock_read_blob.assert_any_call("abcdef")
+    mock_read_blob.assert_any_call("123456")
+    mock_load_file.assert_not_called()
 
     assert diff == ['-;line2', '+;line3']
 
 
-def test_merge_files_with_conflicts(
-        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, MockerFixture, DriveManager)):
-    mock_load_file, mock_read, mock_remove, drive_mng = get_files_diff_merge_files_mock
-    mock_read.side_effect = [
-        "line1\nline2\n",
-        "line1\nline2\n"
+def test_merge_files(
+        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, DriveManager)):
+    mock_read_blob, mock_load_file, drive_mng = get_files_diff_merge_files_mock
+    mock_read_blob.side_effect = [
+        b"line1\nline2\nline3\n",
+        b"line0\nline2\nline3\n",
+        b"line1\nline2\nline4\n"
     ]
 
-    result = drive_mng.merge_files_with_conflicts("hash1", "hash2")
-
-    assert mock_load_file.call_count == 2
-    mock_load_file.assert_any_call("hash1", drive_mng.temp_path)
-    mock_load_file.assert_any_call("hash2", drive_mng.temp_path)
-    mock_remove.assert_called_once_with(drive_mng.temp_path)
+    result = drive_mng.merge_files("base", "hash1", "hash2")
 
-    assert result == ["line1", "line2"]
+    assert mock_read_blob.call_count == 3
+    mock_load_file.assert_not_called()
+    assert result == (["line0", "line2", "line4"], False)
 
 
-def test_merge_files_with_conflicts_with_conflict(
-        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, MockerFixture, DriveManager)):
-    mock_load_file, mock_read, mock_remove, drive_mng = get_files_diff_merge_files_mock
-    mock_read.side_effect = [
-        "line1\nline2\nline4\nline2",
-        "line1\nline3\nline4\nline1"
+def test_merge_files_with_conflict(
+        get_files_diff_merge_files_mock: (MockerFixture, MockerFixture, DriveManager)):
+    mock_read_blob, mock_load_file, drive_mng = get_files_diff_merge_files_mock
+    mock_read_blob.side_effect = [
+        b"line1\nline2\nline4\nline2",
+        b"line1\nline3\nline4\nline1"
     ]
 
-    result = drive_mng.merge_files_with_conflicts("hash1", "hash2")
+    result = drive_mng.merge_files(None, "hash1", "hash2")
 
-    assert mock_load_file.call_count == 2
-    mock_load_file.assert_any_call("hash1", drive_mng.temp_path)
-    mock_load_file.assert_any_call("hash2", drive_mng.temp_path)
-    mock_remove.assert_called_once_with(drive_mng.temp_path)
+    assert mock_read_blob.call_count == 2
+    mock_load_file.assert_not_called()
 
-    expected_result = ['line1',
-                       '<<<<<<< YOURS',
+    expected_result = ['<<<<<<< YOURS',
+                       'line1',
                        'line2',
-                       '=======',
-                       'line3',
-                       '>>>>>>> THEIRS',
                        'line4',
-                       '<<<<<<< YOURS',
                        'line2',
                        '=======',
                        'line1',
+                       'line3',
+                       'line4',
+                       'line1',
                        '>>>>>>> THEIRS']
-    assert result == expected_result
+    assert result == (expected_result, True)
+
+
+def write_files(drive_manager: DriveManager, files: dict[str: str]) -> str:
+    entries = {}
+    for name, content in files.items():
+        file_path = path.join(drive_manager.workspace_path, name)
+        makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(content)
+        file_hash = drive_manager.get_file_hash(file_path, 42)
+        drive_manager.save_file(name, file_hash)
+        entries[name] = file_hash
+
+    drive_manager.index_hashes = {name: (file_hash, True) for name, file_hash in entries.items()}
+    return drive_manager.save_tree(None, 42)
+
+
+def test_merge_trees(tree_drive_manager: DriveManager, mocker: MockerFixture):
+    tree_drive_manager.hash_mode = 'content'
+    base = write_files(tree_drive_manager, {'same.txt': 'same', 'ours.txt': 'base', 'theirs.txt': 'base',
+                                            'both.txt': 'base', 'deleted/file.txt': 'base', 'lib/a.txt': 'a'})
+    main = write_files(tree_drive_manager, {'same.txt': 'same', 'ours.txt': 'ours', 'theirs.txt': 'base',
+                                            'both.txt': 'ours', 'deleted/file.txt': 'base', 'lib/a.txt': 'a'})
+    additional = write_files(tree_drive_manager, {'same.txt': 'same', 'ours.txt': 'base', 'theirs.txt': 'theirs',
+                                                  'both.txt': 'theirs', 'lib/a.txt': 'a', 'lib/new.txt': 'new'})
+    mock_read_blob = mocker.spy(tree_drive_manager, 'read_blob')
+
+    changes, conflicts = tree_drive_manager.merge_trees(base, main, additional)
+
+    assert changes == {'theirs.txt': tree_drive_manager.get_tree_file_hash(additional, 'theirs.txt'),
+                       path.join('deleted', 'file.txt'): None,
+                       path.join('lib', 'new.txt'): tree_drive_manager.get_tree_file_hash(additional, 'lib/new.txt')}
+    assert conflicts == [('both.txt', tree_drive_manager.get_tree_file_hash(base, 'both.txt'),
+                          tree_drive_manager.get_tree_file_hash(main, 'both.txt'),
+                          tree_drive_manager.get_tree_file_hash(additional, 'both.txt'))]
+    mock_read_blob.assert_not_called()
+
+
+def test_compare_paths(tree_drive_manager: DriveManager, mocker: MockerFixture):
+    tree_drive_manager.hash_mode = 'content'
+    old = write_files(tree_drive_manager, {'src/api/a.txt': 'a', 'src/api/b.txt': 'b', 'src/lib/c.txt': 'c',
+                                           'docs/d.txt': 'd', 'top.txt': 'top'})
+    new = write_files(tree_drive_manager, {'src/api/a.txt': 'changed', 'src/api/new/e.txt': 'e',
+                                           'src/lib/c.txt': 'changed', 'docs/d.txt': 'd', 'top.txt': 'changed'})
+    mock_compare = mocker.spy(tree_drive_manager, 'compare_trees')
+
+    assert tree_drive_manager.compare_paths(old, new, [path.join('src', 'api')]) == (
+        {path.join('src', 'api', 'new', 'e.txt')}, {path.join('src', 'api', 'b.txt')},
+        {path.join('src', 'api', 'a.txt')})
+    assert mock_compare.call_args_list[0].args[2] == path.join('src', 'api')
+    assert tree_drive_manager.compare_paths(old, new, ['top.txt', path.join('docs', '')]) == (set(), set(),
+                                                                                          {'top.txt'})
+    assert tree_drive_manager.compare_paths(old, new, ['missing']) == (set(), set(), set())
+    assert tree_drive_manager.compare_paths(old, new, ['.']) == tree_drive_manager.compare_trees(old, new)
+    assert tree_drive_manager.get_tree_diff(old, new, [path.join('src', 'lib')]) == [
+        f"~;{path.join('src', 'lib', 'c.txt')}"]
+
+
+def test_paths_changed(tree_drive_manager: DriveManager):
+    tree_drive_manager.hash_mode = 'content'
+    old = write_files(tree_drive_manager, {'src/a.txt': 'a', 'docs/d.txt': 'd'})
+    new = write_files(tree_drive_manager, {'src/a.txt': 'changed', 'docs/d.txt': 'd'})
+
+    assert tree_drive_manager.paths_changed(old, new, ['src'])
+    assert not tree_drive_manager.paths_changed(old, new, ['docs', 'missing'])
+    assert tree_drive_manager.paths_changed(None, new, ['docs'])
+    assert tree_drive_manager.get_tree_entry(new, path.join('docs', 'd.txt')) == (
+        MODE_FILE, tree_drive_manager.get_tree_file_hash(new, path.join('docs', 'd.txt')))
+    assert tree_drive_manager.get_tree_entry(new, path.join('docs', 'd.txt', 'x')) is None
+
+
+def test_merge_trees_one_side_unchanged(drive_manager: DriveManager, mocker: MockerFixture):
+    mock_compare = mocker.patch.object(drive_manager, 'compare_trees')
+
+    assert drive_manager.merge_trees('base', 'main', 'base') == ({}, [])
+    assert drive_manager.merge_trees('base', 'same', 'same') == ({}, [])
+    mock_compare.assert_not_called()
+
+
+def test_write_commit_data_merge_parent(drive_manager: DriveManager, mocker: MockerFixture):
+    mocker.patch('kit_vcs.drive_manager.makedirs')
+    mock_atomic_write = mocker.patch('kit_vcs.drive_manager.atomic_write')
+
+    drive_manager.write_commit_data('a1b2c3d4e5f6', 'username', '2024-01-01', 'description', 'tree', 'parent',
+                                    'merged')
+
+    assert mock_atomic_write.call_args.args[1].endswith('\nparent\nmerged')
+
+
+def test_update_ref(tmp_path):
+    (tmp_path / '.kit' / 'refs' / 'heads').mkdir(parents=True)
+    drive_manager = DriveManager(workspace_path=str(tmp_path))
+    ref = path.join('refs', 'heads', 'main')
+
+    drive_manager.update_ref(ref, 'first', NO_REF)
+    drive_manager.update_ref(ref, 'second', 'first')
+    with pytest.raises(errors.RefUpdateError):
+        drive_manager.update_ref(ref, 'third', 'first')
+    with pytest.raises(errors.RefUpdateError):
+        drive_manager.update_ref(ref, 'third', NO_REF)
+
+    assert (tmp_path / '.kit' / 'refs' / 'heads' / 'main').read_text() == 'second'
+    drive_manager.delete_ref(ref)
+    assert list((tmp_path / '.kit' / 'refs' / 'heads').iterdir()) == []
+
+
+def test_pack_refs(tmp_path):
+    (tmp_path / '.kit' / 'refs' / 'heads').mkdir(parents=True)
+    (tmp_path / '.kit' / 'refs' / 'tags').mkdir()
+    drive_manager = DriveManager(workspace_path=str(tmp_path))
+    drive_manager.update_ref(path.join('refs', 'heads', 'main'), 'commit1')
+    drive_manager.update_ref(path.join('refs', 'tags', 'v1'), 'user\ndate\nmessage\ncommit1')
+
+    assert drive_manager.pack_refs() == 2
+
+    assert listdir(tmp_path / '.kit' / 'refs' / 'heads') == []
+    assert listdir(tmp_path / '.kit' / 'refs' / 'tags') == []
+    assert drive_manager.read_ref(path.join('refs', 'heads', 'main')) == 'commit1'
+    assert drive_manager.list_refs(path.join('refs', 'tags')) == {'v1': 'user\ndate\nmessage\ncommit1'}
+
+    drive_manager.update_ref(path.join('refs', 'heads', 'main'), 'commit2', 'commit1')
+    drive_manager.update_ref(path.join('refs', 'heads', 'feature'), 'commit1', NO_REF)
+    assert drive_manager.list_refs(path.join('refs', 'heads')) == {'feature': 'commit1', 'main': 'commit2'}
+    with pytest.raises(errors.RefUpdateError):
+        drive_manager.update_ref(path.join('refs', 'tags', 'v1'), 'other', NO_REF)
+
+    drive_manager.delete_ref(path.join('refs', 'tags', 'v1'))
+    assert drive_manager.read_ref(path.join('refs', 'tags', 'v1')) is None
+    assert DriveManager(workspace_path=str(tmp_path)).list_refs(path.join('refs', 'tags')) == {}
+
+
+def test_resolve_commit(tmp_path):
+    (tmp_path / '.kit' / 'objects').mkdir(parents=True)
+    drive_manager = DriveManager(workspace_path=str(tmp_path))
+    drive_manager.compression = ('zlib', 6)
+    for commit_id in ('abcd0000000000000000000000000000', 'abcd1000000000000000000000000000',
+                      '12340000000000000000000000000000'):
+        drive_manager.write_commit_data(commit_id, 'user', '2024-01-01', f'commit {commit_id[:5]}', 'tree', None)
+    (tmp_path / 'blob.txt').write_text('blob')
+    drive_manager.save_file('blob.txt', '1234f000000000000000000000000000')
+
+    assert drive_manager.resolve_commit('1234') == '12340000000000000000000000000000'
+    assert drive_manager.resolve_commit('ABCD1') == 'abcd1000000000000000000000000000'
+    assert drive_manager.resolve_commit('abcd0000000000000000000000000000') == 'abcd0000000000000000000000000000'
+    assert drive_manager.resolve_commit('1234f') is None
+    assert drive_manager.resolve_commit('5678') is None
+    assert drive_manager.resolve_commit('abc') is None
+    with pytest.raises(errors.AmbiguousObjectError, match='commit abcd0[\\s\\S]*commit abcd1'):
+        drive_manager.resolve_commit('abcd')
+
+    drive_manager.repack()
+    assert drive_manager.resolve_commit('abcd1') == 'abcd1000000000000000000000000000'
+    assert drive_manager.read_commit('12340000000000000000000000000000').startswith('user\n')
+    assert drive_manager.object_id_index().abbreviate('12340000000000000000000000000000') == '12340'
+
+
+def test_commit_by_user_named_tree(tmp_path):
+    (tmp_path / '.kit' / 'objects').mkdir(parents=True)
+    drive_manager = DriveManager(workspace_path=str(tmp_path))
+    drive_manager.write_commit_data('abcd' * 8, 'tree', '2024-01-01', 'message', 'ef' * 16, None)
+
+    assert drive_manager.get_object_type('abcd' * 8) == OBJ_COMMIT
+    drive_manager.repack()
+    assert drive_manager.get_object_type('abcd' * 8) == OBJ_COMMIT
+    assert drive_manager.resolve_commit('abcd') == 'abcd' * 8
+    assert drive_manager.get_commit_entry('abcd' * 8).user == 'tree'
+
+
+def test_object_cache(tmp_path, mocker: MockerFixture):
+    (tmp_path / '.kit' / 'objects').mkdir(parents=True)
+    (tmp_path / 'file.txt').write_text('content\n')
+    drive_manager = DriveManager(workspace_path=str(tmp_path))
+    drive_manager.compression = ('zlib', 6)
+    drive_manager.save_file('file.txt', 'ab' * 16)
+    drive_manager.write_commit_data('cd' * 16, 'user', '2024-01-01', 'message', 'ef' * 16, None)
+    mock_iter_blob = mocker.spy(drive_manager, 'iter_blob')
+    mock_read_commit = mocker.spy(drive_manager, 'read_commit')
+
+    for _ in range(3):
+        assert drive_manager.read_blob_lines('ab' * 16) == ['content']
+        assert drive_manager.get_commit_tree_hash('cd' * 16) == 'ef' * 16
+        assert drive_manager.get_commit_entry('cd' * 16).description == 'message'
+
+    assert mock_iter_blob.call_count == 1
+    assert mock_read_commit.call_count == 1
+    assert drive_manager.cache.stats() == {'blobs': (2, 1), 'commits': (5, 1)}
+
+
+def test_update_ref_locked(tmp_path, mocker: MockerFixture):
+    (tmp_path / '.kit').mkdir()
+    (tmp_path / '.kit' / 'HEAD.lock').write_text('')
+    mocker.patch('kit_vcs.lockfile.LOCK_TIMEOUT', 0.01)
+    drive_manager = DriveManager(workspace_path=str(tmp_path))
+
+    with pytest.raises(errors.LockError):
+        drive_manager.update_ref('HEAD', 'commit')
+
+
+@pytest.fixture
+def commit_graph(drive_manager: DriveManager, mocker: MockerFixture) -> dict:
+    graph = {
+        'root': ('2024-01-01 00:00:00', ['None']),
+        'a1': ('2024-01-02 00:00:00', ['root']),
+        'b1': ('2024-01-03 00:00:00', ['root']),
+        'a2': ('2024-01-04 00:00:00', ['a1']),
+        'merge': ('2024-01-05 00:00:00', ['a2', 'b1']),
+        'b2': ('2024-01-06 00:00:00', ['b1']),
+    }
+
+    def mock_read_commit(commit_id):
+        commit_dt, parents = graph[commit_id]
+        return '\n'.join(['username', commit_dt, 'description', 'tree', *parents])
+
+    mocker.patch.object(drive_manager, 'read_commit', side_effect=mock_read_commit)
+    return graph
+
+
+@pytest.mark.parametrize('commit1, commit2, expected', [
+    ('a2', 'b2', 'root'),
+    ('merge', 'b2', 'b1'),
+    ('merge', 'a1', 'a1'),
+    ('a2', 'a2', 'a2'),
+])
+def test_get_merge_base(drive_manager: DriveManager, commit_graph: dict, commit1: str, commit2: str, expected: str):
+    assert drive_manager.get_merge_base(commit1, commit2) == expected
+
+
+def test_get_merge_base_orders_by_timestamp(drive_manager: DriveManager, mocker: MockerFixture):
+    graph = {
+        'root': ('2024-01-01 00:00:00', ['None']),
+        'early': ('2024-01-02T09:00:00', ['root']),
+        'late': ('2024-01-02 10:00:00', ['root']),
+        'merge1': ('2024-01-03 00:00:00', ['early', 'late']),
+        'merge2': ('2024-01-03 00:00:00', ['late', 'early']),
+    }
+
+    def mock_read_commit(commit_id):
+        commit_dt, parents = graph[commit_id]
+        return '\n'.join(['username', commit_dt, 'description', 'tree', *parents])
+
+    mocker.patch.object(drive_manager, 'read_commit', side_effect=mock_read_commit)
+    assert drive_manager.get_merge_base('merge1', 'merge2') == 'late'
+
+
+def test_get_commit_parents(drive_manager: DriveManager, commit_graph: dict):
+    assert drive_manager.get_commit_parents('merge') == ['a2', 'b1']
+    assert drive_manager.get_commit_parents('root') == []
+
+
+@pytest.fixture
+def graph_drive_manager(tree_drive_manager: DriveManager) -> DriveManager:
+    history = [('00', [], '2024-01-01 00:00:00'), ('a1', ['00'], '2024-01-02 00:00:00'),
+               ('b1', ['00'], '2024-01-03 00:00:00'), ('a2', ['a1'], '2024-01-04 00:00:00'),
+               ('cc', ['a2', 'b1'], '2024-01-05 00:00:00'), ('b2', ['b1'], '2024-01-06 00:00:00')]
+    for name, parents, commit_dt in history:
+        commit_id = name * 16
+        tree_drive_manager.write_commit_data(commit_id, 'username', commit_dt, name, 'ee' * 16,
+                                             *[parent * 16 for parent in parents] or [None])
+        tree_drive_manager.update_commit_graph(commit_id)
+    return tree_drive_manager
+
+
+def test_commit_graph_queries(graph_drive_manager: DriveManager, mocker: MockerFixture):
+    mock_read_commit = mocker.patch.object(graph_drive_manager, 'read_commit')
+
+    assert len(graph_drive_manager.commit_graph) == 6
+    assert graph_drive_manager.get_commit_parents('cc' * 16) == ['a2' * 16, 'b1' * 16]
+    assert graph_drive_manager.get_commit_tree_hash('cc' * 16) == 'ee' * 16
+    assert graph_drive_manager.get_merge_base('cc' * 16, 'b2' * 16) == 'b1' * 16
+    assert graph_drive_manager.get_merge_base('a2' * 16, 'b2' * 16) == '00' * 16
+    assert graph_drive_manager.get_merge_base('cc' * 16, 'a1' * 16) == 'a1' * 16
+    assert graph_drive_manager.is_ancestor('a1' * 16, 'cc' * 16)
+    assert not graph_drive_manager.is_ancestor('b2' * 16, 'cc' * 16)
+    mock_read_commit.assert_not_called()
+
+
+def test_is_ancestor_stops_at_generation(graph_drive_manager: DriveManager, mocker: MockerFixture):
+    spy = mocker.spy(graph_drive_manager, 'get_commit_entry')
+
+    assert not graph_drive_manager.is_ancestor('a2' * 16, 'b2' * 16)
+    assert '00' * 16 not in [call.args[0] for call in spy.call_args_list]
+
+
+def test_get_merge_base_stops_at_generation(graph_drive_manager: DriveManager, mocker: MockerFixture):
+    spy = mocker.spy(graph_drive_manager, 'get_commit_entry')
+
+    assert graph_drive_manager.get_merge_base('cc' * 16, 'a1' * 16) == 'a1' * 16
+    assert '00' * 16 not in [call.args[0] for call in spy.call_args_list]
+
+
+def test_write_commit_graph(graph_drive_manager: DriveManager):
+    graph_drive_manager.commit_graph.write([])
+    assert len(graph_drive_manager.commit_graph) == 0
+
+    assert graph_drive_manager.write_commit_graph(['cc' * 16, 'b2' * 16]) == 6
+    assert graph_drive_manager.get_commit_entry('cc' * 16).generation == 4
+
+
+def test_merge_head(tree_drive_manager: DriveManager):
+    assert tree_drive_manager.get_merge_head() is None
+
+    tree_drive_manager.set_merge_head('a1b2c3d4e5f6')
+    assert tree_drive_manager.get_merge_head() == 'a1b2c3d4e5f6'
+
+    tree_drive_manager.set_merge_head(None)
+    assert tree_drive_manager.get_merge_head() is None
 
 
 @pytest.mark.parametrize("commit_chain, base_commit, target_commit, expected", [
@@ -624,40 +1335,39 @@ def test_merge_files_with_conflicts_with_conflict(
 ])
 def test_is_ancestor(drive_manager: DriveManager, mocker: MockerFixture, commit_chain: dict, base_commit: str,
                      target_commit: str, expected: bool):
-    def mock_read(commit_path):
-        commit_id = ''.join(commit_path.split(sep)[-2:])
+    def mock_read_commit(commit_id):
         return f"username\ncommit_dt\ndescription\ntree\n{commit_chain[commit_id]}"
 
-    mocker.patch.object(drive_manager, 'read', side_effect=mock_read)
+    mocker.patch.object(drive_manager, 'read_commit', side_effect=mock_read_commit)
 
     assert drive_manager.is_ancestor(base_commit, target_commit) == expected
 
 
-def test_get_tree_diff(mocker: MockerFixture):
-    mocker.patch('kit_vcs.drive_manager.DriveManager.compare_trees',
-                 return_value=({'added_file'}, {'removed_file'}, {'changed_file'}))
+def test_get_tree_diff(drive_manager: DriveManager, mocker: MockerFixture):
+    mocker.patch.object(drive_manager, 'compare_trees',
+                        return_value=({'added_file'}, {'removed_file'}, {'changed_file'}))
 
-    diff = DriveManager.get_tree_diff('/path/to/tree1', '/path/to/tree2')
+    diff = drive_manager.get_tree_diff('tree1', 'tree2')
 
     assert diff == ['+;added_file', '~;changed_file', '-;removed_file']
 
 
-def test_compare_trees(mocker: MockerFixture):
-    mock_get_relative_paths = mocker.patch('kit_vcs.utils.Utils.get_relative_paths')
-    mock_read_file_content = mocker.patch('kit_vcs.drive_manager.DriveManager.read_file_content')
-
-    mock_get_relative_paths.side_effect = [
-        {"file1.txt", "file2.txt"},
-        {"file1.txt", "file3.txt"}
-    ]
-    mock_read_file_content.side_effect = ["content1", "content2"]
+def test_compare_trees(tree_drive_manager: DriveManager):
+    tree_drive_manager.index_hashes = {'file1.txt': ('hash1', True), 'file2.txt': ('hash2', True),
+                                       Utils.parse_from_str_to_os_path('same/file.txt'): ('hash4', True)}
+    tree1_hash = tree_drive_manager.save_tree(None, 42)
+    tree_drive_manager.index_hashes = {'file1.txt': ('hash5', True), 'file2.txt': ('hash2', False),
+                                       Utils.parse_from_str_to_os_path('new/file3.txt'): ('hash3', True)}
+    tree2_hash = tree_drive_manager.save_tree(tree1_hash, 42)
 
-    added_files, removed_files, changed_files = DriveManager.compare_trees("tree1", "tree2")
+    added_files, removed_files, changed_files = tree_drive_manager.compare_trees(tree1_hash, tree2_hash)
 
-    assert added_files == {"file3.txt"} and removed_files == {"file2.txt"} and changed_files == {"file1.txt"}
+    assert added_files == {Utils.parse_from_str_to_os_path('new/file3.txt')}
+    assert removed_files == {"file2.txt"} and changed_files == {"file1.txt"}
 
 
-def test_read_file_content(mocker: MockerFixture):
-    mocker.patch('builtins.open', mocker.mock_open(read_data=b'filehash'))
+def test_compare_trees_same_tree(drive_manager: DriveManager, mocker: MockerFixture):
+    mock_read_tree = mocker.patch.object(drive_manager, 'read_tree')
 
-    assert DriveManager.read_file_content("/path/to/file1.txt") == b'filehash'
+    assert drive_manager.compare_trees('tree', 'tree') == (set(), set(), set())
+    mock_read_tree.assert_not_called()
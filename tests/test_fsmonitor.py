@@ -0,0 +1,125 @@
+import platform
+import selectors
+from os import makedirs, path, remove, rename
+
+import pytest
+from pytest_mock import MockerFixture
+
+import kit_vcs.errors as errors
+import kit_vcs.fsmonitor as fsmonitor
+from kit_vcs.fsmonitor import FsMonitorDaemon
+
+linux_only = pytest.mark.skipif(platform.system() != 'Linux', reason='inotify is only available on Linux')
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    (tmp_path / '.kit').mkdir()
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'a.txt').write_text('a')
+    return str(tmp_path)
+
+
+@pytest.fixture
+def daemon(workspace):
+    daemon = FsMonitorDaemon(workspace)
+    daemon.reset()
+    yield daemon
+    daemon.inotify.close()
+
+
+def query(daemon: FsMonitorDaemon, token: str | None) -> dict:
+    return daemon.answer({'key': daemon.key, 'command': 'query', 'token': token})
+
+
+def test_state_round_trip(tmp_path):
+    file_stats = {'a.txt': (1, 2, 3, 4, 5), path.join('src', 'b.txt'): (-1, 2, 2 ** 63, 4, 5)}
+
+    fsmonitor.write_state(str(tmp_path), 'epoch:7', file_stats)
+
+    assert fsmonitor.read_state(str(tmp_path)) == ('epoch:7', file_stats)
+    fsmonitor.write_state(str(tmp_path), 'epoch:8', {})
+    assert fsmonitor.read_state(str(tmp_path)) == ('epoch:8', {})
+
+
+def test_state_corrupted(tmp_path):
+    assert fsmonitor.read_state(str(tmp_path)) == (None, {})
+    fsmonitor.write_state(str(tmp_path), 'epoch:7', {'a.txt': (1, 2, 3, 4, 5)})
+    with open(path.join(str(tmp_path), fsmonitor.STATE_FILE), 'r+b') as f:
+        f.truncate(20)
+
+    assert fsmonitor.read_state(str(tmp_path)) == (None, {})
+
+
+def test_query_without_daemon(tmp_path, mocker: MockerFixture):
+    mock_connection = mocker.patch('kit_vcs.fsmonitor.socket.create_connection')
+
+    assert fsmonitor.query(str(tmp_path), 'epoch:1') is None
+    mock_connection.assert_not_called()
+
+
+def test_query_dead_daemon(tmp_path, mocker: MockerFixture):
+    (tmp_path / fsmonitor.MONITOR_FILE).write_text('12345 key\n')
+    mocker.patch('kit_vcs.fsmonitor.socket.create_connection', side_effect=ConnectionRefusedError)
+
+    assert fsmonitor.query(str(tmp_path), 'epoch:1') is None
+    assert fsmonitor.stop(str(tmp_path)) is False
+
+
+def test_start_unsupported(tmp_path, mocker: MockerFixture):
+    mocker.patch('kit_vcs.fsmonitor.platform.system', return_value='Darwin')
+
+    with pytest.raises(errors.FsMonitorError):
+        fsmonitor.start(str(tmp_path))
+
+
+@linux_only
+def test_daemon_reports_changes(workspace, daemon: FsMonitorDaemon):
+    first = query(daemon, None)
+    assert first['paths'] is None
+
+    with open(path.join(workspace, 'src', 'a.txt'), 'a') as f:
+        f.write('changed')
+    makedirs(path.join(workspace, 'new'))
+    with open(path.join(workspace, 'new', 'b.txt'), 'w') as f:
+        f.write('b')
+    with open(path.join(workspace, '.kit', 'INDEX'), 'w') as f:
+        f.write('ignored')
+
+    second = query(daemon, first['token'])
+    assert second['paths'] == ['new', path.join('src', 'a.txt')]
+
+    remove(path.join(workspace, 'new', 'b.txt'))
+    assert query(daemon, second['token'])['paths'] == [path.join('new', 'b.txt')]
+
+
+@linux_only
+def test_daemon_invalidates_tokens(workspace, daemon: FsMonitorDaemon):
+    token = query(daemon, None)['token']
+
+    assert query(daemon, 'other:0')['paths'] is None
+    assert query(daemon, token.split(':')[0] + ':100')['paths'] is None
+    assert daemon.answer({'key': 'wrong', 'command': 'query', 'token': token}) == {'error': 'unauthorized'}
+
+    rename(path.join(workspace, 'src'), path.join(workspace, 'moved'))
+    response = query(daemon, token)
+    assert response['paths'] is None
+    assert response['token'] != token
+
+
+@linux_only
+def test_daemon_reset_keeps_inotify_registered(workspace):
+    daemon = FsMonitorDaemon(workspace)
+    daemon.selector = selectors.DefaultSelector()
+    daemon.reset()
+
+    with open(path.join(workspace, fsmonitor.IGNORE_FILE), 'w') as f:
+        f.write('*.log\n')
+    daemon.process_events()
+    with open(path.join(workspace, 'src', 'a.txt'), 'a') as f:
+        f.write('changed')
+
+    assert [key.data for key, _ in daemon.selector.select(timeout=1)] == ['inotify']
+    assert daemon.selector.get_map()[daemon.inotify.fd].data == 'inotify'
+    daemon.selector.close()
+    daemon.inotify.close()
@@ -0,0 +1,64 @@
+from os import makedirs, path
+
+import pytest
+
+from kit_vcs.ignore import IgnoreMatcher, IgnoreRules, translate_pattern
+
+
+def write_ignore(workspace: str, folder: str, lines: list[str]) -> None:
+    makedirs(path.join(workspace, folder), exist_ok=True)
+    with open(path.join(workspace, folder, '.kitignore'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+@pytest.mark.parametrize('pattern, rel_path, expected', [
+    ('*.o', 'main.o', True),
+    ('*.o', 'src/deep/main.o', True),
+    ('*.o', 'main.c', False),
+    ('/build', 'build', True),
+    ('/build', 'src/build', False),
+    ('doc/*.txt', 'doc/a.txt', True),
+    ('doc/*.txt', 'doc/sub/a.txt', False),
+    ('doc/**/*.txt', 'doc/sub/deep/a.txt', True),
+    ('doc/**/*.txt', 'doc/a.txt', True),
+    ('**/cache', 'a/b/cache', True),
+    ('logs/**', 'logs/a/b.log', True),
+    ('file?.txt', 'file1.txt', True),
+    ('file?.txt', 'file10.txt', False),
+    ('file[0-9].txt', 'file5.txt', True),
+    ('file[!0-9].txt', 'file5.txt', False),
+    ('\\#hash', '#hash', True),
+])
+def test_translate_pattern(pattern: str, rel_path: str, expected: bool):
+    assert (IgnoreRules('', [pattern]).match(rel_path, False) is True) == expected
+
+
+def test_ignore_rules_negation_and_directories():
+    rules = IgnoreRules('', ['# comment', '', '*.log', '!keep.log', 'build/'])
+
+    assert rules.match('debug.log', False) is True
+    assert rules.match('keep.log', False) is False
+    assert rules.match('build', True) is True
+    assert rules.match('build', False) is None
+    assert rules.match('main.c', False) is None
+
+
+def test_ignore_matcher_nested(tmp_path):
+    workspace = str(tmp_path)
+    write_ignore(workspace, '', ['*.tmp', 'node_modules/'])
+    write_ignore(workspace, 'src', ['!important.tmp', '/generated'])
+    matcher = IgnoreMatcher(workspace)
+
+    assert matcher.is_ignored('a.tmp')
+    assert matcher.is_ignored(path.join('src', 'a.tmp'))
+    assert not matcher.is_ignored(path.join('src', 'important.tmp'))
+    assert matcher.is_ignored('important.tmp')
+    assert matcher.is_ignored(path.join('src', 'generated', 'code.c'))
+    assert not matcher.is_ignored('generated')
+    assert matcher.is_ignored(path.join('node_modules', 'pkg', 'index.js'))
+    assert not matcher.is_ignored(path.join('src', 'main.c'))
+
+
+def test_translate_pattern_anchoring():
+    assert translate_pattern('name') == '(?:.*/)?name'
+    assert translate_pattern('/name') == 'name'
@@ -0,0 +1,174 @@
+from os import remove
+
+import pytest
+from pytest_mock import MockerFixture
+
+import kit_vcs.errors as errors
+from kit_vcs.index import Index, IndexEntry
+
+HASH1 = '00112233445566778899aabbccddeeff'
+HASH2 = 'ff112233445566778899aabbccddeeff'
+HASH3 = '7f112233445566778899aabbccddeeff'
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / 'INDEX')
+
+
+@pytest.fixture
+def index(index_path):
+    index = Index(index_path)
+    index.put('b.txt', HASH1, '=', (1, 2, 3, 4, 5))
+    index.put('a/c.txt', HASH2, '+', (6, 7, 8, 9, 10))
+    index.put('d.txt', HASH3, '-', None)
+    index.write()
+    yield index
+    index.close()
+
+
+def test_write_and_read_index(index_path, index: Index):
+    loaded = Index(index_path)
+
+    assert loaded.count == 3
+    assert loaded.get('b.txt') == IndexEntry(HASH1, '=', (1, 2, 3, 4, 5))
+    assert loaded.get('a/c.txt') == IndexEntry(HASH2, '+', (6, 7, 8, 9, 10))
+    assert loaded.get('d.txt') == IndexEntry(HASH3, '-', None)
+    assert loaded.get('missing.txt') is None
+    loaded.close()
+
+
+def test_index_staged(index: Index):
+    assert index.staged() == {'a/c.txt': IndexEntry(HASH2, '+', (6, 7, 8, 9, 10)),
+                              'd.txt': IndexEntry(HASH3, '-', None)}
+
+
+def test_index_items(index: Index):
+    index.put('c.txt', HASH1, '+', None)
+    index.remove('d.txt')
+
+    assert dict(index.items()) == {'a/c.txt': IndexEntry(HASH2, '+', (6, 7, 8, 9, 10)),
+                                   'b.txt': IndexEntry(HASH1, '=', (1, 2, 3, 4, 5)),
+                                   'c.txt': IndexEntry(HASH1, '+', None)}
+
+
+def test_index_update_keeps_unchanged_records(index: Index):
+    index.put('a/c.txt', HASH2, '=', (6, 7, 8, 9, 10))
+    index.put('c.txt', HASH1, '+', None)
+    index.remove('d.txt')
+    index.write()
+
+    assert index.count == 3
+    assert index.get('b.txt') == IndexEntry(HASH1, '=', (1, 2, 3, 4, 5))
+    assert index.get('d.txt') is None
+    assert index.staged() == {'c.txt': IndexEntry(HASH1, '+', None)}
+
+
+def test_index_put_unchanged_entry(index: Index):
+    index.put('b.txt', HASH1, '=', (1, 2, 3, 4, 5))
+
+    assert index.changes == {}
+
+
+def test_index_smudges_racy_stat(index_path, mocker: MockerFixture):
+    mocker.patch('kit_vcs.index.time_ns', return_value=3 * 10 ** 9)
+    index = Index(index_path)
+    index.put('old.txt', HASH1, '=', (10 ** 9 - 1, 2, 3, 4, 5))
+    index.put('new.txt', HASH2, '=', (10 ** 9 + 1, 2, 3, 4, 5))
+    index.write()
+
+    assert index.get('old.txt').stat == (10 ** 9 - 1, 2, 3, 4, 5)
+    assert index.get('new.txt').stat is None
+    index.close()
+
+
+def test_index_compacts_paths(index: Index):
+    index.remove('a/c.txt')
+    index.remove('b.txt')
+    index.write()
+
+    assert index.garbage == 0
+    assert index.get('d.txt') == IndexEntry(HASH3, '-', None)
+
+
+def test_index_corrupted(index_path, index: Index):
+    index.close()
+    with open(index_path, 'r+b') as f:
+        f.seek(30)
+        f.write(b'\xff')
+
+    with pytest.raises(errors.CorruptedIndexError):
+        Index(index_path)
+
+
+def test_index_legacy_text(index_path):
+    with open(index_path, 'w') as f:
+        f.write(f'file.txt,{HASH1},+\nold.txt,{HASH2},=,1,2,3,4,5\n')
+
+    index = Index(index_path)
+
+    assert index.get('file.txt') == IndexEntry(HASH1, '+', None)
+    assert index.staged() == {'file.txt': IndexEntry(HASH1, '+', None)}
+    index.write()
+    assert index.get('old.txt') == IndexEntry(HASH2, '=', (1, 2, 3, 4, 5))
+    index.close()
+
+
+def test_index_missing_file(index_path):
+    index = Index(index_path)
+
+    assert index.get('file.txt') is None
+    assert index.staged() == {}
+
+
+def test_index_merges_concurrent_writes(index_path, index: Index):
+    first = Index(index_path)
+    second = Index(index_path)
+    first.put('first.txt', HASH1, '+', None)
+    second.put('second.txt', HASH2, '+', None)
+
+    first.write()
+    second.write()
+
+    loaded = Index(index_path)
+    assert loaded.get('first.txt') == IndexEntry(HASH1, '+', None)
+    assert loaded.get('second.txt') == IndexEntry(HASH2, '+', None)
+    assert loaded.count == 5
+    for opened in (first, second, loaded):
+        opened.close()
+
+
+def test_index_write_locked(index_path, index: Index, mocker: MockerFixture):
+    mocker.patch('kit_vcs.lockfile.LOCK_TIMEOUT', 0.01)
+    with open(index_path + '.lock', 'w'):
+        pass
+    index.put('new.txt', HASH1, '+', None)
+
+    with pytest.raises(errors.LockError):
+        index.write()
+    assert Index(index_path).get('new.txt') is None
+
+
+def test_index_try_write(index_path, index: Index):
+    with open(index_path + '.lock', 'w'):
+        pass
+    index.put('new.txt', HASH1, '+', None)
+
+    assert index.try_write() is False
+    assert Index(index_path).get('new.txt') is None
+
+    remove(index_path + '.lock')
+    assert index.try_write() is True
+    assert Index(index_path).get('new.txt') == IndexEntry(HASH1, '+', None)
+
+
+def test_index_get_many(index: Index, mocker: MockerFixture):
+    index.put('c.txt', HASH1, '+', None)
+    expected = {'b.txt': IndexEntry(HASH1, '=', (1, 2, 3, 4, 5)), 'c.txt': IndexEntry(HASH1, '+', None),
+                'missing.txt': None}
+    mock_find = mocker.spy(index, 'find')
+
+    assert index.get_many(['b.txt', 'c.txt', 'missing.txt']) == expected
+    mock_find.assert_not_called()
+    assert index.get_many(['b.txt']) == {'b.txt': expected['b.txt']}
+    assert mock_find.call_count == 1
@@ -0,0 +1,74 @@
+from os import listdir
+
+import pytest
+from pytest_mock import MockerFixture
+
+import kit_vcs.errors as errors
+from kit_vcs.lockfile import LockFile, atomic_write
+
+
+def test_lockfile_commit(tmp_path):
+    target = tmp_path / 'target'
+    target.write_text('old')
+
+    with LockFile(str(target)) as lock:
+        lock.write('new')
+        assert target.read_text() == 'old'
+        assert (tmp_path / 'target.lock').exists()
+        lock.commit()
+
+    assert target.read_text() == 'new'
+    assert listdir(tmp_path) == ['target']
+
+
+def test_lockfile_release(tmp_path):
+    target = tmp_path / 'target'
+    target.write_text('old')
+
+    with LockFile(str(target)) as lock:
+        lock.write(b'new')
+
+    assert target.read_text() == 'old'
+    assert listdir(tmp_path) == ['target']
+
+
+def test_lockfile_contention(tmp_path):
+    target = str(tmp_path / 'target')
+
+    with LockFile(target):
+        with pytest.raises(errors.LockError):
+            LockFile(target, timeout=0.01).acquire()
+
+    with LockFile(target, timeout=0.01):
+        pass
+
+
+def test_lockfile_try_acquire(tmp_path):
+    target = str(tmp_path / 'target')
+
+    with LockFile(target):
+        assert LockFile(target).try_acquire() is False
+
+    lock = LockFile(target)
+    assert lock.try_acquire() is True
+    lock.release()
+    assert listdir(tmp_path) == []
+
+
+def test_atomic_write(tmp_path):
+    atomic_write(str(tmp_path / 'file'), 'text')
+    atomic_write(str(tmp_path / 'file'), b'bytes')
+
+    assert (tmp_path / 'file').read_bytes() == b'bytes'
+    assert listdir(tmp_path) == ['file']
+
+
+def test_atomic_write_failure(tmp_path, mocker: MockerFixture):
+    (tmp_path / 'file').write_text('old')
+    mocker.patch('kit_vcs.lockfile.replace', side_effect=OSError)
+
+    with pytest.raises(OSError):
+        atomic_write(str(tmp_path / 'file'), 'new')
+
+    assert (tmp_path / 'file').read_text() == 'old'
+    assert listdir(tmp_path) == ['file']
@@ -0,0 +1,46 @@
+import lzma
+
+import pytest
+
+from kit_vcs.object_ids import ObjectIdIndex, is_id_prefix
+from kit_vcs.pack import OBJ_BLOB, PackStore
+
+PACKED = {'abcd0000000000000000000000000000': (OBJ_BLOB, lzma.compress(b'first')),
+          'abce0000000000000000000000000000': (OBJ_BLOB, lzma.compress(b'second'))}
+LOOSE = ['abcd1000000000000000000000000000', 'abcf0000000000000000000000000000', '12340000000000000000000000000000']
+
+
+@pytest.fixture
+def object_ids(tmp_path):
+    packs = PackStore(str(tmp_path / 'objects' / 'pack'), lzma.decompress)
+    packs.write_pack(list(PACKED), PACKED.get)
+    for object_id in LOOSE:
+        (tmp_path / 'objects' / object_id[:2]).mkdir(exist_ok=True)
+        (tmp_path / 'objects' / object_id[:2] / object_id[2:]).write_text('data')
+    (tmp_path / 'objects' / 'ab' / 'tmp_abcd').write_text('')
+    yield ObjectIdIndex(str(tmp_path / 'objects'), packs)
+    packs.close()
+
+
+def test_is_id_prefix():
+    assert is_id_prefix('abcd')
+    assert is_id_prefix('abcd0000000000000000000000000000')
+    assert not is_id_prefix('abc')
+    assert not is_id_prefix('abcg')
+    assert not is_id_prefix('ABCD')
+    assert not is_id_prefix('abcd00000000000000000000000000000')
+
+
+def test_find(object_ids: ObjectIdIndex):
+    assert object_ids.find('abcd') == ['abcd0000000000000000000000000000', 'abcd1000000000000000000000000000']
+    assert object_ids.find('abc') == sorted(list(PACKED) + LOOSE[:2])
+    assert object_ids.find('1234') == ['12340000000000000000000000000000']
+    assert object_ids.find('5678') == []
+
+
+def test_abbreviate(object_ids: ObjectIdIndex):
+    assert object_ids.abbreviate('abcd0000000000000000000000000000') == 'abcd0'
+    assert object_ids.abbreviate('abce0000000000000000000000000000') == 'abce'
+    assert object_ids.abbreviate('12340000000000000000000000000000') == '1234'
+    assert object_ids.abbreviate('12340000000000000000000000000000', 7) == '1234000'
+    assert object_ids.abbreviate('refs/heads/main') == 'refs/heads/main'
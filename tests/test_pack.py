@@ -0,0 +1,83 @@
+import lzma
+
+import pytest
+
+from kit_vcs.cache import BLOBS
+from kit_vcs.delta import create_delta
+from kit_vcs.pack import OBJ_BLOB, OBJ_COMMIT, OBJ_DELTA, PackStore
+
+
+@pytest.fixture
+def objects():
+    delta = lzma.compress(create_delta(b'first blob\nsecond line\n', b'first blob\nsecond line\nthird line\n'))
+    return {
+        '00112233445566778899aabbccddeeff': (OBJ_BLOB, lzma.compress(b'first blob\nsecond line\n')),
+        '00ffeeddccbbaa998877665544332211': (OBJ_COMMIT, b'user\ndate\nmessage\ntree\nNone'),
+        'ff112233445566778899aabbccddeeff': (OBJ_BLOB, lzma.compress(b'')),
+        '7f112233445566778899aabbccddeeff': (OBJ_DELTA, bytes.fromhex('00112233445566778899aabbccddeeff') + delta),
+    }
+
+
+@pytest.fixture
+def pack_store(tmp_path, objects):
+    store = PackStore(str(tmp_path / 'pack'), lzma.decompress)
+    store.write_pack(list(objects), objects.get)
+    yield store
+    store.close()
+
+
+def test_write_and_read_pack(pack_store: PackStore, objects: dict):
+    for object_id, (_, data) in objects.items():
+        assert object_id in pack_store
+        assert pack_store.get(object_id) == data
+
+
+def test_pack_get_content(pack_store: PackStore):
+    assert pack_store.get_content('00112233445566778899aabbccddeeff') == b'first blob\nsecond line\n'
+    assert pack_store.get_content('00ffeeddccbbaa998877665544332211') == b'user\ndate\nmessage\ntree\nNone'
+    assert pack_store.get_content('ff112233445566778899aabbccddeeff') == b''
+
+
+def test_pack_get_content_delta(pack_store: PackStore):
+    content = pack_store.get_content('7f112233445566778899aabbccddeeff')
+
+    assert content == b'first blob\nsecond line\nthird line\n'
+    assert (BLOBS, '00112233445566778899aabbccddeeff') in pack_store.base_cache
+
+
+def test_pack_missing_object(pack_store: PackStore):
+    assert '10112233445566778899aabbccddeeff' not in pack_store
+    assert pack_store.get('10112233445566778899aabbccddeeff') is None
+
+
+def test_pack_invalid_id(pack_store: PackStore):
+    assert pack_store.get('refs/heads/main') is None
+    assert pack_store.get('zz112233445566778899aabbccddeeff') is None
+
+
+def test_pack_ids_sorted(pack_store: PackStore, objects: dict):
+    assert list(pack_store.ids()) == sorted(objects)
+
+
+def test_pack_find_prefix(pack_store: PackStore):
+    assert list(pack_store.find_prefix('00')) == ['00112233445566778899aabbccddeeff',
+                                                  '00ffeeddccbbaa998877665544332211']
+    assert list(pack_store.find_prefix('00f')) == ['00ffeeddccbbaa998877665544332211']
+    assert list(pack_store.find_prefix('7f11')) == ['7f112233445566778899aabbccddeeff']
+    assert list(pack_store.find_prefix('0012')) == []
+    assert list(pack_store.find_prefix('ff112233445566778899aabbccddeeff')) == ['ff112233445566778899aabbccddeeff']
+
+
+def test_pack_fanout(pack_store: PackStore):
+    pack = pack_store.packs[0]
+
+    assert len(pack) == 4
+    assert pack.fanout[0x00] == 2 and pack.fanout[0x7e] == 2 and pack.fanout[0x7f] == 3 and pack.fanout[0xff] == 4
+
+
+def test_remove_packs_except(tmp_path, pack_store: PackStore, objects: dict):
+    pack_name = pack_store.write_pack(list(objects)[:1], objects.get)
+    pack_store.remove_packs_except(pack_name)
+
+    assert len(pack_store.packs) == 1
+    assert sorted((tmp_path / 'pack').iterdir())[0].name.startswith(pack_name)
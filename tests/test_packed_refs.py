@@ -0,0 +1,66 @@
+import pytest
+
+from kit_vcs.lockfile import LockFile
+from kit_vcs.packed_refs import PackedRefs
+
+REFS = {'refs/heads/main': 'commit1', 'refs/heads/feature': 'commit2', 'refs/tags/v1': 'user\ndate\nmessage\ncommit1',
+        'refs/tags/v10': 'user\ndate\nmessage\ncommit2'}
+
+
+@pytest.fixture
+def refs_path(tmp_path):
+    return str(tmp_path / 'PACKED_REFS')
+
+
+@pytest.fixture
+def packed_refs(refs_path):
+    packed_refs = PackedRefs(refs_path)
+    with LockFile(refs_path) as lock:
+        packed_refs.write(lock, REFS)
+    yield packed_refs
+    packed_refs.close()
+
+
+def test_packed_refs_get(refs_path, packed_refs: PackedRefs):
+    loaded = PackedRefs(refs_path)
+
+    assert len(loaded) == 4
+    assert all(loaded.get(name) == value for name, value in REFS.items())
+    assert loaded.get('refs/heads/missing') is None
+    assert loaded.get('refs/heads') is None
+    loaded.close()
+
+
+def test_packed_refs_items(packed_refs: PackedRefs):
+    assert list(packed_refs.items('refs/heads/')) == [('refs/heads/feature', 'commit2'),
+                                                      ('refs/heads/main', 'commit1')]
+    assert [name for name, _ in packed_refs.items('refs/tags/')] == ['refs/tags/v1', 'refs/tags/v10']
+    assert list(packed_refs.items('refs/notes/')) == []
+    assert dict(packed_refs.items()) == REFS
+
+
+def test_packed_refs_missing(refs_path):
+    packed_refs = PackedRefs(refs_path)
+
+    assert len(packed_refs) == 0
+    assert packed_refs.get('refs/heads/main') is None
+    assert list(packed_refs.items()) == []
+
+
+def test_packed_refs_corrupted(refs_path, packed_refs: PackedRefs):
+    with open(refs_path, 'r+b') as f:
+        f.seek(20)
+        f.write(b'\xff')
+
+    assert PackedRefs(refs_path).get('refs/heads/main') is None
+
+
+def test_packed_refs_refresh(refs_path, packed_refs: PackedRefs):
+    other = PackedRefs(refs_path)
+    with LockFile(refs_path) as lock:
+        other.write(lock, REFS | {'refs/heads/new': 'commit3'})
+
+    assert packed_refs.get('refs/heads/new') is None
+    packed_refs.refresh()
+    assert packed_refs.get('refs/heads/new') == 'commit3'
+    other.close()
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+import kit_vcs.trace as trace
+from kit_vcs.drive_manager import DriveManager
+from kit_vcs.trace import Tracer
+from kit_vcs.utils import Utils
+
+
+@pytest.fixture
+def tracer():
+    trace.tracer.enable()
+    yield trace.tracer
+    trace.tracer.disable()
+
+
+@trace.traced
+def traced_function(value: int) -> int:
+    trace.count('calls')
+    return value * 2
+
+
+def test_traced_disabled():
+    spans, counters = list(trace.tracer.spans), dict(trace.tracer.counters)
+
+    assert traced_function(2) == 4
+    assert trace.tracer.spans == spans
+    assert trace.tracer.counters == counters
+
+
+def test_traced_records_spans(tracer: Tracer):
+    traced_function(1)
+    traced_function(2)
+    with pytest.raises(TypeError):
+        traced_function(None)
+
+    assert [span.name for span in tracer.spans] == ['traced_function'] * 3
+    assert tracer.counters == {'calls': 3}
+    assert tracer.summary()[0][:2] == ('traced_function', 3)
+
+
+def test_count_from_threads(tracer: Tracer):
+    Utils.run_jobs(lambda _: trace.count(trace.FILES_STATED, 2), list(range(100)), 8)
+
+    assert tracer.counters[trace.FILES_STATED] == 200
+
+
+def test_format_summary(tracer: Tracer):
+    traced_function(1)
+
+    summary = tracer.format_summary().splitlines()
+
+    assert summary[0].split() == ['Operation', 'Calls', 'Total', 'ms', 'Max', 'ms']
+    assert summary[1].split()[:2] == ['traced_function', '1']
+    assert summary[-1].split() == ['calls', '1']
+
+
+def test_write_chrome_trace(tracer: Tracer, tmp_path):
+    traced_function(1)
+
+    tracer.write_chrome_trace(str(tmp_path / 'trace.json'))
+
+    with open(tmp_path / 'trace.json') as f:
+        events = json.load(f)['traceEvents']
+    assert events[0]['name'] == 'traced_function'
+    assert events[0]['ph'] == 'X'
+    assert events[0]['dur'] >= 0
+    assert events[-1]['ph'] == 'C'
+    assert events[-1]['args'] == {'calls': 1}
+
+
+def test_drive_manager_counters(tracer: Tracer, tmp_path):
+    (tmp_path / '.kit' / 'objects').mkdir(parents=True)
+    (tmp_path / 'file.txt').write_bytes(b'content\n' * 1000)
+    drive_manager = DriveManager(workspace_path=str(tmp_path))
+    drive_manager.compression = ('zlib', 6)
+
+    drive_manager.calculate_index_data('.', None, 42)
+    file_hash = drive_manager.index_hashes['file.txt'][0]
+    assert drive_manager.read_blob(file_hash) == b'content\n' * 1000
+
+    assert tracer.counters[trace.OBJECTS_WRITTEN] == 1
+    assert tracer.counters[trace.UNCOMPRESSED_BYTES_WRITTEN] == 8000
+    assert 0 < tracer.counters[trace.COMPRESSED_BYTES_WRITTEN] < 8000
+    assert tracer.counters[trace.OBJECTS_READ] == 1
+    assert tracer.counters[trace.UNCOMPRESSED_BYTES_READ] == 8000
+    assert tracer.counters[trace.COMPRESSED_BYTES_READ] == tracer.counters[trace.COMPRESSED_BYTES_WRITTEN]
+    assert tracer.counters[trace.FILES_STATED] == 1
+    assert 'DriveManager.hash_and_save_file' in {span.name for span in tracer.spans}
+
+
+def test_duplicate_files_not_written(tracer: Tracer, tmp_path, mocker):
+    (tmp_path / '.kit' / 'objects').mkdir(parents=True)
+    for name in ('first.txt', 'second.txt'):
+        (tmp_path / name).write_bytes(b'content\n' * 1000)
+    drive_manager = DriveManager(workspace_path=str(tmp_path))
+    drive_manager.hash_mode = 'content'
+    drive_manager.calculate_index_data('first.txt', None, 42)
+    mock_write_blob = mocker.spy(drive_manager, 'write_blob')
+
+    drive_manager.calculate_index_data('second.txt', None, 42)
+
+    mock_write_blob.assert_called_once()
+    assert tracer.counters[trace.OBJECTS_WRITTEN] == 1
+    assert not [name for name in (tmp_path / '.kit' / 'objects').iterdir() if name.name.startswith('tmp_')]
+    assert drive_manager.index_hashes['first.txt'] == drive_manager.index_hashes['second.txt']
@@ -45,6 +45,45 @@ def test_get_file_hash(tmp_path, mocker: MockerFixture):
     assert hash_value.hexdigest() == expected_hash.hexdigest()
 
 
+def test_get_content_hash(tmp_path, mocker: MockerFixture):
+    first_file = tmp_path / "first.txt"
+    second_file = tmp_path / "dir" / "second.txt"
+    second_file.parent.mkdir()
+    first_file.write_text("content")
+    second_file.write_text("content")
+
+    first_hash = Utils.get_content_hash(str(first_file), 0)
+    second_hash = Utils.get_content_hash(str(second_file), 0)
+    expected_hash = xxh3_128(b"content", seed=0)
+
+    assert first_hash.hexdigest() == second_hash.hexdigest() == expected_hash.hexdigest()
+
+
+def test_run_jobs_keeps_order():
+    result = Utils.run_jobs(lambda value: value * 2, list(range(100)), 8)
+
+    assert result == [value * 2 for value in range(100)]
+
+
+def test_run_jobs_propagates_errors():
+    def fail(value):
+        if value == 3:
+            raise ValueError('bad value')
+        return value
+
+    with pytest.raises(ValueError):
+        Utils.run_jobs(fail, list(range(10)), 4)
+
+
+def test_get_stat_data(tmp_path):
+    test_file = tmp_path / "test_file.txt"
+    test_file.write_text("content")
+    file_stat = test_file.stat()
+
+    assert Utils.get_stat_data(str(test_file)) == (file_stat.st_mtime_ns, file_stat.st_ctime_ns, file_stat.st_size,
+                                                   file_stat.st_ino, file_stat.st_dev)
+
+
 def test_get_string_hash():
     test_string = "test"
     seed = 0
@@ -53,23 +92,6 @@ def test_get_string_hash():
     assert hash_value.hexdigest() == expected_hash.hexdigest()
 
 
-def test_get_tree_hash(tmp_path, mocker: MockerFixture):
-    index_file = tmp_path / "INDEX"
-    index_file.write_text("file1.txt,hash1,+\nfile2.txt,hash2,~")
-    workspace_path = str(tmp_path)
-    seed = 0
-    mocker.patch('kit_vcs.utils.path.isfile', return_value=True)
-
-    hash_value = Utils.get_tree_hash(workspace_path, seed)
-    expected_hash = xxh3_128('kit', seed=seed)
-    with open(index_file, 'r') as f:
-        for line in f:
-            local_path, file_hash, diff_type = line.split(',')
-            expected_hash.update(file_hash.strip())
-
-    assert hash_value.hexdigest() == expected_hash.hexdigest()
-
-
 def test_bool_to_sign():
     assert Utils.bool_to_sign(True) == "+" and Utils.bool_to_sign(False) == "-"
 
@@ -90,22 +112,13 @@ def test_check_for_dot_path(mocker: MockerFixture):
     assert Utils.check_for_dot_path("a\\.b\\c") is True and Utils.check_for_dot_path("a\\b\\c") is False
 
 
-def test_get_relative_paths(mocker: MockerFixture):
-    mock_walk = mocker.patch('kit_vcs.utils.walk')
-
-    mock_walk.return_value = [
-        ('/mocked/dir', ('subdir1', 'subdir2'), ('file1.txt', 'file2.txt')),
-        ('/mocked/dir/subdir1', (), ('file3.txt',)),
-        ('/mocked/dir/subdir2', (), ('file4.txt',)),
-    ]
-
-    expected_result = {
-        'file1.txt',
-        'file2.txt',
-        Utils.parse_from_str_to_os_path('subdir1/file3.txt'),
-        Utils.parse_from_str_to_os_path('subdir2/file4.txt'),
-    }
+def test_split_local_path():
+    assert Utils.split_local_path(path.join(".", "a", "b", "")) == ["a", "b"]
+    assert Utils.split_local_path(".") == []
 
-    result = Utils.get_relative_paths('/mocked/dir')
 
-    assert result == expected_result
+def test_is_path_within():
+    assert Utils.is_path_within(path.join("a", "b.txt"), "a")
+    assert Utils.is_path_within("a", "a")
+    assert Utils.is_path_within("ab.txt", ".")
+    assert not Utils.is_path_within("ab.txt", "a")
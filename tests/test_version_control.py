@@ -4,6 +4,8 @@ import pytest
 from pytest_mock import MockerFixture
 
 import kit_vcs.errors as errors
+from kit_vcs.commit_graph import CommitEntry
+from kit_vcs.drive_manager import NO_REF
 from kit_vcs.utils import Utils
 from kit_vcs.version_control import VersionControl
 
@@ -11,6 +13,7 @@ from kit_vcs.version_control import VersionControl
 @pytest.fixture
 def mock_drive_manager(mocker: MockerFixture):
     mock_drive = mocker.patch('kit_vcs.version_control.DriveManager')
+    mock_drive.return_value.resolve_commit.side_effect = lambda name: name
     return mock_drive.return_value
 
 
@@ -54,6 +57,25 @@ def test_init_new_repo(version_control: VersionControl, mock_drive_manager, mock
     mock_commit.assert_called_once_with("initial commit")
     mock_drive_manager.write.assert_any_call(path.join('.kit', 'HEAD'), version_control.head)
     mock_drive_manager.write.assert_any_call(path.join('.kit', version_control.head), version_control.current_id)
+    mock_drive_manager.write.assert_any_call(path.join('.kit', 'COMPRESSION'), 'zlib:6')
+
+
+def test_init_new_repo_compression(version_control: VersionControl, mock_drive_manager, mocker: MockerFixture):
+    mock_drive_manager.is_exist.return_value = False
+    mocker.patch.object(version_control, 'commit', autospec=True)
+
+    version_control.init('lzma:2')
+
+    assert mock_drive_manager.compression == ('lzma', 2)
+    mock_drive_manager.write.assert_any_call(path.join('.kit', 'COMPRESSION'), 'lzma:2')
+
+
+def test_init_invalid_compression(version_control: VersionControl, mock_drive_manager):
+    mock_drive_manager.is_exist.return_value = False
+
+    with pytest.raises(errors.UnsupportedCodecError):
+        version_control.init('gzip')
+    mock_drive_manager.initialize_directories.assert_not_called()
 
 
 def test_add(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
@@ -64,7 +86,6 @@ def test_add(version_control: VersionControl, mock_drive_manager, dir_exists_moc
     mock_drive_manager.calculate_index_data.assert_called_once_with(
         'test_path', mock_commit_tree_hash, version_control.seed)
     mock_drive_manager.write_index_data.assert_called_once()
-    mock_drive_manager.delete_if_empty.assert_called_once_with(Utils.parse_from_str_to_os_path('.kit/INDEX'))
 
 
 def test_rm(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
@@ -75,113 +96,145 @@ def test_rm(version_control: VersionControl, mock_drive_manager, dir_exists_mock
     mock_drive_manager.calculate_index_data.assert_called_once_with(
         'test_path', mock_commit_tree_hash, version_control.seed, False)
     mock_drive_manager.write_index_data.assert_called_once()
-    mock_drive_manager.delete_if_empty.assert_called_once_with(Utils.parse_from_str_to_os_path('.kit/INDEX'))
 
 
-def test_index_success(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = True
-    mock_drive_manager.read.return_value = "file1.txt,hash1,+\nfile2.txt,hash2,~\n"
-
-    result = list(version_control.index())
-
-    assert result == ["file1.txt,hash1,+", "file2.txt,hash2,~"]
-
-
-def test_index_no_index_file(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = False
+def test_commit_no_changes(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
+    mock_drive_manager.index_hashes = {}
 
-    result = list(version_control.index())
+    with pytest.raises(errors.NothingToCommitError):
+        version_control.commit("description")
 
-    assert result == []
 
+def test_commit_ref_conflict_keeps_workspace(tmp_path):
+    vcs = VersionControl('user', str(tmp_path))
+    vcs.init()
+    (tmp_path / 'file.txt').write_text('base\n')
+    vcs.add('file.txt')
+    vcs.commit('base')
+    other = VersionControl('user', str(tmp_path))
+    vcs.rm('file.txt')
+    (tmp_path / 'other.txt').write_text('other\n')
+    other.add('other.txt')
+    other.commit('other')
 
-def test_commit_no_changes(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = False
+    with pytest.raises(errors.RefUpdateError):
+        vcs.commit('remove')
 
-    with pytest.raises(errors.NothingToCommitError):
-        version_control.commit("description")
+    assert (tmp_path / 'file.txt').read_text() == 'base\n'
 
 
 def test_commits_list(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.read.side_effect = [
-        "test_user\n2024-08-06T12:00:00\ninitial commit\n\nNone",
-        "test_user\n2024-08-06T12:00:00\nsecond commit\n\ncommit1"
-    ]
+    mock_drive_manager.get_commit_entry.side_effect = lambda commit_id: {
+        "commit1": CommitEntry("commit1", "tree1", [], 1, 0, "test_user", "2024-08-06T12:00:00", "initial commit"),
+        "commit2": CommitEntry("commit2", "tree2", ["commit1"], 2, 0, "test_user", "2024-08-07T12:00:00",
+                               "second commit"),
+    }[commit_id]
+    version_control.current_id = "commit2"
+
+    assert list(version_control.commits_list()) == [("commit2", "test_user", "2024-08-07T12:00:00", "second commit"),
+                                                    ("commit1", "test_user", "2024-08-06T12:00:00", "initial commit")]
+    mock_drive_manager.read_commit.assert_not_called()
+
+
+def test_commits_list_paths(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
+    mock_drive_manager.get_commit_entry.side_effect = lambda commit_id: {
+        "commit1": CommitEntry("commit1", "tree1", [], 1, 0, "test_user", "2024-08-06T12:00:00", "initial commit"),
+        "commit2": CommitEntry("commit2", "tree2", ["commit1"], 2, 0, "test_user", "2024-08-07T12:00:00",
+                               "second commit"),
+    }[commit_id]
+    mock_drive_manager.get_commit_tree_hash.side_effect = lambda commit_id: "tree" + commit_id[-1]
+    mock_drive_manager.paths_changed.side_effect = lambda tree1, tree2, paths: tree1 is None
+    version_control.current_id = "commit2"
+
+    assert [commit[0] for commit in version_control.commits_list(["src/"])] == ["commit1"]
+    mock_drive_manager.paths_changed.assert_any_call("tree1", "tree2", [path.join("src")])
+    mock_drive_manager.paths_changed.assert_any_call(None, "tree1", [path.join("src")])
+
+
+def test_commits_list_path_outside(version_control: VersionControl, mock_drive_manager,
+                                   dir_exists_mock: MockerFixture):
+    with pytest.raises(errors.NotFoundError):
+        list(version_control.commits_list([path.join("..", "other")]))
 
-    mock_drive_manager.get_files_in_dir.return_value = ['commit1']
-    version_control.current_id = "commit1"
 
-    assert list(version_control.commits_list()) == [("commit1", "test_user", "2024-08-06T12:00:00", "initial commit")]
+def test_status(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
+    mock_drive_manager.index_hashes = {'b.txt': ('hash2', False), 'a.txt': ('hash1', True)}
+    mock_drive_manager.get_workspace_status.return_value = (['modified.txt'], ['deleted.txt'], ['new.txt'])
+
+    assert list(version_control.status()) == [('staged', '+', 'a.txt'), ('staged', '-', 'b.txt'),
+                                              ('unstaged', '-', 'deleted.txt'), ('unstaged', '~', 'modified.txt'),
+                                              ('untracked', '?', 'new.txt')]
+    mock_drive_manager.get_workspace_status.assert_called_once_with(
+        mock_drive_manager.get_commit_tree_hash.return_value, version_control.seed)
 
 
 def test_create_branch(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = False
+    mock_drive_manager.read_ref.return_value = None
 
     version_control.create_branch("new_branch")
 
-    mock_drive_manager.write.assert_called_once_with(Utils.parse_from_str_to_os_path('.kit/refs/heads/new_branch'),
-                                                     version_control.current_id)
+    mock_drive_manager.update_ref.assert_called_once_with(Utils.parse_from_str_to_os_path('refs/heads/new_branch'),
+                                                          version_control.current_id, NO_REF)
 
 
 def test_create_branch_already_exists(version_control: VersionControl, mock_drive_manager,
                                       dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = True
+    mock_drive_manager.read_ref.return_value = "commit_hash"
 
     with pytest.raises(errors.AlreadyExistError):
         version_control.create_branch("existing_branch")
 
 
 def test_branches_list(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.get_files_in_dir.return_value = ['branch1', 'branch2']
+    mock_drive_manager.list_refs.return_value = {'branch1': 'commit1', 'branch2': 'commit2'}
 
     assert list(version_control.branches_list()) == ['branch1', 'branch2']
+    mock_drive_manager.list_refs.assert_called_once_with(Utils.parse_from_str_to_os_path('refs/heads'))
 
 
 def test_remove_branch(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = True
-    mock_drive_manager.read.return_value = "commit_hash"
+    mock_drive_manager.read_ref.return_value = "commit_hash"
     version_control.head = "refs/heads/branch_to_remove"
 
     version_control.remove_branch("branch_to_remove")
 
-    mock_drive_manager.write.assert_called_once_with(Utils.parse_from_str_to_os_path('.kit/HEAD'),
-                                                     version_control.current_id)
-    mock_drive_manager.remove.assert_called_once_with(
-        Utils.parse_from_str_to_os_path('.kit/refs/heads/branch_to_remove'))
+    mock_drive_manager.update_ref.assert_called_once_with('HEAD', version_control.current_id)
+    mock_drive_manager.delete_ref.assert_called_once_with(
+        Utils.parse_from_str_to_os_path('refs/heads/branch_to_remove'))
 
 
 def test_create_tag(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = False
+    mock_drive_manager.read_ref.return_value = None
 
     version_control.create_tag("new_tag", "tag_description")
 
-    mock_drive_manager.write.assert_called_once()
+    mock_drive_manager.update_ref.assert_called_once()
+    assert mock_drive_manager.update_ref.call_args.args[2] == NO_REF
 
 
 def test_create_tag_already_exists(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = True
+    mock_drive_manager.read_ref.return_value = "tag_data"
 
     with pytest.raises(errors.AlreadyExistError):
         version_control.create_tag("existing_tag")
 
 
 def test_tags_list(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.get_files_in_dir.return_value = ['tag1', 'tag2']
-    mock_drive_manager.read.side_effect = ["tag_data1", "tag_data2"]
+    mock_drive_manager.list_refs.return_value = {'tag1': 'tag_data1', 'tag2': 'tag_data2'}
 
     assert list(version_control.tags_list()) == ['tag1\ntag_data1', 'tag2\ntag_data2']
 
 
 def test_remove_tag(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = True
+    mock_drive_manager.read_ref.return_value = "tag_data"
 
     version_control.remove_tag("tag_to_remove")
 
-    mock_drive_manager.remove.assert_called_once_with(Utils.parse_from_str_to_os_path('.kit/refs/tags/tag_to_remove'))
+    mock_drive_manager.delete_ref.assert_called_once_with(Utils.parse_from_str_to_os_path('refs/tags/tag_to_remove'))
 
 
 def test_current_branch(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = False
+    mock_drive_manager.has_object.return_value = False
     version_control.head = 'refs/heads/main'
 
     assert version_control.current_branch() == 'main'
@@ -189,30 +242,29 @@ def test_current_branch(version_control: VersionControl, mock_drive_manager, dir
 
 def test_current_branch_not_on_branch(version_control: VersionControl, mock_drive_manager,
                                       dir_exists_mock: MockerFixture):
-    mock_drive_manager.is_exist.return_value = True
+    mock_drive_manager.has_object.return_value = True
 
     with pytest.raises(errors.NotOnBranchError):
         version_control.current_branch()
 
 
 def test_get_branch_head_success(version_control: VersionControl, dir_exists_mock: MockerFixture, mock_drive_manager):
-    mock_read = mock_drive_manager.read
-    mock_drive_manager.is_exist.return_value = True
+    mock_drive_manager.read_ref.return_value = "commit_hash"
 
-    version_control.get_branch_head("main")
+    assert version_control.get_branch_head("main") == "commit_hash"
 
-    mock_read.assert_called_once_with(Utils.parse_from_str_to_os_path('.kit/refs/heads/main'))
+    mock_drive_manager.read_ref.assert_called_once_with(Utils.parse_from_str_to_os_path('refs/heads/main'))
 
 
 def test_get_branch_head_fail(version_control: VersionControl, dir_exists_mock: MockerFixture, mock_drive_manager):
-    mock_drive_manager.is_exist.return_value = False
+    mock_drive_manager.read_ref.return_value = None
 
     with pytest.raises(errors.NotFoundError):
         version_control.get_branch_head("main")
 
 
 def test_commits_diff(version_control: VersionControl, mock_drive_manager, mocker: MockerFixture):
-    mock_drive_manager.commit_to_tree_path.side_effect = ["path/to/tree1", "path/to/tree2"]
+    mock_drive_manager.get_commit_tree_hash.side_effect = ["tree1", "tree2"]
     mock_exists = mocker.patch('kit_vcs.utils.path.isdir', return_value=True)
     mock_exists.patch('kit_vcs.utils.Utils.check_repository_exists', lambda x: x)
 
@@ -222,7 +274,7 @@ def test_commits_diff(version_control: VersionControl, mock_drive_manager, mocke
 
     result = list(version_control.commits_diff("commit1_hash", "commit2_hash"))
 
-    mock_get_tree_diff.assert_called_once_with("path/to/tree1", "path/to/tree2")
+    mock_get_tree_diff.assert_called_once_with("tree1", "tree2", [])
 
     assert result == mock_tree_diff
 
@@ -231,8 +283,7 @@ def test_files_diff(version_control: VersionControl, mock_drive_manager, mocker:
     mock_exists = mocker.patch('kit_vcs.utils.path.isdir', return_value=True)
     mock_exists.patch('kit_vcs.utils.Utils.check_repository_exists', lambda x: x)
 
-    mock_drive_manager.commit_to_tree_path.side_effect = ["path/to/tree1", "path/to/tree2"]
-    mock_drive_manager.read.side_effect = ["file1_hash", "file2_hash"]
+    mock_drive_manager.get_tree_file_hash.side_effect = ["file1_hash", "file2_hash"]
     mock_files_diff = ["line1\n", "line2\n"]
 
     mocker.patch.object(mock_drive_manager, 'get_files_diff', return_value=mock_files_diff)
@@ -240,3 +291,166 @@ def test_files_diff(version_control: VersionControl, mock_drive_manager, mocker:
     result = list(version_control.files_diff("commit1_hash", "commit2_hash", "test_file.txt"))
 
     assert result == mock_files_diff
+
+
+def test_merge_commits_fast_forward(version_control: VersionControl, mock_drive_manager,
+                                    dir_exists_mock: MockerFixture, mocker: MockerFixture):
+    version_control.current_id = 'main'
+    mock_drive_manager.get_merge_base.return_value = 'main'
+    mock_commit = mocker.patch.object(version_control, 'commit')
+
+    version_control.merge_commits('main', 'feature', 'message')
+
+    mock_drive_manager.checkout_tree.assert_called_once()
+    mock_drive_manager.merge_trees.assert_not_called()
+    mock_commit.assert_not_called()
+    assert version_control.current_id == 'feature'
+
+
+def test_merge_commits_up_to_date(version_control: VersionControl, mock_drive_manager,
+                                  dir_exists_mock: MockerFixture, mocker: MockerFixture):
+    mock_drive_manager.get_merge_base.return_value = 'feature'
+    mock_commit = mocker.patch.object(version_control, 'commit')
+
+    version_control.merge_commits('main', 'feature', 'message')
+
+    mock_drive_manager.merge_trees.assert_not_called()
+    mock_commit.assert_not_called()
+
+
+def test_merge_commits_clean(version_control: VersionControl, mock_drive_manager,
+                             dir_exists_mock: MockerFixture, mocker: MockerFixture):
+    mock_drive_manager.get_merge_base.return_value = 'base'
+    mock_drive_manager.get_commit_tree_hash.side_effect = lambda commit_id: commit_id + '_tree'
+    mock_drive_manager.merge_trees.return_value = ({'new.txt': 'hash', 'old.txt': None},
+                                                   [('both.txt', 'base_hash', 'main_hash', 'feature_hash')])
+    mock_drive_manager.merge_files.return_value = (['merged'], False)
+    mock_commit = mocker.patch.object(version_control, 'commit')
+
+    version_control.merge_commits('main', 'feature', 'message')
+
+    mock_drive_manager.merge_trees.assert_called_once_with('base_tree', 'main_tree', 'feature_tree')
+    mock_drive_manager.load_files.assert_called_once_with([('new.txt', 'hash')])
+    mock_drive_manager.merge_files.assert_called_once_with('base_hash', 'main_hash', 'feature_hash')
+    mock_drive_manager.write.assert_called_once_with('both.txt', 'merged\n')
+    mock_drive_manager.stage_index_file.assert_called_once_with('new.txt', 'hash')
+    mock_drive_manager.stage_index_path.assert_any_call('old.txt', False)
+    mock_drive_manager.stage_index_path.assert_any_call('both.txt')
+    assert mock_drive_manager.stage_index_path.call_count == 2
+    mock_drive_manager.commit_index_update.assert_called_once_with(mocker.ANY, version_control.seed)
+    mock_drive_manager.calculate_index_data.assert_not_called()
+    mock_drive_manager.set_merge_head.assert_called_once_with('feature')
+    mock_commit.assert_called_once_with('message')
+
+
+def test_merge_commits_conflict(version_control: VersionControl, mock_drive_manager,
+                                dir_exists_mock: MockerFixture, mocker: MockerFixture):
+    mock_drive_manager.get_merge_base.return_value = 'base'
+    mock_drive_manager.merge_trees.return_value = ({}, [('both.txt', 'base_hash', 'main_hash', 'feature_hash'),
+                                                        ('deleted.txt', 'base_hash', None, 'feature_hash')])
+    mock_drive_manager.merge_files.return_value = (['<<<<<<< YOURS', 'x', '=======', 'y', '>>>>>>> THEIRS'], True)
+    mock_commit = mocker.patch.object(version_control, 'commit')
+
+    with pytest.raises(errors.MergeConflictError, match='both.txt, deleted.txt'):
+        version_control.merge_commits('main', 'feature', 'message')
+
+    mock_drive_manager.load_files.assert_called_once_with([('deleted.txt', 'feature_hash')])
+    mock_drive_manager.commit_index_update.assert_called_once()
+    mock_commit.assert_not_called()
+
+
+def test_merge_commits_stages_known_hashes(tmp_path, mocker: MockerFixture):
+    vcs = VersionControl('user', str(tmp_path))
+    vcs.init()
+    for index in range(10):
+        (tmp_path / f'file{index}.txt').write_text('base\n')
+    vcs.add('.')
+    vcs.commit('base')
+    vcs.create_branch('feature')
+    (tmp_path / 'main.txt').write_text('main\n')
+    vcs.add('main.txt')
+    vcs.commit('main')
+    vcs.checkout('feature', False)
+    for index in range(10):
+        (tmp_path / f'file{index}.txt').write_text('feature\n')
+    vcs.add('.')
+    vcs.commit('feature')
+    vcs.checkout('main', False)
+    mock_hash = mocker.spy(vcs.drive, 'hash_and_save_file')
+
+    vcs.merge_commits(vcs.current_id, vcs.get_branch_head('feature'), 'merge')
+
+    mock_hash.assert_not_called()
+    assert (tmp_path / 'file0.txt').read_text() == 'feature\n'
+    assert list(vcs.status()) == []
+    assert len(vcs.drive.get_commit_parents(vcs.current_id)) == 2
+
+
+def test_merge_commits_not_found(version_control: VersionControl, mock_drive_manager,
+                                 dir_exists_mock: MockerFixture):
+    mock_drive_manager.resolve_commit.side_effect = lambda name: None if name == 'missing' else name
+
+    with pytest.raises(errors.NotFoundError, match='missing'):
+        version_control.merge_commits('main', 'missing', 'message')
+    mock_drive_manager.get_merge_base.assert_not_called()
+
+
+def test_checkout_after_conflicted_merge(tmp_path):
+    vcs = VersionControl('user', str(tmp_path))
+    vcs.init()
+    (tmp_path / 'file.txt').write_text('base\n')
+    vcs.add('file.txt')
+    vcs.commit('base')
+    vcs.create_branch('feature')
+    (tmp_path / 'file.txt').write_text('main\n')
+    vcs.add('file.txt')
+    vcs.commit('main')
+    vcs.checkout('feature', False)
+    (tmp_path / 'file.txt').write_text('feature\n')
+    vcs.add('file.txt')
+    vcs.commit('feature')
+    vcs.checkout('main', False)
+    with pytest.raises(errors.MergeConflictError):
+        vcs.merge_commits(vcs.current_id, vcs.get_branch_head('feature'), 'merge')
+
+    vcs.checkout('main', True)
+    (tmp_path / 'other.txt').write_text('other\n')
+    vcs.add('other.txt')
+    vcs.commit('other')
+
+    assert vcs.drive.get_merge_head() is None
+    assert len(vcs.drive.get_commit_parents(vcs.current_id)) == 1
+
+
+def test_checkout_to_commit_prefix(version_control: VersionControl, mock_drive_manager,
+                                   dir_exists_mock: MockerFixture):
+    mock_drive_manager.index_hashes = {}
+    mock_drive_manager.resolve_commit.side_effect = lambda name: name + '0' * 28
+
+    version_control.checkout_to_commit('abcd', False)
+
+    mock_drive_manager.update_ref.assert_called_once_with('HEAD', 'abcd' + '0' * 28)
+    assert version_control.current_id == 'abcd' + '0' * 28
+
+
+def test_cherry_pick_uses_parent_as_base(version_control: VersionControl, mock_drive_manager,
+                                         dir_exists_mock: MockerFixture, mocker: MockerFixture):
+    mock_drive_manager.get_commit_parents.return_value = ['parent']
+    mock_drive_manager.get_commit_tree_hash.side_effect = lambda commit_id: commit_id + '_tree'
+    mock_drive_manager.merge_trees.return_value = ({}, [])
+    mocker.patch.object(version_control, 'commit')
+
+    version_control.merge_commits('main', 'picked', 'message', cherry_pick=True)
+
+    mock_drive_manager.merge_trees.assert_called_once_with('parent_tree', 'main_tree', 'picked_tree')
+    mock_drive_manager.set_merge_head.assert_not_called()
+
+
+def test_gc(version_control: VersionControl, mock_drive_manager, dir_exists_mock: MockerFixture):
+    mock_drive_manager.repack.return_value = 3
+    mock_drive_manager.pack_refs.return_value = 2
+
+    assert version_control.gc() == (3, 2)
+    mock_drive_manager.repack.assert_called_once()
+    mock_drive_manager.pack_refs.assert_called_once()
+    mock_drive_manager.write_commit_graph.assert_called_once()